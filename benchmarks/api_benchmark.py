@@ -125,6 +125,24 @@ def jit_dispatch_with_transfer(state):
     f(imgs)
 
 
+@benchmark.register
+def eager_unary_dispatch(state):
+  a = jax.device_put(1)
+  jax.lax.neg(a)
+
+  while state:
+    jax.lax.neg(a)
+
+
+@benchmark.register
+def eager_binary_dispatch(state):
+  a = jax.device_put(np.ones(8, np.float32))
+  jax.lax.add(a, a)
+
+  while state:
+    jax.lax.add(a, a)
+
+
 @benchmark.register
 @required_devices(2)
 def pmap_trivial_2_devices(state):
@@ -175,6 +193,33 @@ def pmap_simple_8_devices(state):
     d.block_until_ready()
 
 
+def _mlp(params, x):
+  for w, b in params:
+    x = jax.nn.relu(jnp.dot(x, w) + b)
+  return jax.nn.logsumexp(x, axis=-1)
+
+
+def _mlp_args(num_layers=20, width=32):
+  params = [(np.ones((width, width), np.float32), np.ones(width, np.float32))
+            for _ in range(num_layers)]
+  return params, np.ones((8, width), np.float32)
+
+
+@benchmark.register
+def jaxpr_trace_mlp(state):
+  args = _mlp_args()
+  while state:
+    jax.make_jaxpr(_mlp)(*args)
+
+
+@benchmark.register
+def jaxpr_deserialize_mlp(state):
+  from jax import jaxpr_serialization
+  data = jaxpr_serialization.serialize(jax.make_jaxpr(_mlp)(*_mlp_args()))
+  while state:
+    jaxpr_serialization.deserialize(data)
+
+
 def swap(a, b):
   return b, a
 
@@ -113,6 +113,72 @@ def pmap_shard_outputs_benchmark():
   benchmark.benchmark_suite(get_benchmark_fn, params, "pmap_shard_outputs")
 
 
+def pmap_dispatch_fast_path_benchmark():
+  """Pmap benchmark comparing dispatch with and without the fast path.
+
+  This is intended to measure the per-call overhead of a training-loop-like
+  pmap, whose outputs are fed back in as its inputs, as controlled by the
+  ``jax_pmap_fast_path`` flag.
+  """
+  def get_benchmark_fn(nargs, nshards, fast_path):
+    pmap_fn = pmap(lambda *args: [x + 1 for x in args])
+    shape = (nshards, 4)
+    args = pmap(lambda *args: args)(*[np.random.random(shape)
+                                      for _ in range(nargs)])
+    def benchmark_fn():
+      prev = config.FLAGS.jax_pmap_fast_path
+      config.update("jax_pmap_fast_path", fast_path)
+      try:
+        outs = args
+        for _ in range(100):
+          outs = pmap_fn(*outs)
+      finally:
+        config.update("jax_pmap_fast_path", prev)
+    return benchmark_fn
+
+  params = []
+  nshards = min(8, jax.local_device_count())
+  for nargs in (1, 10, 100, 500):
+    for fast_path in (False, True):
+      params.append({"nargs": nargs, "nshards": nshards,
+                     "fast_path": fast_path})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "pmap_dispatch_fast_path")
+
+
+def pmap_psum_scatter_benchmark():
+  """Pmap benchmark comparing psum_scatter with psum followed by slicing.
+
+  This is intended to measure the cost of reducing values, e.g. gradients, of
+  which each replica only keeps its own shard.
+  """
+  def psum_and_slice(x):
+    nshards = jax.lax.psum(1, 'i')
+    chunk = x.shape[0] // nshards
+    return jax.lax.dynamic_slice_in_dim(
+        jax.lax.psum(x, 'i'), jax.lax.axis_index('i') * chunk, chunk)
+
+  def psum_scatter(x):
+    return jax.lax.psum_scatter(x, 'i', tiled=True)
+
+  def get_benchmark_fn(size, nshards, reduction):
+    pmap_fn = pmap(reduction, axis_name='i')
+    x = pmap(lambda x: x)(np.random.random((nshards, size * nshards))
+                          .astype(np.float32))
+    pmap_fn(x).block_until_ready()
+    def benchmark_fn():
+      for _ in range(10):
+        out = pmap_fn(x)
+      out.block_until_ready()
+    return benchmark_fn
+
+  params = []
+  nshards = min(8, jax.local_device_count())
+  for size in (2 ** 10, 2 ** 16, 2 ** 20):
+    for reduction in (psum_and_slice, psum_scatter):
+      params.append({"size": size, "nshards": nshards, "reduction": reduction})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "pmap_psum_scatter")
+
+
 def sharded_device_array_indexing_benchmark():
   """Benchmark focusing on ShardedDeviceArray indexing."""
   def get_benchmark_fn(indices_fn):
@@ -144,6 +210,8 @@ def run_all_benchmarks():
   pmap_shard_sharded_device_array_benchmark()
   pmap_shard_device_array_benchmark()
   pmap_shard_outputs_benchmark()
+  pmap_dispatch_fast_path_benchmark()
+  pmap_psum_scatter_benchmark()
   sharded_device_array_indexing_benchmark()
 
 
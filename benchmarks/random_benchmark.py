@@ -0,0 +1,129 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Microbenchmarks for `jax.random` key handling and PRNG implementations."""
+import jax
+from jax import numpy as jnp
+from jax import random
+
+import google_benchmark as benchmark
+
+
+_NUM_SAMPLES = 1 << 22
+
+
+def _uniform_benchmark(state, impl):
+  f = jax.jit(lambda key: random.uniform(key, (_NUM_SAMPLES,)))
+  key = random.PRNGKey(0, impl=impl)
+  f(key).block_until_ready()
+
+  while state:
+    f(key).block_until_ready()
+  state.counters["samples_per_second"] = benchmark.Counter(
+      _NUM_SAMPLES * state.iterations, benchmark.Counter.kIsRate)
+
+
+def _split_benchmark(state, impl):
+  f = jax.jit(lambda key: random.split(key, 1024))
+  key = random.PRNGKey(0, impl=impl)
+  f(key).block_until_ready()
+
+  while state:
+    f(key).block_until_ready()
+
+
+@benchmark.register
+def uniform_threefry2x32(state):
+  _uniform_benchmark(state, "threefry2x32")
+
+
+@benchmark.register
+def uniform_philox4x32(state):
+  _uniform_benchmark(state, "philox4x32")
+
+
+@benchmark.register
+def split_threefry2x32(state):
+  _split_benchmark(state, "threefry2x32")
+
+
+@benchmark.register
+def split_philox4x32(state):
+  _split_benchmark(state, "philox4x32")
+
+
+@benchmark.register
+def split_per_key(state):
+  key = random.PRNGKey(0)
+  while state:
+    key, subkey = random.split(key)
+  subkey.block_until_ready()
+
+
+@benchmark.register
+def key_stream_next(state):
+  keys = random.KeyStream(random.PRNGKey(0))
+  while state:
+    next(keys)
+
+
+@benchmark.register
+def permutation_1m(state):
+  f = jax.jit(lambda key: random.permutation(key, 1 << 20))
+  key = random.PRNGKey(0)
+  f(key).block_until_ready()
+
+  while state:
+    f(key).block_until_ready()
+
+
+@benchmark.register
+def permutation_index_1m(state):
+  f = jax.jit(lambda key, index: random.permutation_index(key, index, 1 << 20))
+  key = random.PRNGKey(0)
+  index = jnp.arange(1 << 20)
+  f(key, index).block_until_ready()
+
+  while state:
+    f(key, index).block_until_ready()
+
+
+def _categorical_logits():
+  return random.normal(random.PRNGKey(1), (50000,))
+
+
+@benchmark.register
+def categorical_10k_samples(state):
+  f = jax.jit(lambda key, logits: random.categorical(key, logits,
+                                                     shape=(10000,)))
+  key, logits = random.PRNGKey(0), _categorical_logits()
+  f(key, logits).block_until_ready()
+
+  while state:
+    f(key, logits).block_until_ready()
+
+
+@benchmark.register
+def categorical_from_table_10k_samples(state):
+  f = jax.jit(lambda key, table: random.categorical_from_table(key, table,
+                                                               (10000,)))
+  key = random.PRNGKey(0)
+  table = random.categorical_table(_categorical_logits())
+  f(key, table).block_until_ready()
+
+  while state:
+    f(key, table).block_until_ready()
+
+
+if __name__ == "__main__":
+  benchmark.main()
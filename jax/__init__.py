@@ -22,7 +22,10 @@ from .config import config
 from .api import (
   ad,  # TODO(phawkins): update users to avoid this.
   argnums_partial,  # TODO(phawkins): update Haiku to not use this.
+  bucketed_jit,
+  cache_info,
   checkpoint,
+  clear_caches,
   curry,  # TODO(phawkins): update users to avoid this.
   custom_ivjp,
   custom_gradient,
@@ -60,6 +63,8 @@ from .api import (
   mask,
   partial,  # TODO(phawkins): update callers to use functools.partial.
   pmap,
+  precompile,
+  prefetch_to_devices,
   pxla,  # TODO(phawkins): update users to avoid this.
   remat,
   shapecheck,
@@ -86,6 +91,7 @@ from .version import __version__
 
 # These submodules are separate because they are in an import cycle with
 # jax and rely on the names imported above.
+from . import checkpoint_policies
 from . import image
 from . import lax
 from . import nn
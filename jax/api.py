@@ -22,14 +22,18 @@ arrays.
 """
 
 # flake8: noqa: F401
+import bisect
 import collections
+import concurrent.futures
 import functools
 import inspect
 import itertools as it
+import platform
+import sys
 import threading
-import weakref
-from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, TypeVar, Union
 from warnings import warn
+import weakref
 
 import numpy as np
 from contextlib import contextmanager, ExitStack
@@ -38,11 +42,14 @@ from . import core
 from . import lib
 from . import linear_util as lu
 from . import ad_util
+from . import compile_manifest
 from . import dtypes
+from . import lazy
 from .core import eval_jaxpr
 from .api_util import (wraps, flatten_fun, apply_flat_fun, flatten_fun_nokwargs,
                        flatten_fun_nokwargs2, argnums_partial, flatten_axes,
-                       donation_vector, rebase_donate_argnums)
+                       donation_vector, rebase_donate_argnums,
+                       wrap_hashably)
 from .traceback_util import api_boundary
 from .tree_util import (tree_map, tree_flatten, tree_unflatten, tree_structure,
                         tree_transpose, tree_leaves, tree_multimap,
@@ -145,10 +152,21 @@ def jit(fun: Callable[..., T],
       buffers to reduce the amount of memory needed to perform a computation,
       for example recycling one of your input buffers to store a result. You
       should not re-use buffers that you donate to a computation, JAX will raise
-      an error if you try to.
+      an error if you try to. Passing ``"auto"`` instead donates, on each call,
+      every ``DeviceArray`` argument that nothing else refers to (e.g. the
+      result of an expression written directly in the call) and whose shape
+      and dtype match an output not already claimed by another donation. The
+      outputs are found by tracing ``fun`` once per argument signature, before
+      it is compiled, so the first call already donates. The donations
+      made by the latest call are returned by the wrapped function's
+      ``donation_report`` method; see :py:class:`DonationReport`.
 
   Returns:
-    A wrapped version of ``fun``, set up for just-in-time compilation.
+    A wrapped version of ``fun``, set up for just-in-time compilation. The
+    wrapped function has a ``lower`` method that traces and lowers ``fun`` for
+    given argument shapes and dtypes (e.g. :py:class:`ShapeDtypeStruct`
+    instances) without executing it, so that it can be compiled ahead of time;
+    see :py:class:`Lowered`.
 
   In the following example, ``selu`` can be compiled into a single fused kernel
   by XLA:
@@ -165,7 +183,7 @@ def jit(fun: Callable[..., T],
   [-0.54485  0.27744 -0.29255 -0.91421 -0.62452 -0.24748
    -0.85743 -0.78232  0.76827  0.59566 ]
   """
-  if _EXPERIMENTAL_CPP_JIT:
+  if _EXPERIMENTAL_CPP_JIT and not _is_auto_donation(donate_argnums):
     return _cpp_jit(fun, static_argnums, device, backend, donate_argnums)
   else:
     return _python_jit(fun, static_argnums, device, backend, donate_argnums)
@@ -181,14 +199,14 @@ def _python_jit(
   """The Python implementation of `jax.jit`, being slowly replaced by _cpp_jit."""
   _check_callable(fun)
   static_argnums = _ensure_tuple(static_argnums)
+  auto_donation = None
+  if _is_auto_donation(donate_argnums):
+    auto_donation = _AutoDonation(static_argnums, device, backend)
+    donate_argnums = ()
   donate_argnums = _ensure_tuple(donate_argnums)
   donate_argnums = rebase_donate_argnums(donate_argnums, static_argnums)
 
-  @wraps(fun)
-  @api_boundary
-  def f_jitted(*args, **kwargs):
-    if _jit_is_disabled():
-      return fun(*args, **kwargs)
+  def flatten_fun_and_args(args, kwargs):
     if max(static_argnums + donate_argnums, default=-1) >= len(args):
       msg = ("jitted function has static_argnums={}, donate_argnums={} but "
              "was called with only {} positional arguments.")
@@ -204,9 +222,28 @@ def _python_jit(
       donated_invars = donation_vector(donate_argnums, dyn_args, kwargs)
     else:
       donated_invars = (False,) * len(args_flat)
+    flat_fun, out_tree = flatten_fun(f, in_tree)
+    return flat_fun, out_tree, args_flat, in_tree, donated_invars
+
+  @wraps(fun)
+  @api_boundary
+  def f_jitted(*args, **kwargs):
+    if _jit_is_disabled():
+      return fun(*args, **kwargs)
+    if auto_donation is not None:
+      # Must run before any other reference to the arguments is taken.
+      unreferenced = _unreferenced_device_arrays(args, kwargs)
+    flat_fun, out_tree, args_flat, in_tree, donated_invars = \
+        flatten_fun_and_args(args, kwargs)
     for arg in args_flat:
       _check_arg(arg)
-    flat_fun, out_tree = flatten_fun(f, in_tree)
+    if compile_manifest.is_recording():
+      compile_manifest.record(fun, args, kwargs, static_argnums)
+    if auto_donation is not None:
+      donated_invars = auto_donation.donated_invars(
+          args, kwargs, in_tree, args_flat, unreferenced,
+          lambda: flatten_fun_and_args(args, kwargs)[0])
+      del unreferenced
     out = xla.xla_call(
         flat_fun,
         *args_flat,
@@ -216,9 +253,260 @@ def _python_jit(
         donated_invars=donated_invars)
     return tree_unflatten(out_tree(), out)
 
+  @api_boundary
+  def lower(*args, **kwargs) -> Lowered:
+    """Lowers the jitted function for the given argument types.
+
+    Arguments may be arrays, scalars or :py:class:`ShapeDtypeStruct` instances
+    (or pytrees thereof) describing the shapes and dtypes to specialize for.
+    Static arguments must be given concretely.
+
+    Returns:
+      A :py:class:`Lowered` object, whose ``compile`` method compiles the
+      function ahead of time. With ``donate_argnums="auto"``, no arguments of
+      the lowered computation are donated, since whether the caller still
+      refers to them is only known when they are passed.
+    """
+    flat_fun, out_tree, args_flat, in_tree, donated_invars = \
+        flatten_fun_and_args(args, kwargs)
+    arg_specs = map(_lowering_arg_spec, args_flat)
+    computation = xla.lower_xla_callable(
+        flat_fun, device, backend, flat_fun.__name__, donated_invars,
+        *arg_specs)
+    return Lowered(computation, in_tree, out_tree())
+
+  def precompile(*args, **kwargs):
+    flat_fun, _, args_flat, in_tree, donated_invars = \
+        flatten_fun_and_args(args, kwargs)
+    arg_specs = map(_lowering_arg_spec, args_flat)
+    if auto_donation is not None:
+      # Compiles the executable used by calls whose arguments are temporaries.
+      donated_invars = auto_donation.warm_up_donated_invars(
+          args, in_tree, [aval for aval, _ in arg_specs],
+          lambda: flatten_fun_and_args(args, kwargs)[0])
+    xla.precompile_xla_call(
+        flat_fun, *arg_specs, device=device, backend=backend,
+        name=flat_fun.__name__, donated_invars=donated_invars)
+
+  f_jitted.lower = lower
+  f_jitted._precompile = precompile
+  if auto_donation is not None:
+    f_jitted.donation_report = auto_donation.report
   return f_jitted
 
 
+def _lowering_arg_spec(x):
+  if isinstance(x, ShapeDtypeStruct):
+    return ShapedArray(x.shape, dtypes.canonicalize_dtype(x.dtype)), None
+  _check_arg(x)
+  return xla.arg_spec(x)
+
+
+def _is_auto_donation(donate_argnums) -> bool:
+  return isinstance(donate_argnums, str) and donate_argnums == "auto"
+
+
+class DonationReport(NamedTuple):
+  """The arguments donated by a call to a ``jit(..., donate_argnums="auto")``.
+
+  Attributes:
+    arguments: for each donated buffer, where it was found in the arguments,
+      e.g. ``"args[0] (leaf 2)"`` or ``"kwargs['x']"``.
+    avals: the abstract values of the donated buffers.
+    nbytes: the total size of the donated buffers in bytes.
+  """
+  arguments: Tuple[str, ...] = ()
+  avals: Tuple[core.AbstractValue, ...] = ()
+  nbytes: int = 0
+
+
+# Automatic donation must not donate a buffer the caller can still observe, so
+# it only considers arrays referred to by nothing but the call's arguments. The
+# number of references the calling convention itself holds on an argument (the
+# caller's value stack, the argument tuples of ``api_boundary`` and of
+# ``f_jitted``, ...) depends on the Python version, so it is measured once on a
+# probe function wrapped exactly like ``f_jitted``. Reference counts are only
+# meaningful on CPython, and weak references are not counted, so arrays that
+# are weakly referenced are never donated.
+
+class _RefcountBaseline(NamedTuple):
+  positional: int
+  keyword: int
+  list_element: int
+  dict_value: int
+  buffer: int
+
+class _BufferHolder:
+  __slots__ = ["device_buffer"]
+
+  def __init__(self, device_buffer):
+    self.device_buffer = device_buffer
+
+def _refcounts(xs):
+  return [sys.getrefcount(x) for x in xs]
+
+def _arg_refcounts(args, kwargs):
+  return _refcounts(args), _refcounts(kwargs.values())
+
+def _buffer_refcount(x):
+  return sys.getrefcount(x.device_buffer)
+
+@api_boundary
+def _refcount_probe(*args, **kwargs):
+  return _arg_refcounts(args, kwargs)
+
+@functools.lru_cache(maxsize=None)
+def _refcount_baseline() -> Optional[_RefcountBaseline]:
+  if platform.python_implementation() != "CPython":
+    return None
+  # Calls passing both positional and keyword arguments hold more references
+  # on their positional arguments, so each kind is measured on its own.
+  (positional,), _ = _refcount_probe(object())
+  _, (keyword,) = _refcount_probe(k=object())
+  x = object()
+  (positional_named,), _ = _refcount_probe(x)
+  _, (keyword_named,) = _refcount_probe(k=x)
+  if positional_named <= positional or keyword_named <= keyword:
+    # Named values and temporaries are indistinguishable (e.g. because the
+    # interpreter lends references to locals), so nothing is provably unshared.
+    return None
+  return _RefcountBaseline(
+      positional, keyword, _refcounts([object()])[0],
+      _refcounts({0: object()}.values())[0],
+      _buffer_refcount(_BufferHolder(object())))
+
+def _unreferenced_device_arrays(args, kwargs) -> Set[int]:
+  """Returns the ids of the array leaves of ``args`` nothing else refers to.
+
+  Only arrays reachable through tuples, lists and dicts that are themselves
+  referenced only by their parents are considered, and only if they own their
+  buffer, i.e. are not a lazy view of another array's buffer, and are not
+  weakly referenced.
+  """
+  baseline = _refcount_baseline()
+  found: Set[int] = set()
+  if baseline is None:
+    return found
+  positional, keyword = _arg_refcounts(args, kwargs)
+  for x, count in zip(args, positional):
+    if count <= baseline.positional:
+      _collect_unreferenced(x, baseline, found)
+  for x, count in zip(kwargs.values(), keyword):
+    if count <= baseline.keyword:
+      _collect_unreferenced(x, baseline, found)
+  return found
+
+def _collect_unreferenced(x, baseline, found):
+  if type(x) is xla.DeviceArray:
+    if (x.device_buffer is not xla.deleted_buffer and
+        lazy.is_trivial(x._lazy_expr) and
+        weakref.getweakrefcount(x) == 0 and
+        _buffer_refcount(x) <= baseline.buffer):
+      found.add(id(x))
+  elif type(x) in (tuple, list):
+    for child, count in zip(x, _refcounts(x)):
+      if count <= baseline.list_element:
+        _collect_unreferenced(child, baseline, found)
+  elif type(x) is dict:
+    for child, count in zip(x.values(), _refcounts(x.values())):
+      if count <= baseline.dict_value:
+        _collect_unreferenced(child, baseline, found)
+
+class _AutoDonation:
+  """Per-function state of ``jit(..., donate_argnums="auto")``.
+
+  An unreferenced argument is donated only if an output of the same shape and
+  dtype can reuse its buffer; otherwise donating it would just trigger XLA's
+  "donated buffers were not usable" warning. Output types are found by tracing
+  the function once per argument signature before it is first compiled, so
+  that the first compilation already donates.
+  """
+  _MAX_ENTRIES = 256
+
+  def __init__(self, static_argnums, device, backend):
+    self.static_argnums = static_argnums
+    self.device = device
+    self.backend = backend
+    self.out_types: "collections.OrderedDict[Any, Dict[Tuple, int]]" = \
+        collections.OrderedDict()
+    self.last_report = DonationReport()
+
+  def _supports_donation(self) -> bool:
+    platform = (self.device.platform if self.device is not None
+                else xb.get_backend(self.backend).platform)
+    return platform in ("gpu", "tpu")  # see xla.lower_xla_callable
+
+  def _out_types(self, args, in_tree, avals, make_flat_fun) -> Dict[Tuple, int]:
+    static_args = tuple(wrap_hashably(args[i]) for i in self.static_argnums)
+    key = (static_args, in_tree, tuple(avals))
+    out_types = self.out_types.get(key)
+    if out_types is None:
+      # `make_flat_fun` returns a fresh WrappedFun, since tracing populates its
+      # stores.
+      out_avals = pe.abstract_eval_fun(
+          make_flat_fun().call_wrapped, *map(raise_to_shaped, avals))
+      out_types = collections.Counter(
+          (a.shape, a.dtype) for a in out_avals if isinstance(a, ShapedArray))
+      self.out_types[key] = out_types
+      if len(self.out_types) > self._MAX_ENTRIES:
+        self.out_types.popitem(last=False)
+    return out_types
+
+  @staticmethod
+  def _donation_mask(types, out_types):
+    available = dict(out_types)
+    donated = []
+    for ty in types:
+      donate = available.get(ty, 0) > 0
+      if donate:
+        available[ty] -= 1
+      donated.append(donate)
+    return tuple(donated)
+
+  def donated_invars(self, args, kwargs, in_tree, args_flat, unreferenced,
+                     make_flat_fun):
+    if not unreferenced or not self._supports_donation():
+      self.last_report = DonationReport()
+      return (False,) * len(args_flat)
+    out_types = self._out_types(args, in_tree, map(xla.abstractify, args_flat),
+                                make_flat_fun)
+    donated = self._donation_mask(
+        [(x.shape, x.dtype) if id(x) in unreferenced else None
+         for x in args_flat], out_types)
+    self.last_report = self._report(args, kwargs, args_flat, donated)
+    return donated
+
+  def warm_up_donated_invars(self, args, in_tree, avals, make_flat_fun):
+    """The donations made when all array arguments are unreferenced."""
+    if not self._supports_donation():
+      return (False,) * len(avals)
+    out_types = self._out_types(args, in_tree, avals, make_flat_fun)
+    return self._donation_mask(
+        [(a.shape, a.dtype) if isinstance(a, ShapedArray) else None
+         for a in avals], out_types)
+
+  def _report(self, args, kwargs, args_flat, donated):
+    names = []
+    for i, arg in enumerate(args):
+      if i not in self.static_argnums:
+        n = tree_structure(arg).num_leaves
+        names.extend(f"args[{i}]" if n == 1 else f"args[{i}] (leaf {j})"
+                     for j in range(n))
+    for k in sorted(kwargs):
+      n = tree_structure(kwargs[k]).num_leaves
+      names.extend(f"kwargs[{k!r}]" if n == 1 else f"kwargs[{k!r}] (leaf {j})"
+                   for j in range(n))
+    leaves = [(name, x) for name, x, d in zip(names, args_flat, donated) if d]
+    return DonationReport(
+        tuple(name for name, _ in leaves),
+        tuple(raise_to_shaped(x.aval) for _, x in leaves),
+        sum(x.nbytes for _, x in leaves))
+
+  def report(self) -> DonationReport:
+    """Returns the donations made by the most recent call."""
+    return self.last_report
+
+
 def _cache_for_cpp_jit(call):
   """Cache decorator for `_cpp_jit`.
 
@@ -230,7 +518,7 @@ def _cache_for_cpp_jit(call):
   Returns:
      The memoized `call` function.
   """
-  fun_caches = weakref.WeakKeyDictionary()
+  fun_caches = lu.BoundedCache()
 
   def memoized_fun(fun: Callable,
                    static_argnums: Union[int, Iterable[int]] = (),
@@ -241,15 +529,16 @@ def _cache_for_cpp_jit(call):
     # We need tuples if we want them to be hashable.
     static_argnums = _ensure_tuple(static_argnums)
     donate_argnums = _ensure_tuple(donate_argnums)
-    cache_for_f = fun_caches.setdefault(fun, {})
     key = (static_argnums, device, backend, donate_argnums)
-    result = cache_for_f.get(key, None)
+    result = fun_caches.get(fun, key)
     if result is None:
       result = call(fun, static_argnums, device, backend, donate_argnums)
-      cache_for_f[key] = result
+      fun_caches.put(fun, key, result)
     return result
 
   memoized_fun.cache_clear = fun_caches.clear
+  memoized_fun.cache_info = fun_caches.info
+  memoized_fun.cache_evict = fun_caches.evict
   return memoized_fun
 
 
@@ -282,6 +571,10 @@ def _cpp_jit(
                                 donate_argnums)
 
   def cache_miss(*args, **kw):
+    # Calls that hit the C++ cache never reach Python, so only specializations
+    # compiled while recording are recorded.
+    if compile_manifest.is_recording():
+      compile_manifest.record(fun, args, kw, static_argnums)
     backend_ = device.platform if device else backend
     backend_ = xb.get_backend(backend_)
 
@@ -303,9 +596,10 @@ def _cpp_jit(
       options.parameter_is_tupled_arguments = True
 
     return (
-        # We call xla.backend_compile to ensure the XLA computation appears
-        # separately in Python profiling results.
-        xla.backend_compile(backend_, xla_result.xla_computation, options),
+        # We call xla.compile_or_get_cached so that executables compiled here
+        # are read from and written to the persistent compilation cache.
+        xla.compile_or_get_cached(backend_, xla_result.xla_computation,
+                                  options),
         xla_result.out_pytree_def,
         xla_result.shaped_arrays,
         xla_result.lazy_expressions)
@@ -426,6 +720,115 @@ def _jit_is_disabled():
   return _thread_local_state.jit_is_disabled or config.read("jax_disable_jit")
 
 
+def _executable_caches():
+  return (xla._xla_callable, pxla.parallel_callable, xla.xla_primitive_callable)
+
+def cache_info(fun: Optional[Callable] = None) -> lu.CacheInfo:
+  """Returns statistics about the in-memory caches of compiled executables.
+
+  Args:
+    fun: Optional, a Python callable as passed to :py:func:`jit` or
+      :py:func:`pmap`, or a primitive executed op-by-op. If given, only the
+      cache entries created by compiling ``fun`` are reported, otherwise the
+      totals over all cached functions are returned.
+
+  Returns:
+    A ``CacheInfo`` named tuple with the number of cache ``hits`` and
+    ``misses``, the number of cached executables ``num_entries``, and their
+    estimated size in bytes ``nbytes``.
+
+  The size of the caches is bounded by the
+  ``jax_compilation_cache_max_entries`` and ``jax_compilation_cache_max_bytes``
+  flags; least recently used executables are evicted first.
+
+  Executables compiled by the experimental C++ ``jit`` are not reported, since
+  they are held inside its wrappers, which expose no statistics about them.
+  :py:func:`clear_caches` still evicts those wrappers, and with them their
+  executables.
+
+  >>> import jax
+  >>>
+  >>> def f(x):
+  ...   return x + 1
+  >>> _ = jax.jit(f)(1.)
+  >>> _ = jax.jit(f)(2.)
+  >>> jax.cache_info(f)  # doctest: +SKIP
+  CacheInfo(hits=1, misses=1, num_entries=1, nbytes=6272)
+  """
+  infos = [cache.cache_info(fun) for cache in _executable_caches()]
+  return lu.CacheInfo(*map(sum, zip(*infos)))
+
+def clear_caches(fun: Optional[Callable] = None) -> None:
+  """Evicts compiled executables from the in-memory caches.
+
+  Args:
+    fun: Optional, a Python callable as passed to :py:func:`jit` or
+      :py:func:`pmap`, or a primitive executed op-by-op. If given, only the
+      executables compiled for ``fun`` are evicted, otherwise all cached
+      executables are.
+  """
+  for cache in _executable_caches():
+    cache.cache_evict(fun)
+  _cpp_jit.cache_evict(fun)
+
+
+def precompile(specializations: Iterable[Tuple],
+               max_workers: Optional[int] = None,
+               block: bool = True) -> List[concurrent.futures.Future]:
+  """Traces and compiles jitted functions for several signatures concurrently.
+
+  Each specialization is compiled on a pool of worker threads into the same
+  cache that the jitted function consults when it is called, so that later
+  calls with matching argument shapes and dtypes do not compile. Since XLA
+  compilation releases the GIL, warming up many shapes this way scales with the
+  number of available cores rather than with the number of shapes.
+
+  Args:
+    specializations: an iterable of ``(jitted_fun, args)`` or
+      ``(jitted_fun, args, kwargs)`` tuples, where ``jitted_fun`` was returned
+      by :py:func:`jit` and ``args`` is a tuple of positional arguments. Array
+      arguments may be given as arrays or as :py:class:`ShapeDtypeStruct`
+      instances (or pytrees thereof); static arguments must be given
+      concretely.
+    max_workers: Optional, the number of worker threads. Defaults to the
+      ``concurrent.futures.ThreadPoolExecutor`` default.
+    block: whether to wait for all compilations to finish. If True (the
+      default), the first exception raised by a compilation is re-raised.
+
+  Returns:
+    A list of ``concurrent.futures.Future`` objects, one per specialization,
+    which resolve to None once the corresponding executable is cached.
+
+  >>> import jax
+  >>> import jax.numpy as jnp
+  >>>
+  >>> f = jax.jit(lambda x: jnp.tanh(x) * 2)
+  >>> specs = [jax.ShapeDtypeStruct((n, 128), jnp.float32) for n in (8, 16, 32)]
+  >>> _ = jax.precompile([(f, (spec,)) for spec in specs])
+  >>> y = f(jnp.ones((16, 128)))  # no compilation
+  """
+  specializations = list(specializations)
+  for spec in specializations:
+    if not 2 <= len(spec) <= 3 or not hasattr(spec[0], "_precompile"):
+      raise TypeError("precompile expects (jitted_fun, args) or "
+                      "(jitted_fun, args, kwargs) tuples, where jitted_fun is "
+                      f"returned by jax.jit, got {spec}.")
+  if _jit_is_disabled():
+    return []
+  executor = concurrent.futures.ThreadPoolExecutor(
+      max_workers=max_workers, thread_name_prefix="jax_precompile")
+  try:
+    futures = [executor.submit(spec[0]._precompile, *spec[1],
+                               **(spec[2] if len(spec) == 3 else {}))
+               for spec in specializations]
+  finally:
+    executor.shutdown(wait=block)
+  if block:
+    for future in futures:
+      future.result()
+  return futures
+
+
 def xla_computation(fun: Callable,
                     static_argnums: Union[int, Iterable[int]] = (),
                     axis_env: Optional[Sequence[Tuple[AxisName, int]]] = None,
@@ -434,7 +837,8 @@ def xla_computation(fun: Callable,
                     tuple_args: bool = False,
                     instantiate_const_outputs: Optional[bool] = None,
                     return_shape: bool = False,
-                    donate_argnums: Union[int, Iterable[int]] = ()) -> Callable:
+                    donate_argnums: Union[int, Iterable[int]] = (),
+                    hoist_constants_min_bytes: Optional[int] = None) -> Callable:
   """Creates a function that produces its XLA computation given example args.
 
   Args:
@@ -465,6 +869,12 @@ def xla_computation(fun: Callable,
       the output of ``fun`` and where the leaves are objects with ``shape`` and
       ``dtype`` attributes representing the corresponding types of the output
       leaves.
+    donate_argnums: See the :py:func:`jax.jit` docstring.
+    hoist_constants_min_bytes: Optional int. If given, array constants closed
+      over by ``fun`` of at least this many bytes are not embedded in the XLA
+      computation, but become additional parameters following those of the
+      arguments, and the wrapped function also returns the list of their
+      values, in parameter order.
 
   Returns:
     A wrapped version of ``fun`` that when applied to example arguments returns
@@ -474,7 +884,9 @@ def xla_computation(fun: Callable,
     ``as_hlo_dot_graph``. If the argument ``return_shape`` is ``True``, then the
     wrapped function returns a pair where the first element is the XLA
     Computation and the second element is a pytree representing the structure,
-    shapes, and dtypes of the output of ``fun``.
+    shapes, and dtypes of the output of ``fun``. If
+    ``hoist_constants_min_bytes`` is given, the list of hoisted constants is
+    appended to the returned tuple.
 
   For example:
 
@@ -549,14 +961,17 @@ def xla_computation(fun: Callable,
       backend=backend,
       tuple_args=tuple_args,
       instantiate_const_outputs=instantiate_const_outputs,
-      donate_argnums=donate_argnums)
+      donate_argnums=donate_argnums,
+      hoist_constants_min_bytes=hoist_constants_min_bytes)
 
   def computation_maker(*args, **kwargs):
     xla_return = internal_computation_maker(*args, **kwargs)
+    outs = [xla_return.xla_computation]
     if return_shape:
-      return xla_return.xla_computation, xla_return.out_shape
-    else:
-      return xla_return.xla_computation
+      outs.append(xla_return.out_shape)
+    if hoist_constants_min_bytes is not None:
+      outs.append(list(xla_return.hoisted_constants))
+    return tuple(outs) if len(outs) > 1 else outs[0]
 
   return computation_maker
 
@@ -569,6 +984,8 @@ class _XlaReturn(NamedTuple):
   lazy_expressions: Optional[List[xla.lazy.LazyExpr]]
   shaped_arrays: List[core.ShapedArray]
   parameter_is_tupled_arguments: bool
+  # Constants passed as trailing parameters, see `hoist_constants_min_bytes`.
+  hoisted_constants: Sequence[Any] = ()
 
 
 def _xla_computation(
@@ -580,7 +997,8 @@ def _xla_computation(
     backend: Optional[str] = None,
     tuple_args: Optional[bool] = None,
     instantiate_const_outputs: Optional[bool] = True,
-    donate_argnums: Union[int, Iterable[int]] = ()) -> Callable:
+    donate_argnums: Union[int, Iterable[int]] = (),
+    hoist_constants_min_bytes: Optional[int] = None) -> Callable:
   """An internal implementation for `xla_computation` and `_cpp_jit`.
 
   See `xla_computation` for the full documentation.
@@ -658,10 +1076,17 @@ def _xla_computation(
       out_parts_flat = tuple(flatten_axes(
           "xla_computation out_parts", out_tree(), out_parts))
     c = xb.make_computation_builder("xla_computation_{}".format(fun_name))
-    xla_consts = map(partial(xb.constant, c), consts)
-    should_tuple = tuple_args if tuple_args is not None else (len(avals) > 100)
+    hoisted = xla.hoisted_consts(consts, hoist_constants_min_bytes)
+    hoisted_avals = [raise_to_shaped(xla.abstractify(x)) for x in hoisted]
+    should_tuple = (tuple_args if tuple_args is not None
+                    else (len(avals) + len(hoisted) > 100))
+    if in_parts_flat is not None and hoisted:
+      in_parts_flat = in_parts_flat + (None,) * len(hoisted)
     xla_args = xla._xla_callable_args(
-        c, avals, should_tuple, partitions=in_parts_flat)
+        c, avals + hoisted_avals, should_tuple, partitions=in_parts_flat)
+    xla_args, hoisted_params = split_list(xla_args, [len(avals)])
+    xla_consts = xla._xla_consts(
+        c, consts, dict(zip(map(id, hoisted), hoisted_params)))
     out_nodes = xla.jaxpr_subcomp(
         c, jaxpr, backend, axis_env_, xla_consts,
         extend_name_stack(wrap_name(fun_name, "xla_computation")), *xla_args)
@@ -692,7 +1117,8 @@ def _xla_computation(
         out_pytree_def=out_tree(),
         lazy_expressions=[xla.lazy.array(a.shape) for a in out_avals],
         shaped_arrays=out_avals,
-        parameter_is_tupled_arguments=should_tuple)
+        parameter_is_tupled_arguments=should_tuple,
+        hoisted_constants=hoisted)
 
   return computation_maker
 
@@ -1496,9 +1922,18 @@ def pmap(fun: Callable[..., T],
   if any(axis != 0 for axis in tree_leaves(in_axes)):
     raise ValueError(f"pmap in_axes leaves must be 0 or None, got {in_axes}")
 
+  fast_path_cache = pxla.FastPathCache()
+
   @wraps(fun)
   @api_boundary
   def f_pmapped(*args, **kwargs):
+    fast_path_key = None
+    if pxla.fast_path_applies():
+      fast_path_key, entry, out = _pmap_fast_path(
+          fast_path_cache, static_broadcasted_tuple, args, kwargs)
+      if out is not None:
+        pxla.parallel_callable.cache_record_hit(fun)
+        return tree_unflatten(entry.out_tree, out)
     f = lu.wrap_init(fun)
     if static_broadcasted_tuple:
       if max(static_broadcasted_tuple) >= len(args):
@@ -1525,16 +1960,52 @@ def pmap(fun: Callable[..., T],
     local_axis_size = _mapped_axis_size(in_tree, args, in_axes_flat, "pmap")
     for arg in args: _check_arg(arg)
     flat_fun, out_tree = flatten_fun(f, in_tree)
-    out = pxla.xla_pmap(
-        flat_fun, *args, backend=backend, axis_name=axis_name,
+    params = dict(
+        backend=backend, axis_name=axis_name,
         axis_size=local_axis_size, global_axis_size=axis_size,
         devices=None if devices is None else tuple(devices),
         mapped_invars=tuple(axis is not None for axis in in_axes_flat),
         name=flat_fun.__name__, donated_invars=tuple(donated_invars))
+    if fast_path_key is None:
+      out = pxla.xla_pmap(flat_fun, *args, **params)
+      return tree_unflatten(out_tree(), out)
+    # With no trace active, binding `xla_pmap` amounts to calling
+    # `xla_pmap_impl`; we inline it to keep hold of the compiled callable.
+    compiled_fun = pxla.top_level_parallel_callable(flat_fun, args, params)
+    out = compiled_fun(*args)
+    entry = pxla.FastPathEntry.from_callable(compiled_fun, out_tree())
+    if entry is not None:
+      fast_path_cache.put(fast_path_key, entry)
     return tree_unflatten(out_tree(), out)
 
   return f_pmapped
 
+def _pmap_fast_path(cache, static_argnums, args, kwargs):
+  """Looks up and runs the fast-path entry of a pmap for ``args``.
+
+  Returns the cache key for the arguments, or None if they are not all
+  ShardedDeviceArrays, along with the entry and its flat outputs if it ran.
+  """
+  if static_argnums:
+    if max(static_argnums) >= len(args):
+      return None, None, None
+    static_args = tuple(wrap_hashably(args[i]) for i in static_argnums)
+    args = tuple(arg for i, arg in enumerate(args) if i not in static_argnums)
+  else:
+    static_args = ()
+  args_flat, in_tree = tree_flatten((args, kwargs))
+  if not args_flat or any(type(arg) is not pxla.ShardedDeviceArray
+                          for arg in args_flat):
+    return None, None, None
+  key = (in_tree, static_args, tuple(arg.aval for arg in args_flat))
+  entry = cache.get(key)
+  if entry is None:
+    return key, None, None
+  out = entry(args_flat)
+  if out is not None:
+    cache.hit(key)
+  return key, entry, out
+
 # When a mapped function is given no axis name, we generate a name object based
 # on the id of the function object. Collisions aren't important because this
 # name can't be used in collectives, as user code never gets a ref to this
@@ -1621,6 +2092,109 @@ def mask(fun: Callable, in_shapes, out_shape=None) -> Callable:
       return tree_unflatten(out_tree, outs)
   return wrapped_fun
 
+def bucketed_jit(fun: Callable, in_shapes, out_shape, buckets,
+                 device=None, backend: Optional[str] = None) -> Callable:
+  """Sets up ``fun`` for jit compilation on inputs padded to bucketed shapes.
+
+  Calling a :py:func:`jit`-compiled function on inputs of a new shape triggers
+  a recompilation. For inputs whose sizes vary, e.g. sequences of different
+  lengths, ``bucketed_jit`` instead pads the polymorphic dimensions of the
+  arguments up to the next of a fixed set of bucket sizes and evaluates ``fun``
+  under :py:func:`mask` so that padding does not affect the result. The number
+  of compiled executables is thus bounded by the number of buckets.
+
+  Args:
+    fun: Function to be compiled. Its positional arguments should be arrays.
+    in_shapes: A list of shape specs, one per positional argument, in the
+      syntax accepted by :py:func:`mask`, e.g. ``['(n, 128)', 'n']``.
+    out_shape: The shape spec(s) of the output(s) of ``fun``, e.g. ``'(n,)'``.
+    buckets: Either a sequence of sizes used for every shape variable, or a dict
+      mapping shape variable names to sequences of sizes.
+    device: Optional, as for :py:func:`jit`.
+    backend: Optional, as for :py:func:`jit`.
+
+  Returns:
+    A function taking the same arguments as ``fun`` and returning its outputs at
+    their logical (unpadded) shapes. It raises a ``ValueError`` if a shape
+    variable exceeds its largest bucket. Arguments are padded with zeros where
+    they reside, so device arrays are not copied to the host, and the returned
+    function can be used inside other transformations.
+
+  >>> import jax
+  >>> import jax.numpy as jnp
+  >>> import numpy as np
+  >>>
+  >>> f = jax.bucketed_jit(lambda x: jnp.sin(x) * 2, ['n'], 'n',
+  ...                      buckets=[8, 16, 32])
+  >>> f(np.zeros(5)).shape  # compiled for n = 8
+  (5,)
+  >>> f(np.zeros(7)).shape  # reuses the executable for n = 8
+  (7,)
+  """
+  _check_callable(fun)
+  in_shapes = list(in_shapes)
+  in_specs, in_shapes_tree = tree_flatten(in_shapes)
+  in_specs = map(masking.parse_spec, in_specs)
+  out_specs, _ = tree_flatten(out_shape)
+  out_specs = map(masking.parse_spec, out_specs)
+
+  def normalize(sizes):
+    sizes = tuple(sorted(set(map(int, sizes))))
+    if not sizes:
+      raise ValueError("bucketed_jit requires at least one bucket size.")
+    return sizes
+
+  if isinstance(buckets, dict):
+    bucket_sizes = {name: normalize(sizes) for name, sizes in buckets.items()}
+    default_sizes = None
+  else:
+    bucket_sizes, default_sizes = {}, normalize(buckets)
+
+  def bucket_for(name, size):
+    sizes = bucket_sizes.get(name, default_sizes)
+    if sizes is None:
+      raise ValueError(f"bucketed_jit got no buckets for shape variable "
+                       f"'{name}'.")
+    i = bisect.bisect_left(sizes, size)
+    if i == len(sizes):
+      raise ValueError(f"bucketed_jit got size {size} for shape variable "
+                       f"'{name}', which exceeds the largest bucket "
+                       f"{sizes[-1]}.")
+    return sizes[i]
+
+  def pad_to(x, shape):
+    import jax.numpy as jnp
+    if np.shape(x) == tuple(shape):
+      return x
+    return jnp.pad(x, [(0, d - s) for s, d in zip(np.shape(x), shape)])
+
+  masked_jit = jit(mask(fun, in_shapes, out_shape), device=device,
+                   backend=backend)
+
+  @wraps(fun)
+  @api_boundary
+  def f_bucketed(*args):
+    args_flat, in_tree = tree_flatten(list(args))
+    if in_tree != in_shapes_tree:
+      raise TypeError(f"Tree mismatch: Input {in_tree} and shape spec "
+                      f"{in_shapes_tree}.")
+    arg_shapes = map(np.shape, args_flat)
+    shapes = map(masking.finalize_spec, in_specs, arg_shapes)
+    logical_env = masking.bind_shapes(shapes, arg_shapes)
+    padded_env = {name: bucket_for(name, size)
+                  for name, size in logical_env.items()}
+    padded_args = [pad_to(x, masking.eval_poly_shape(shape, padded_env))
+                   for x, shape in zip(args_flat, shapes)]
+    outs = masked_jit(tree_unflatten(in_tree, padded_args), logical_env)
+    outs_flat, out_tree = tree_flatten(outs)
+    out_shapes = map(masking.finalize_spec, out_specs, map(np.shape, outs_flat))
+    logical_outs = [
+        x[tuple(map(slice, masking.eval_poly_shape(shape, logical_env)))]
+        for x, shape in zip(outs_flat, out_shapes)]
+    return tree_unflatten(out_tree, logical_outs)
+
+  return f_bucketed
+
 @curry
 def shapecheck(in_shapes, out_shape, fun: Callable):
   _check_callable(fun)
@@ -2110,6 +2684,84 @@ def device_put_sharded(x: Sequence[Any], devices: Sequence[xc.Device]):
   return tree_multimap(_device_put_sharded, *x)
 
 
+def prefetch_to_devices(iterator: Iterable[Any], size: int = 2,
+                        devices: Optional[Sequence[xc.Device]] = None,
+                        backend: Optional[str] = None) -> Iterable[Any]:
+  """Transfers batches from ``iterator`` to devices ahead of their use by pmap.
+
+  Each element of ``iterator`` is a pytree of host arrays whose leading axes
+  have one entry per device, as passed to a :py:func:`pmap`-ed function with
+  ``in_axes=0``. The returned iterator yields the same pytrees with each leaf
+  sharded as a ShardedDeviceArray, laid out as :py:func:`pmap` expects so that
+  calls pass its buffers through without copies. ``size`` batches are kept in
+  flight ahead of the one yielded: while a step runs on the batch just yielded,
+  the following ``size`` batches are already being transferred. For example::
+
+    for batch in jax.prefetch_to_devices(dataset, size=2):
+      params = train_step(params, batch)
+
+  Args:
+    iterator: an iterable of pytrees of arrays.
+    size: the number of batches to transfer ahead of the batch yielded.
+    devices: the devices of the pmap consuming the batches, as passed to
+      :py:func:`pmap`. By default, the devices pmap assigns to a computation
+      mapped over the batch's leading axis.
+    backend: the backend of the pmap consuming the batches, used to determine
+      the default devices.
+
+  Returns:
+    An iterator over the sharded batches.
+  """
+  if size < 1:
+    raise ValueError(f"prefetch_to_devices size must be positive, got {size}.")
+  return _prefetch_to_devices(iter(iterator), size,
+                              None if devices is None else list(devices),
+                              backend)
+
+def _prefetch_to_devices(iterator, size, devices, backend):
+  queue: "collections.deque[Any]" = collections.deque()
+
+  def enqueue(n):
+    nonlocal devices
+    for batch in it.islice(iterator, n):
+      leaves, treedef = tree_flatten(batch)
+      if devices is None and leaves:
+        devices = _pmap_default_devices(np.shape(leaves[0])[:1], backend)
+      queue.append(tree_unflatten(
+          treedef, [_shard_for_pmap(x, devices) for x in leaves]))
+
+  enqueue(size)
+  while queue:
+    batch = queue.popleft()
+    # Start the next transfer before yielding, so that `size` batches are in
+    # flight while the caller works on `batch`.
+    enqueue(1)
+    yield batch
+
+def _pmap_default_devices(leading_shape, backend):
+  if not leading_shape:
+    raise ValueError("prefetch_to_devices requires arrays with a leading axis "
+                     "to shard, got a scalar.")
+  axis_size, = leading_shape
+  if xb.host_count() > 1:
+    return xb.local_devices(backend=backend)[:axis_size]
+  return xb.get_backend(backend).get_default_device_assignment(axis_size)
+
+def _shard_for_pmap(x, devices) -> pxla.ShardedDeviceArray:
+  aval = xla.abstractify(x)
+  assert isinstance(aval, ShapedArray)
+  if not aval.shape or aval.shape[0] != len(devices):
+    raise ValueError(f"prefetch_to_devices requires the leading axis size of "
+                     f"each array to equal the number of devices, "
+                     f"{len(devices)}; got an array of shape {aval.shape}.")
+  sharding_spec = pxla._pmap_sharding_spec(
+      len(devices), len(devices), 1, None,
+      ShapedArray(aval.shape[1:], aval.dtype), True)
+  indices = pxla.spec_to_indices(aval.shape, sharding_spec)
+  buffers = [buf for buf, in pxla.shard_args(devices, [indices], [x])]
+  return pxla.ShardedDeviceArray(aval, sharding_spec, buffers, indices)
+
+
 # TODO(mattjj): consider revising
 def _device_get(x):
   if isinstance(x, core.Tracer):
@@ -2175,6 +2827,93 @@ class ShapeDtypeStruct:
   def __hash__(self):
     return hash((self.shape, self.dtype))
 
+class Lowered:
+  """A jitted function traced and lowered to XLA for specific argument types.
+
+  Created by the ``lower`` method of functions returned by :py:func:`jit`, e.g.
+
+  >>> import jax
+  >>> import jax.numpy as jnp
+  >>>
+  >>> f = jax.jit(lambda x, y: jnp.dot(x, y) + 1.)
+  >>> spec = jax.ShapeDtypeStruct((128, 128), jnp.float32)
+  >>> compiled = f.lower(spec, spec).compile()
+  >>> out = compiled(jnp.ones((128, 128)), jnp.ones((128, 128)))
+  """
+  __slots__ = ["_computation", "in_tree", "out_tree"]
+
+  def __init__(self, computation: xla.XlaComputation, in_tree, out_tree):
+    self._computation = computation
+    self.in_tree = in_tree
+    self.out_tree = out_tree
+
+  @property
+  def jaxpr(self) -> core.ClosedJaxpr:
+    """The jaxpr of the flattened function, closed over its constants."""
+    return core.ClosedJaxpr(self._computation.jaxpr,
+                            list(self._computation.consts))
+
+  def hlo(self):
+    """The unoptimized XLA computation (see xla_client.py)."""
+    return self._computation.hlo()
+
+  def as_hlo_text(self) -> str:
+    """Returns the unoptimized HLO as text."""
+    return self.hlo().as_hlo_text()
+
+  def cost_analysis(self) -> Dict[str, float]:
+    """Returns XLA's cost estimates (e.g. flops, bytes accessed) for the HLO."""
+    backend = xb.get_backend(self._computation.compile_args.get("backend"))
+    try:
+      analyze = xc._xla.hlo_module_cost_analysis
+      hlo_module = self.hlo().as_hlo_module()
+    except AttributeError as err:
+      raise NotImplementedError(
+          "cost analysis requires a newer version of jaxlib") from err
+    return analyze(backend, hlo_module)
+
+  def compile(self) -> 'Compiled':
+    """Compiles the lowered computation."""
+    return Compiled(self._computation.compile(), self.in_tree,
+                    self._computation.in_avals, self.out_tree)
+
+
+class Compiled:
+  """A jitted function compiled ahead of time for specific argument types.
+
+  Calling a ``Compiled`` object with the non-static arguments of the original
+  function runs the executable directly, without tracing, cache lookups or
+  re-specialization. The arguments must match the pytree structure, shapes and
+  dtypes the function was lowered for.
+  """
+  __slots__ = ["_executable", "in_tree", "in_avals", "out_tree"]
+
+  def __init__(self, executable: xla.XlaCompiledComputation, in_tree, in_avals,
+               out_tree):
+    self._executable = executable
+    self.in_tree = in_tree
+    self.in_avals = in_avals
+    self.out_tree = out_tree
+
+  def xla_executable(self):
+    """The underlying XLA executable."""
+    return self._executable.xla_executable()
+
+  def __call__(self, *args, **kwargs):
+    args_flat, in_tree = tree_flatten((args, kwargs))
+    if in_tree != self.in_tree:
+      raise TypeError("function compiled for arguments with structure "
+                      f"{self.in_tree}, called with {in_tree}")
+    for i, (arg, aval) in enumerate(zip(args_flat, self.in_avals)):
+      arg_aval = xla.abstractify(arg)
+      if (arg_aval.shape, arg_aval.dtype) != (aval.shape, aval.dtype):
+        raise TypeError(f"function compiled for argument {i} of type "
+                        f"{aval.str_short()}, called with "
+                        f"{arg_aval.str_short()}")
+    out = self._executable.unsafe_call(*args_flat)
+    return tree_unflatten(self.out_tree, out)
+
+
 def eval_shape(fun: Callable, *args, **kwargs):
   """Compute the shape/dtype of ``fun`` without any FLOPs.
 
@@ -2245,7 +2984,9 @@ def eval_shape(fun: Callable, *args, **kwargs):
   return tree_unflatten(out_tree(), out)
 
 
-def checkpoint(fun: Callable, concrete: bool = False) -> Callable:
+def checkpoint(fun: Callable, concrete: bool = False,
+               policy: Optional[Callable[..., bool]] = None,
+               memory_budget: Optional[int] = None) -> Callable:
   """Make ``fun`` recompute internal linearization points when differentiated.
 
   The :func:`jax.checkpoint` decorator, aliased to ``jax.remat``, provides a
@@ -2283,6 +3024,17 @@ def checkpoint(fun: Callable, concrete: bool = False) -> Callable:
       control flow is optional, and disabled by default, because in some
       edge-case compositions with :func:`jax.jit` it can lead to some extra
       computation.
+    policy: Optional, a function deciding which intermediate values of ``fun``
+      may be saved rather than recomputed. It is called as
+      ``policy(prim, *avals, **params)`` for each primitive application whose
+      output is needed on the backward pass, and returns True to save its
+      outputs. See :mod:`jax.checkpoint_policies` for common policies. By
+      default nothing is saved.
+    memory_budget: Optional, a number of bytes. If given, the values saved are
+      chosen automatically (among those allowed by ``policy``, if any) so that
+      their total size stays within the budget, preferring those that are most
+      expensive to recompute per byte, e.g. the outputs of matrix
+      multiplications and convolutions.
 
   Returns:
     A function (callable) with the same input/output behavior as ``fun`` but
@@ -2326,6 +3078,15 @@ def checkpoint(fun: Callable, concrete: bool = False) -> Callable:
   ...     f2 = recursive_checkpoint(funs[len(funs)//2:])
   ...     return lambda x: f1(jax.checkpoint(f2)(x))
   ...
+
+  A policy saves some values instead of recomputing them. For example, to
+  recompute elementwise operations but not matrix multiplications:
+
+  >>> from functools import partial
+  >>> from jax import checkpoint_policies
+  >>> @partial(jax.checkpoint, policy=checkpoint_policies.dots_saveable)
+  ... def layer(W, x):
+  ...   return jnp.sin(jnp.dot(W, x))
   """
   @wraps(fun)
   @api_boundary
@@ -2333,7 +3094,8 @@ def checkpoint(fun: Callable, concrete: bool = False) -> Callable:
     args_flat, in_tree = tree_flatten((args, kwargs))
     flat_fun, out_tree = flatten_fun(lu.wrap_init(fun), in_tree)
     out_flat = pe.remat_call(flat_fun, *args_flat, name=flat_fun.__name__,
-                             concrete=concrete)
+                             concrete=concrete, policy=policy,
+                             memory_budget=memory_budget)
     return tree_unflatten(out_tree(), out_flat)
   return fun_remat
 remat = checkpoint
@@ -0,0 +1,111 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Rematerialization policies for :func:`jax.checkpoint`.
+
+A policy decides which intermediate values of a checkpointed function are saved
+on the forward pass instead of being recomputed on the backward pass. It is
+called as ``policy(prim, *avals, **params)`` for each primitive application
+whose outputs the backward pass needs, and returns True to save the outputs::
+
+  @partial(jax.checkpoint, policy=checkpoint_policies.dots_saveable)
+  def layer(W, x):
+    return jnp.tanh(jnp.dot(W, x))
+
+Values can be named with :func:`checkpoint_name` and saved by name::
+
+  def layer(W, x):
+    y = checkpoint_name(jnp.dot(W, x), "pre_activation")
+    return jnp.tanh(y)
+
+  layer = jax.checkpoint(
+      layer, policy=checkpoint_policies.save_only_these_names("pre_activation"))
+"""
+
+from typing import Callable
+
+from . import core
+from .interpreters import ad
+from .interpreters import batching
+from .interpreters import masking
+from .interpreters import xla
+from .lax import lax as lax_internal
+
+Policy = Callable[..., bool]
+
+
+def everything_saveable(*_, **__) -> bool:
+  """Saves every value, i.e. behaves as if ``jax.checkpoint`` were not used."""
+  return True
+
+def nothing_saveable(*_, **__) -> bool:
+  """Recomputes every value; the default policy of ``jax.checkpoint``."""
+  return False
+
+def dots_saveable(prim, *_, **__) -> bool:
+  """Saves the outputs of matrix multiplications and convolutions."""
+  return prim in (lax_internal.dot_general_p,
+                  lax_internal.conv_general_dilated_p)
+checkpoint_dots = dots_saveable
+
+def dots_with_no_batch_dims_saveable(prim, *_, **params) -> bool:
+  """Like ``dots_saveable``, but only for ``dot_general`` without batch dims."""
+  if prim is not lax_internal.dot_general_p:
+    return False
+  _, (lhs_batch, rhs_batch) = params['dimension_numbers']
+  return not lhs_batch and not rhs_batch
+
+def everything_except_elementwise_saveable(prim, *_, **__) -> bool:
+  """Recomputes elementwise operations, which are cheap, and saves the rest."""
+  return prim not in lax_internal.elementwise_primitives
+
+def save_only_these_names(*names: str) -> Policy:
+  """Returns a policy saving only the values named ``names``.
+
+  Values are named with :func:`checkpoint_name`.
+  """
+  names_set = frozenset(names)
+  def policy(prim, *_, **params):
+    return prim is name_p and params['name'] in names_set
+  return policy
+
+def save_any_names_but_these(*names: str) -> Policy:
+  """Returns a policy saving all named values except those named ``names``."""
+  names_set = frozenset(names)
+  def policy(prim, *_, **params):
+    return prim is name_p and params['name'] not in names_set
+  return policy
+
+def save_from_both_policies(policy_1: Policy, policy_2: Policy) -> Policy:
+  """Returns a policy saving the values saved by either policy."""
+  def policy(prim, *avals, **params):
+    return policy_1(prim, *avals, **params) or policy_2(prim, *avals, **params)
+  return policy
+
+
+def checkpoint_name(x, name: str):
+  """Identity function naming ``x`` for rematerialization policies.
+
+  See :func:`save_only_these_names` and :func:`save_any_names_but_these`.
+  """
+  return name_p.bind(x, name=name)
+
+name_p = core.Primitive('name')
+name_p.def_impl(lambda x, *, name: x)
+name_p.def_abstract_eval(lambda x, *, name: x)
+xla.translations[name_p] = lambda c, x, *, name: x
+ad.deflinear(name_p, lambda ct, *, name: [name_p.bind(ct, name=name)])
+batching.primitive_batchers[name_p] = \
+    lambda args, dims, *, name: (name_p.bind(args[0], name=name), dims[0])
+masking.defvectorized(name_p)
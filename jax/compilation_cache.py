@@ -0,0 +1,259 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent on-disk cache of compiled XLA executables.
+
+The cache is opt-in. It is enabled either by setting the
+``jax_persistent_cache_dir`` flag (or the ``JAX_PERSISTENT_CACHE_DIR``
+environment variable), or by calling :func:`initialize_cache` explicitly:
+
+  from jax import compilation_cache as cc
+  cc.initialize_cache("/tmp/jax_cache", max_cache_size_bytes=2 ** 30)
+
+Entries are keyed by a fingerprint of the unoptimized HLO module, the compile
+options (including the device assignment), the backend and the jax/jaxlib
+versions, so a cache directory can safely be shared between processes and
+versions. Executables are only cached on backends whose client can serialize
+and deserialize them.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Any, List, Optional, Tuple
+
+from absl import logging
+
+from .config import flags
+from .lib import version as jaxlib_version
+from .version import __version__ as jax_version
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string(
+    'jax_persistent_cache_dir',
+    os.getenv('JAX_PERSISTENT_CACHE_DIR', ''),
+    'Directory in which to persist compiled XLA executables across processes. '
+    'The persistent compilation cache is disabled if empty.')
+flags.DEFINE_integer(
+    'jax_persistent_cache_max_size_bytes',
+    int(os.getenv('JAX_PERSISTENT_CACHE_MAX_SIZE_BYTES', str(2 ** 32))),
+    'Maximum total size of the persistent compilation cache directory. Least '
+    'recently used entries are evicted once it is exceeded; a non-positive '
+    'value disables eviction.')
+
+Backend = Any
+XlaComputation = Any
+XlaExecutable = Any
+CompileOptions = Any
+
+
+class FileSystemCache:
+  """A size-bounded key/value store of byte strings in a local directory.
+
+  Each entry lives in its own file named after its key. Reads refresh the
+  entry's modification time, so eviction removes least-recently-used entries
+  first.
+  """
+
+  def __init__(self, path: str, max_size_bytes: int = -1):
+    if not path:
+      raise ValueError("path cannot be empty")
+    os.makedirs(path, exist_ok=True)
+    self._path = path
+    self._max_size_bytes = max_size_bytes
+    self._lock = threading.Lock()
+
+  @property
+  def path(self) -> str:
+    return self._path
+
+  def get(self, key: str) -> Optional[bytes]:
+    """Returns the value stored under ``key``, or None on a cache miss."""
+    if not key:
+      raise ValueError("key cannot be empty")
+    path_to_key = os.path.join(self._path, key)
+    try:
+      with open(path_to_key, "rb") as f:
+        value = f.read()
+    except FileNotFoundError:
+      return None
+    try:
+      os.utime(path_to_key)
+    except OSError:
+      pass  # The entry may have been evicted concurrently.
+    return value
+
+  def put(self, key: str, value: bytes):
+    """Stores ``value`` under ``key``, evicting old entries if needed."""
+    if not key:
+      raise ValueError("key cannot be empty")
+    if 0 < self._max_size_bytes < len(value):
+      logging.info("Not caching entry of %d bytes, which exceeds the cache "
+                   "size limit of %d bytes.", len(value), self._max_size_bytes)
+      return
+    # Write to a temporary file first so that concurrent readers, possibly in
+    # other processes, never observe a partially written entry.
+    fd, tmp_path = tempfile.mkstemp(dir=self._path, prefix=".tmp-")
+    try:
+      with os.fdopen(fd, "wb") as f:
+        f.write(value)
+      os.replace(tmp_path, os.path.join(self._path, key))
+    except:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      raise
+    with self._lock:
+      self._evict_if_needed()
+
+  def _entries(self) -> List[Tuple[float, int, str]]:
+    entries = []
+    with os.scandir(self._path) as it:
+      for entry in it:
+        if entry.name.startswith(".tmp-") or not entry.is_file():
+          continue
+        try:
+          stat = entry.stat()
+        except FileNotFoundError:
+          continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+  def _evict_if_needed(self):
+    if self._max_size_bytes <= 0:
+      return
+    entries = self._entries()
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+      if total_size <= self._max_size_bytes:
+        break
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      total_size -= size
+
+
+_cache: Optional[FileSystemCache] = None
+_cache_lock = threading.Lock()
+
+def initialize_cache(path: str, max_cache_size_bytes: Optional[int] = None):
+  """Creates a persistent compilation cache in the directory ``path``.
+
+  Args:
+    path: directory in which to store serialized executables. It is created if
+      it does not exist.
+    max_cache_size_bytes: optional bound on the total size of the cache
+      directory, defaults to the ``jax_persistent_cache_max_size_bytes`` flag.
+      Least recently used entries are evicted first.
+  """
+  global _cache
+  if max_cache_size_bytes is None:
+    max_cache_size_bytes = FLAGS.jax_persistent_cache_max_size_bytes
+  with _cache_lock:
+    if _cache is not None and _cache.path != path:
+      raise ValueError("The persistent compilation cache has already been "
+                       f"initialized with path {_cache.path}.")
+    _cache = FileSystemCache(path, max_cache_size_bytes)
+  logging.info("Initialized persistent compilation cache at %s", path)
+
+def _get_cache() -> Optional[FileSystemCache]:
+  if _cache is None and FLAGS.jax_persistent_cache_dir:
+    initialize_cache(FLAGS.jax_persistent_cache_dir)
+  return _cache
+
+def is_initialized() -> bool:
+  return _get_cache() is not None
+
+def reset_cache():
+  """Disables the persistent compilation cache. Cached files are kept."""
+  global _cache
+  with _cache_lock:
+    _cache = None
+
+def supports_serialization(backend: Backend) -> bool:
+  """Whether executables compiled by ``backend`` can be persisted."""
+  return (hasattr(backend, "serialize_executable") and
+          hasattr(backend, "deserialize_executable"))
+
+def get_executable(xla_computation: XlaComputation,
+                   compile_options: CompileOptions,
+                   backend: Backend) -> Optional[XlaExecutable]:
+  """Returns the cached executable for a computation, or None if absent."""
+  cache = _get_cache()
+  assert cache is not None, "persistent compilation cache is not initialized"
+  key = get_cache_key(xla_computation, compile_options, backend)
+  try:
+    serialized = cache.get(key)
+  except Exception as e:  # pylint: disable=broad-except
+    # An unreadable cache directory is treated as a miss.
+    logging.warning("Failed to read cached executable %s: %s", key, e)
+    return None
+  if serialized is None:
+    return None
+  try:
+    return backend.deserialize_executable(serialized, compile_options)
+  except Exception as e:  # pylint: disable=broad-except
+    # A corrupt or incompatible entry is treated as a miss and recompiled.
+    logging.warning("Failed to deserialize cached executable %s: %s", key, e)
+    return None
+
+def put_executable(xla_computation: XlaComputation,
+                   compile_options: CompileOptions,
+                   executable: XlaExecutable, backend: Backend):
+  """Serializes ``executable`` and stores it in the persistent cache."""
+  cache = _get_cache()
+  assert cache is not None, "persistent compilation cache is not initialized"
+  key = get_cache_key(xla_computation, compile_options, backend)
+  cache.put(key, backend.serialize_executable(executable))
+
+def get_cache_key(xla_computation: XlaComputation,
+                  compile_options: CompileOptions, backend: Backend) -> str:
+  """Returns a hex fingerprint identifying a compilation.
+
+  The fingerprint covers the serialized HLO module, the compile options, the
+  backend platform and version, and the jax and jaxlib versions.
+  """
+  hash_obj = hashlib.sha256()
+  hash_obj.update(xla_computation.as_serialized_hlo_module_proto())
+  _hash_compile_options(hash_obj, compile_options)
+  _hash_string(hash_obj, backend.platform)
+  _hash_string(hash_obj, str(getattr(backend, "platform_version", "")))
+  _hash_string(hash_obj, jax_version)
+  _hash_string(hash_obj, ".".join(map(str, jaxlib_version)))
+  return hash_obj.hexdigest()
+
+def _hash_compile_options(hash_obj, compile_options: CompileOptions):
+  build_options = compile_options.executable_build_options
+  _hash_int(hash_obj, compile_options.num_replicas)
+  _hash_int(hash_obj, compile_options.num_partitions)
+  _hash_bool(hash_obj, compile_options.parameter_is_tupled_arguments)
+  _hash_bool(hash_obj, build_options.use_spmd_partitioning)
+  if compile_options.device_assignment is not None:
+    _hash_string(hash_obj, repr(compile_options.device_assignment))
+  debug_options = build_options.debug_options
+  _hash_int(hash_obj, debug_options.xla_backend_optimization_level)
+  _hash_bool(hash_obj, debug_options.xla_llvm_disable_expensive_passes)
+
+def _hash_int(hash_obj, int_var: int):
+  hash_obj.update(int(int_var).to_bytes(8, byteorder="big", signed=True))
+
+def _hash_bool(hash_obj, bool_var: bool):
+  hash_obj.update(bool(bool_var).to_bytes(1, byteorder="big"))
+
+def _hash_string(hash_obj, str_var: str):
+  encoded = str_var.encode("utf-8")
+  _hash_int(hash_obj, len(encoded))
+  hash_obj.update(encoded)
@@ -0,0 +1,152 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Hooks reporting the time spent in each stage of compiling a computation.
+
+Every time ``jit``, ``pmap`` or op-by-op dispatch compiles a new
+specialization, it goes through up to three stages:
+
+* ``"trace"``: tracing the Python function to a jaxpr;
+* ``"lower"``: translating the jaxpr to an HLO computation;
+* ``"compile"``: compiling the HLO computation with the XLA backend (or
+  loading it from the persistent compilation cache).
+
+After each stage, registered listeners are called with a :class:`CompileEvent`.
+For example, to log all events to a file as JSON lines:
+
+  from jax import compile_events
+  logger = compile_events.log_to_file("/tmp/compile_events.jsonl")
+  ...
+  logger.close()
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, IO, List, NamedTuple, Optional, Sequence
+
+from . import core
+
+TRACE = "trace"
+LOWER = "lower"
+COMPILE = "compile"
+
+
+class CompileEvent(NamedTuple):
+  """Describes one completed stage of compiling a computation.
+
+  Attributes:
+    kind: which compilation path produced the event, one of ``"jit"``,
+      ``"pmap"`` or ``"primitive"``.
+    stage: one of ``"trace"``, ``"lower"`` or ``"compile"``.
+    fun_name: the name of the function or primitive being compiled.
+    signature: the abstract types of the arguments, e.g. ``"(f32[3], i32[])"``.
+    duration_secs: the wall-clock time spent in the stage.
+    timestamp: the time at which the stage finished, as from ``time.time()``.
+    num_eqns: the number of equations in the jaxpr, including those of nested
+      jaxprs, if known at this stage.
+    hlo_size_bytes: the size of the serialized HLO module, if known at this
+      stage.
+  """
+  kind: str
+  stage: str
+  fun_name: str
+  signature: str
+  duration_secs: float
+  timestamp: float
+  num_eqns: Optional[int] = None
+  hlo_size_bytes: Optional[int] = None
+
+
+Listener = Callable[[CompileEvent], None]
+
+_listeners: List[Listener] = []
+_listeners_lock = threading.Lock()
+
+def register_listener(listener: Listener) -> None:
+  """Calls ``listener`` with a :class:`CompileEvent` after every stage."""
+  global _listeners
+  with _listeners_lock:
+    _listeners = _listeners + [listener]
+
+def unregister_listener(listener: Listener) -> None:
+  """Removes a listener added with :func:`register_listener`."""
+  global _listeners
+  with _listeners_lock:
+    if listener not in _listeners:
+      raise ValueError(f"{listener} is not a registered compile listener.")
+    _listeners = [l for l in _listeners if l != listener]
+
+def has_listeners() -> bool:
+  return bool(_listeners)
+
+def emit(kind: str, stage: str, fun_name: str,
+         in_avals: Sequence[core.AbstractValue], start_time: float, *,
+         jaxpr: Optional[core.Jaxpr] = None, hlo: Any = None) -> None:
+  """Reports that a stage which began at ``start_time`` has just finished.
+
+  ``start_time`` is a value of ``time.perf_counter()``. The signature, equation
+  count and HLO size are only computed if there are listeners.
+  """
+  duration = time.perf_counter() - start_time
+  listeners = _listeners
+  if not listeners:
+    return
+  event = CompileEvent(
+      kind, stage, fun_name, _signature(in_avals), duration, time.time(),
+      num_eqns=None if jaxpr is None else _count_eqns(jaxpr),
+      hlo_size_bytes=(None if hlo is None else
+                      len(hlo.as_serialized_hlo_module_proto())))
+  for listener in listeners:
+    listener(event)
+
+def _signature(avals: Sequence[core.AbstractValue]) -> str:
+  return "({})".format(", ".join(
+      a.str_short() if isinstance(a, core.UnshapedArray) else str(a)
+      for a in avals))
+
+def _count_eqns(jaxpr: core.Jaxpr) -> int:
+  return len(jaxpr.eqns) + sum(map(_count_eqns, core.subjaxprs(jaxpr)))
+
+
+class JsonLinesLogger:
+  """A listener that writes each event as a JSON object on its own line."""
+
+  def __init__(self, file: IO[str]):
+    self._file = file
+    self._lock = threading.Lock()
+
+  def __call__(self, event: CompileEvent) -> None:
+    line = json.dumps(event._asdict(), sort_keys=True)
+    with self._lock:
+      self._file.write(line + "\n")
+      self._file.flush()
+
+  def close(self) -> None:
+    """Unregisters the logger, if registered, and closes its file."""
+    if self in _listeners:
+      unregister_listener(self)
+    with self._lock:
+      self._file.close()
+
+def log_to_file(path: str) -> JsonLinesLogger:
+  """Appends all subsequent compile events to ``path`` as JSON lines.
+
+  Returns:
+    The registered :class:`JsonLinesLogger`; call its ``close`` method to stop
+    logging.
+  """
+  logger = JsonLinesLogger(open(path, "a"))
+  register_listener(logger)
+  return logger
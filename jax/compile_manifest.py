@@ -0,0 +1,239 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Record-and-replay manifests of the specializations compiled by ``jit``.
+
+A manifest lists, for every distinct specialization of a jitted function that
+was compiled during a run, the function's module and qualified name, its static
+arguments and the shapes and dtypes of its other arguments. Replaying the
+manifest at startup compiles all of them concurrently with
+:func:`jax.precompile`, before the first request arrives:
+
+  from jax import compile_manifest
+
+  # During a representative run:
+  compile_manifest.start_recording("/tmp/manifest.jsonl")
+  ...
+  compile_manifest.stop_recording()
+
+  # At startup:
+  compile_manifest.replay("/tmp/manifest.jsonl")
+
+Manifests are JSON-lines files with one specialization per line, so recordings
+from several runs can be concatenated. Only functions that can be found again
+by importing their module and looking up their qualified name can be replayed
+without passing them to :func:`replay` explicitly, and only arguments that are
+arrays, Python scalars or standard containers thereof, and static arguments
+that are JSON-serializable, can be recorded.
+"""
+
+import importlib
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from absl import logging
+import numpy as np
+
+from . import core
+
+
+class UnsupportedArgumentError(Exception):
+  pass
+
+class _TracedArgumentError(Exception):
+  pass
+
+
+class ManifestRecorder:
+  """Appends each newly seen specialization to a manifest file."""
+
+  def __init__(self, path: str):
+    self._path = path
+    self._seen: Set[str] = set()
+    self._lock = threading.Lock()
+    self._file = open(path, "a")
+
+  def record(self, fun: Callable, args: Sequence[Any], kwargs: Dict[str, Any],
+             static_argnums: Tuple[int, ...]) -> None:
+    try:
+      entry = {
+          "module": getattr(fun, "__module__", None),
+          "qualname": getattr(fun, "__qualname__", None),
+          "args": [{"static": _encode_static(arg)} if i in static_argnums
+                   else _encode_tree(arg) for i, arg in enumerate(args)],
+          "kwargs": _encode_tree(kwargs),
+      }
+    except _TracedArgumentError:
+      return  # Calls under a transformation are not compiled on their own.
+    except UnsupportedArgumentError as e:
+      logging.info("Not recording a specialization of %s: %s",
+                   getattr(fun, "__name__", fun), e)
+      return
+    line = json.dumps(entry, sort_keys=True)
+    with self._lock:
+      if line in self._seen or self._file.closed:
+        return
+      self._seen.add(line)
+      self._file.write(line + "\n")
+      self._file.flush()
+
+  def close(self) -> None:
+    with self._lock:
+      self._file.close()
+
+
+_recorder: Optional[ManifestRecorder] = None
+
+def start_recording(path: str) -> None:
+  """Appends every specialization compiled by ``jit`` from now on to ``path``."""
+  global _recorder
+  stop_recording()
+  _recorder = ManifestRecorder(path)
+
+def stop_recording() -> None:
+  global _recorder
+  recorder, _recorder = _recorder, None
+  if recorder is not None:
+    recorder.close()
+
+def is_recording() -> bool:
+  return _recorder is not None
+
+def record(fun: Callable, args: Sequence[Any], kwargs: Dict[str, Any],
+           static_argnums: Tuple[int, ...]) -> None:
+  """Records a top-level call of a jitted function, if recording is enabled."""
+  recorder = _recorder
+  if recorder is not None:
+    recorder.record(fun, args, kwargs, static_argnums)
+
+
+def _encode_static(x):
+  if x is None or type(x) in (bool, int, float, str):
+    return x
+  if type(x) in (tuple, list):
+    return {type(x).__name__: [_encode_static(y) for y in x]}
+  raise UnsupportedArgumentError(f"static argument {x!r} is not serializable")
+
+def _decode_static(x):
+  if isinstance(x, dict):
+    (kind, elts), = x.items()
+    return {"tuple": tuple, "list": list}[kind](map(_decode_static, elts))
+  return x
+
+def _encode_tree(x):
+  if isinstance(x, core.Tracer):
+    raise _TracedArgumentError()
+  if x is None:
+    return {"none": None}
+  if type(x) in (tuple, list):
+    return {type(x).__name__: [_encode_tree(y) for y in x]}
+  if type(x) is dict:
+    if not all(type(k) is str for k in x):
+      raise UnsupportedArgumentError("dict keys must be strings")
+    return {"dict": [[k, _encode_tree(v)] for k, v in sorted(x.items())]}
+  if type(x) in (bool, int, float, complex):
+    # Python scalars are weakly typed, so they are replayed as Python scalars.
+    return {"scalar": type(x).__name__}
+  if hasattr(x, "shape") and hasattr(x, "dtype"):
+    return {"array": {"shape": list(np.shape(x)),
+                      "dtype": np.dtype(x.dtype).name}}
+  raise UnsupportedArgumentError(f"argument of type {type(x)} is not an array, "
+                                 "Python scalar or standard container")
+
+def _decode_tree(x, make_array: Callable):
+  (kind, val), = x.items()
+  if kind == "none":
+    return None
+  elif kind == "tuple":
+    return tuple(_decode_tree(y, make_array) for y in val)
+  elif kind == "list":
+    return [_decode_tree(y, make_array) for y in val]
+  elif kind == "dict":
+    return {k: _decode_tree(v, make_array) for k, v in val}
+  elif kind == "scalar":
+    return {"bool": bool, "int": int, "float": float, "complex": complex}[val]()
+  elif kind == "array":
+    return make_array(tuple(val["shape"]), np.dtype(val["dtype"]))
+  elif kind == "static":
+    return _decode_static(val)
+  else:
+    raise ValueError(f"unknown manifest entry kind {kind!r}")
+
+
+def load(path: str, make_array: Callable) -> List[Tuple[str, str, tuple, dict]]:
+  """Reads a manifest as a list of ``(module, qualname, args, kwargs)``.
+
+  Array arguments are created by ``make_array(shape, dtype)``. Duplicate
+  entries are dropped.
+  """
+  entries, seen = [], set()
+  with open(path) as f:
+    for line in f:
+      line = line.strip()
+      if not line or line in seen:
+        continue
+      seen.add(line)
+      entry = json.loads(line)
+      args = tuple(_decode_tree(a, make_array) for a in entry["args"])
+      kwargs = _decode_tree(entry["kwargs"], make_array)
+      entries.append((entry["module"], entry["qualname"], args, kwargs))
+  return entries
+
+def _import_jitted(module_name: Optional[str], qualname: Optional[str]):
+  if not module_name or not qualname or "<locals>" in qualname:
+    return None
+  try:
+    obj = importlib.import_module(module_name)
+    for name in qualname.split("."):
+      obj = getattr(obj, name)
+  except (ImportError, AttributeError):
+    return None
+  return obj if hasattr(obj, "_precompile") else None
+
+def replay(path: str, functions: Optional[Iterable[Callable]] = None,
+           max_workers: Optional[int] = None, block: bool = True) -> list:
+  """Compiles every specialization recorded in the manifest at ``path``.
+
+  Args:
+    path: a manifest written by :func:`start_recording`.
+    functions: Optional, the jitted functions to compile. Entries are matched to
+      them by the module and qualified name of the function they wrap. If not
+      given, functions are looked up by importing their module.
+    max_workers: Optional, as for :func:`jax.precompile`.
+    block: as for :func:`jax.precompile`.
+
+  Returns:
+    The futures returned by :func:`jax.precompile`. Entries whose function
+    cannot be found are skipped with a warning.
+  """
+  from .api import ShapeDtypeStruct, precompile
+  if functions is not None:
+    by_name = {}
+    for f in functions:
+      wrapped = getattr(f, "__wrapped__", f)
+      by_name[(wrapped.__module__, wrapped.__qualname__)] = f
+    resolve = lambda module, qualname: by_name.get((module, qualname))
+  else:
+    resolve = _import_jitted
+
+  specializations = []
+  for module, qualname, args, kwargs in load(path, ShapeDtypeStruct):
+    jitted = resolve(module, qualname)
+    if jitted is None:
+      logging.warning("Skipping manifest entry for %s.%s: jitted function not "
+                      "found.", module, qualname)
+      continue
+    specializations.append((jitted, args, kwargs))
+  return precompile(specializations, max_workers=max_workers, block=block)
@@ -175,6 +175,7 @@ import itertools
 from jax import api
 from jax import core
 from jax import custom_derivatives
+from jax import jaxpr_passes
 from jax import lax
 from jax.lib import pytree
 from jax.interpreters import ad, xla, batching, masking
@@ -431,6 +432,7 @@ The primitive has the following parameters:
 id_tap_p = core.Primitive("id_tap")
 id_tap_p.multiple_results = True
 xla.outfeed_primitives.add(id_tap_p)
+jaxpr_passes.effectful_primitives.add(id_tap_p)
 
 
 def _add_transform(params: Dict, name: str, *transform_params) -> Dict:
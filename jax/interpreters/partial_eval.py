@@ -17,7 +17,7 @@ from collections import namedtuple
 import contextlib
 import functools
 from typing import (Any, Callable, Dict, NamedTuple, Optional, Sequence, Tuple,
-                    List, Union, cast, Type, no_type_check)
+                    List, Set, Union, cast, Type, no_type_check)
 from weakref import ref
 
 import numpy as np
@@ -693,10 +693,41 @@ def _remat_partial_eval(trace, _, f, tracers, params):
                 for uk, pval in zip(out_unknowns, eval_out_pvals) if not uk]
   num_outputs = len(jaxpr_unknown.out_avals)
   num_res = len(jaxpr_known.out_avals) - num_outputs
-  jaxpr_known_nores = _dce_jaxpr(jaxpr_known, out_knowns + [False] * num_res, drop_outputs=True)
-  jaxpr_known_comp = _dce_jaxpr(jaxpr_known_nores, to_compute)
   _, in_consts = unzip2(t.pval for t in it.chain(env_tracers, tracers))
-  reconstructed_consts = core.jaxpr_as_fun(jaxpr_known_comp)(*consts, *in_consts)
+
+  # dce jaxpr outputs
+  new_jaxpr = _dce_jaxpr(closed_jaxpr, out_unknowns, drop_outputs=True).jaxpr
+
+  # Values chosen by the rematerialization policy are computed now and passed to
+  # the remat call as residuals, instead of being recomputed from its inputs.
+  # When possible, they are computed along with the known outputs, so that each
+  # is computed once.
+  reconstructed_consts = saved_vals = None
+  policy, memory_budget = params.get('policy'), params.get('memory_budget')
+  if policy is not None or memory_budget is not None:
+    new_jaxpr, saved_jaxpr = _remat_save_residuals(
+        new_jaxpr, in_unknowns, policy, memory_budget)
+    if saved_jaxpr.outvars:
+      known_outvars = [v if compute else unitvar for v, compute in zip(
+          [v for v, uk in zip(jaxpr.outvars, out_unknowns) if not uk],
+          to_compute)]
+      computable = _forward_known_vars(jaxpr, in_unknowns)
+      if all(type(v) is Literal or v is unitvar or v in computable
+             for v in known_outvars):
+        outvars = [*known_outvars, *saved_jaxpr.outvars]
+        fused_jaxpr = _dce_open_jaxpr(
+            Jaxpr((), jaxpr.invars, outvars, jaxpr.eqns), (True,) * len(outvars))
+        vals = core.eval_jaxpr(fused_jaxpr, (), *consts, *in_consts)
+        reconstructed_consts = vals[:len(known_outvars)]
+        saved_vals = vals[len(known_outvars):]
+      else:
+        saved_vals = core.eval_jaxpr(saved_jaxpr, (), *consts, *in_consts)
+  saved_tracers = map(trace.new_instantiated_const, saved_vals or [])
+
+  if reconstructed_consts is None:
+    jaxpr_known_nores = _dce_jaxpr(jaxpr_known, out_knowns + [False] * num_res, drop_outputs=True)
+    jaxpr_known_comp = _dce_jaxpr(jaxpr_known_nores, to_compute)
+    reconstructed_consts = core.jaxpr_as_fun(jaxpr_known_comp)(*consts, *in_consts)
   out_known_pvals = map(_reconstruct_pval, out_known_pvals, reconstructed_consts)
 
   # Known outputs should keep propagating as constants
@@ -707,18 +738,103 @@ def _remat_partial_eval(trace, _, f, tracers, params):
   unknown_output_tracers = [JaxprTracer(trace, out_pval, None)
                             for out_pval in out_unknown_pvals]
 
-  # dce jaxpr outputs
-  new_jaxpr = _dce_jaxpr(closed_jaxpr, out_unknowns, drop_outputs=True).jaxpr
   new_params = dict(params, call_jaxpr=new_jaxpr)
 
   # set up eqn for unknown outputs
-  in_tracers = (*const_tracers, *env_tracers, *instantiated_tracers)
+  in_tracers = (*const_tracers, *env_tracers, *instantiated_tracers,
+                *saved_tracers)
   eqn = new_eqn_recipe(in_tracers, unknown_output_tracers, remat_call_p, new_params,
                        source_info_util.current())
   for t in unknown_output_tracers: t.recipe = eqn
   return _zip_knowns(known_output_tracers, unknown_output_tracers, out_unknowns)
 call_partial_eval_rules[remat_call_p] = _remat_partial_eval
 
+# Rules estimating the FLOPs of an equation, used to decide which values to save
+# when rematerializing under a memory budget. Equations without a rule are
+# assumed to perform one operation per output element.
+remat_cost_rules: Dict[core.Primitive, Callable[..., float]] = {}
+
+def _remat_save_residuals(jaxpr: Jaxpr, in_unknowns: Sequence[bool],
+                          policy: Optional[Callable[..., bool]],
+                          memory_budget: Optional[int]) -> Tuple[Jaxpr, Jaxpr]:
+  """Splits the recomputation of known values out of a remat call's jaxpr.
+
+  Returns ``jaxpr`` with the known values chosen by ``policy`` and
+  ``memory_budget`` appended to its inputs, and a jaxpr computing them from the
+  inputs of ``jaxpr``.
+  """
+  known = {v for v, uk in zip(jaxpr.invars, in_unknowns) if not uk}
+  candidates = []
+  for eqn in jaxpr.eqns:
+    if all(type(v) is Literal or v in known for v in eqn.invars):
+      known.update(eqn.outvars)
+      if (not eqn.primitive.call_primitive and
+          all(type(v) is not core.DropVar and
+              isinstance(v.aval, core.ShapedArray) for v in eqn.outvars) and
+          (policy is None or
+           policy(eqn.primitive, *[v.aval for v in eqn.invars], **eqn.params))):
+        candidates.append(eqn)
+  if memory_budget is not None:
+    candidates = _remat_within_budget(jaxpr, candidates, memory_budget)
+
+  saved = [v for eqn in candidates for v in eqn.outvars]
+  saved_set = set(saved)
+  eqns = [eqn for eqn in jaxpr.eqns if not saved_set.issuperset(eqn.outvars)]
+  new_jaxpr = _dce_open_jaxpr(
+      Jaxpr(jaxpr.constvars, [*jaxpr.invars, *saved], jaxpr.outvars, eqns),
+      (True,) * len(jaxpr.outvars))
+  # Only keep the saved values the recomputation still reads.
+  used = _remat_read_saves(jaxpr, saved_set)
+  saved = [v for v in saved if v in used]
+  new_jaxpr = Jaxpr(new_jaxpr.constvars, [*jaxpr.invars, *saved],
+                    new_jaxpr.outvars, new_jaxpr.eqns)
+  saved_jaxpr = _dce_open_jaxpr(
+      Jaxpr(jaxpr.constvars, jaxpr.invars, saved, jaxpr.eqns),
+      (True,) * len(saved))
+  return new_jaxpr, saved_jaxpr
+
+def _forward_known_vars(jaxpr: Jaxpr, in_unknowns: Sequence[bool]) -> Set[core.Var]:
+  # The variables computed only from known inputs, by equations whose operands
+  # are all known.
+  known = {v for v, uk in zip(jaxpr.invars, in_unknowns) if not uk}
+  for eqn in jaxpr.eqns:
+    if all(type(v) is Literal or v in known for v in eqn.invars):
+      known.update(eqn.outvars)
+  return known
+
+def _remat_read_saves(jaxpr: Jaxpr, saved: Set[core.Var]) -> Set[core.Var]:
+  # The saved variables read by the recomputation of the outputs of `jaxpr`,
+  # once the equations computing them are dropped.
+  needed = {v for v in jaxpr.outvars if isinstance(v, core.Var)}
+  for eqn in jaxpr.eqns[::-1]:
+    if not saved.issuperset(eqn.outvars) and needed.intersection(eqn.outvars):
+      needed.update(v for v in eqn.invars if isinstance(v, core.Var))
+  return needed & saved
+
+def _remat_within_budget(jaxpr: Jaxpr, eqns, memory_budget: int):
+  # Greedily saves the outputs that are most expensive to recompute per byte.
+  # Only the values still read once the chosen ones are saved are charged: e.g.
+  # saving `cos(a)` drops `a` if nothing else recomputed reads it.
+  def nbytes(eqn):
+    return sum(np.prod(v.aval.shape, dtype=np.int64) *
+               np.dtype(v.aval.dtype).itemsize for v in eqn.outvars)
+  def cost(eqn):
+    rule = remat_cost_rules.get(eqn.primitive)
+    if rule is not None:
+      return rule(*[v.aval for v in eqn.invars], **eqn.params)
+    return sum(np.prod(v.aval.shape, dtype=np.int64) for v in eqn.outvars)
+  order = sorted(range(len(eqns)),
+                 key=lambda i: -cost(eqns[i]) / max(nbytes(eqns[i]), 1))
+  chosen: Set[int] = set()
+  for i in order:
+    trial = chosen | {i}
+    read = _remat_read_saves(
+        jaxpr, {v for j in trial for v in eqns[j].outvars})
+    trial = {j for j in trial if read.intersection(eqns[j].outvars)}
+    if sum(nbytes(eqns[j]) for j in trial) <= memory_budget:
+      chosen = trial
+  return [eqn for i, eqn in enumerate(eqns) if i in chosen]
+
 def _partition_knowns(pvals, unknowns: Sequence[bool]):
   return ([e for e, unknown in zip(pvals, unknowns) if not unknown],
           [e for e, unknown in zip(pvals, unknowns) if unknown])
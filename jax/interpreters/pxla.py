@@ -29,24 +29,29 @@
 # replica groups for collective operations.
 
 from contextlib import contextmanager
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+import functools
 import itertools as it
 import operator as op
 import threading
+import time
+import weakref
 from typing import (Any, Callable, Dict, List, Optional, Sequence, Set, Tuple,
                     Type, Union, no_type_check)
+from warnings import warn
 
 from absl import logging
 import numpy as np
 
-from ..config import flags, config
+from ..config import flags, config, bool_env
+from .. import compile_events
 from .. import core
 from .. import linear_util as lu
 from .. import lazy
 from ..abstract_arrays import ConcreteArray, ShapedArray, array_types
 from ..core import Var, Literal
 from ..util import (partial, unzip2, unzip3, prod, safe_map, safe_zip,
-                    extend_name_stack, wrap_name)
+                    extend_name_stack, wrap_name, cache)
 from ..lib import xla_bridge as xb
 from ..lib import xla_client as xc
 from ..tree_util import tree_flatten, tree_map
@@ -60,6 +65,11 @@ from . import ad
 xops = xc.ops
 
 FLAGS = flags.FLAGS
+flags.DEFINE_bool(
+    'jax_pmap_fast_path', bool_env('JAX_PMAP_FAST_PATH', True),
+    'Dispatch repeated pmap calls whose arguments are ShardedDeviceArrays '
+    'already sharded as the computation expects directly to its cached '
+    'executable.')
 
 unsafe_map, map = map, safe_map
 
@@ -465,9 +475,12 @@ def _shard_sharded_device_array_slow_path(x, devices, indices):
     # Look up all buffers that contain the correct slice of the logical array.
     candidates_list = candidates[_hashable_index(idx)]
     if not candidates_list:
-      # This array isn't sharded correctly. Reshard it via host roundtrip.
-      # TODO(skye): more efficient reshard?
-      return shard_arg_handlers[type(x._value)](x._value, devices, indices)
+      # This array isn't sharded correctly. Reshard it on device if its shards
+      # can be assembled from slices of x's buffers, else via host roundtrip.
+      bufs = _reshard_on_device(x, devices, indices)
+      if bufs is None:
+        return shard_arg_handlers[type(x._value)](x._value, devices, indices)
+      return bufs
     # Try to find a candidate buffer already on the correct device,
     # otherwise copy one of them.
     for buf in candidates_list:
@@ -479,6 +492,150 @@ def _shard_sharded_device_array_slow_path(x, devices, indices):
   return bufs
 shard_arg_handlers[ShardedDeviceArray] = _shard_sharded_device_array_slow_path
 
+Box = Tuple[Tuple[int, int], ...]
+
+def _reshard_on_device(x: ShardedDeviceArray, devices, indices
+                       ) -> Optional[List[xb.xla_client._xla.PyLocalBuffer]]:
+  """Builds the shards of ``x`` at ``indices`` from its device buffers.
+
+  Each target shard is assembled on its device from a grid of slices of x's
+  shards: sliced on the device holding the source shard, copied directly
+  between devices, and concatenated on the target device. This covers e.g.
+  going between replicated and sharded layouts, or between shardings along
+  different axes, without a host roundtrip. Returns None if some target shard
+  cannot be assembled this way.
+  """
+  shape = x.aval.shape
+  dtype = x.aval.dtype
+  sources: Dict[Box, List[Any]] = defaultdict(list)
+  for buf, idx in safe_zip(x.device_buffers, x.indices):
+    source = _index_to_box(idx, shape)
+    if source is None:
+      return None
+    sources[source[0]].append(buf)
+
+  bufs = []
+  for idx, device in safe_zip(indices, devices):
+    target = _index_to_box(idx, shape)
+    if target is None:
+      return None
+    box, out_shape = target
+    cover = _grid_cover(box, sources)
+    if cover is None:
+      return None
+    grid, pieces = cover
+    in_bufs, in_shapes, full_shapes, slices = [], [], [], []
+    for source_box, piece in pieces:
+      candidates = sources[source_box]
+      buf = next((b for b in candidates if b.device() == device), candidates[0])
+      full_shape = tuple(hi - lo for lo, hi in source_box)
+      slc = None
+      if piece != source_box:
+        slc = (tuple(p_lo - s_lo for (p_lo, _), (s_lo, _) in zip(piece, source_box)),
+               tuple(p_hi - s_lo for (_, p_hi), (s_lo, _) in zip(piece, source_box)))
+      if slc is not None and buf.device() != device:
+        # Slice on the source device, so that only the piece is copied.
+        piece_shape = tuple(hi - lo for lo, hi in piece)
+        buf = _reshard_computation(
+            buf.device(), dtype, (buf.shape().dimensions(),), (full_shape,),
+            (slc,), (1,) * len(shape), piece_shape)([buf])
+        full_shape, slc = piece_shape, None
+      if buf.device() != device:
+        buf = buf.copy_to_device(device)
+      in_bufs.append(buf)
+      in_shapes.append(tuple(buf.shape().dimensions()))
+      full_shapes.append(full_shape)
+      slices.append(slc)
+    if len(in_bufs) == 1 and slices[0] is None and in_shapes[0] == out_shape:
+      bufs.append(in_bufs[0])
+    else:
+      bufs.append(_reshard_computation(
+          device, dtype, tuple(in_shapes), tuple(full_shapes), tuple(slices),
+          grid, out_shape)(in_bufs))
+  return bufs
+
+def _index_to_box(idx, shape) -> Optional[Tuple[Box, Tuple[int, ...]]]:
+  """The region of an array of ``shape`` selected by ``idx``, and its shape."""
+  if not isinstance(idx, tuple):
+    idx = (idx,)
+  if len(idx) > len(shape):
+    return None
+  box, out_shape = [], []
+  for d, size in enumerate(shape):
+    i = idx[d] if d < len(idx) else slice(None)
+    if type(i) is slice:
+      start, stop, step = i.indices(size)
+      if step != 1:
+        return None
+      box.append((start, stop))
+      out_shape.append(stop - start)
+    else:
+      i = int(i)
+      box.append((i, i + 1))
+  return tuple(box), tuple(out_shape)
+
+def _grid_cover(box: Box, sources: Dict[Box, Any]
+                ) -> Optional[Tuple[Tuple[int, ...], List[Tuple[Box, Box]]]]:
+  """Tiles ``box`` with its intersections with the ``sources`` boxes.
+
+  Returns the number of tiles along each dimension and, in row-major order, the
+  source and intersection box of each tile, or None if the intersections do not
+  form a grid exactly covering ``box``.
+  """
+  pieces: Dict[Box, Box] = {}
+  for source in sources:
+    piece = tuple((max(s_lo, t_lo), min(s_hi, t_hi))
+                  for (s_lo, s_hi), (t_lo, t_hi) in zip(source, box))
+    if all(lo < hi for lo, hi in piece):
+      pieces.setdefault(piece, source)
+  if not pieces:
+    return None
+  ranges = [sorted({piece[d] for piece in pieces}) for d in range(len(box))]
+  for (lo, hi), rs in zip(box, ranges):
+    if (rs[0][0] != lo or rs[-1][1] != hi or
+        any(a[1] != b[0] for a, b in zip(rs[:-1], rs[1:]))):
+      return None
+  grid = tuple(len(rs) for rs in ranges)
+  if len(pieces) != prod(grid):
+    return None
+  cover = []
+  for piece in it.product(*ranges):
+    if piece not in pieces:
+      return None
+    cover.append((pieces[piece], piece))
+  return grid, cover
+
+@cache()
+def _reshard_computation(device, dtype, in_shapes, full_shapes, slices, grid,
+                         out_shape):
+  """Compiles a computation slicing and concatenating buffers on ``device``.
+
+  Input ``i``, of shape ``in_shapes[i]``, is reshaped to ``full_shapes[i]`` and,
+  unless ``slices[i]`` is None, sliced from ``slices[i][0]`` to
+  ``slices[i][1]``. The pieces, in row-major order of a grid with ``grid[d]``
+  pieces along dimension ``d``, are concatenated and reshaped to ``out_shape``.
+  """
+  c = xb.make_computation_builder("reshard")
+  pieces = []
+  for i, (in_shape, full_shape, slc) in enumerate(
+      safe_zip(in_shapes, full_shapes, slices)):
+    piece = xb.parameter(c, i, xc.Shape.array_shape(dtype, in_shape))
+    piece = xops.Reshape(piece, full_shape)
+    if slc is not None:
+      start, limit = slc
+      piece = xops.Slice(piece, start, limit, (1,) * len(start))
+    pieces.append(piece)
+  for d in reversed(range(len(grid))):
+    if grid[d] > 1:
+      pieces = [xops.ConcatInDim(c, pieces[j:j + grid[d]], d)
+                for j in range(0, len(pieces), grid[d])]
+  out, = pieces
+  built = c.build(xops.Reshape(out, out_shape))
+  options = xb.get_compile_options(num_replicas=1, num_partitions=1,
+                                   device_assignment=(device.id,))
+  compiled = xla.backend_compile(xb.get_device_backend(device), built, options)
+  return lambda bufs: compiled.execute(bufs)[0]
+
 def _sharded_device_array_constant_handler(c, val, canonicalize_types=True):
   return xb.constant(c, np.asarray(val), canonicalize_types=canonicalize_types)
 xb.register_constant_handler(ShardedDeviceArray, _sharded_device_array_constant_handler)
@@ -499,7 +656,32 @@ def xla_pmap_impl(fun: lu.WrappedFun, *args, backend, axis_name, axis_size,
                                    donated_invars, *abstract_args)
   return compiled_fun(*args)
 
-@lu.cache
+def top_level_parallel_callable(fun: lu.WrappedFun, args, params):
+  """Returns the compiled callable binding ``xla_pmap_p`` would run ``args`` on.
+
+  Must be called outside of any transformation. ``fun`` is wrapped exactly like
+  ``core.call_bind`` wraps it, so that the ``parallel_callable`` cache entry is
+  shared with calls going through ``xla_pmap``.
+  """
+  top_trace = core.find_top_trace(args)
+  fun, _ = core.process_env_traces(
+      fun, xla_pmap_p, top_trace and top_trace.level, tuple(params.items()))
+  return parallel_callable(
+      fun, params['backend'], params['axis_name'], params['axis_size'],
+      params['global_axis_size'], params['devices'], params['name'],
+      params['mapped_invars'], params['donated_invars'],
+      *unsafe_map(xla.abstractify, args))
+
+# The live `FastPathCache`s, whose entries hold executables of
+# `parallel_callable` and are dropped whenever it evicts.
+_fast_path_caches = weakref.WeakSet()  # type: weakref.WeakSet
+
+def _clear_fast_path_caches():
+  for fast_path_cache in list(_fast_path_caches):
+    fast_path_cache.clear()
+
+@partial(lu.cache, weigher=xla._compiled_callable_nbytes,
+         on_evict=_clear_fast_path_caches)
 def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
                       devices, name, mapped_invars, donated_invars, *avals):
   if devices is not None and len(devices) == 0:
@@ -542,6 +724,7 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
   else:
     local_devices = None
 
+  start_time = time.perf_counter()
   if config.omnistaging_enabled:
     sharded_avals = tuple(shard_aval(axis_size, aval) if m else aval
                           for m, aval in zip(mapped_invars, avals))
@@ -565,6 +748,8 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
     jaxpr = xla.apply_outfeed_rewriter(jaxpr)
 
     out_pvs, out_consts = unzip2(out_pvals)
+  compile_events.emit("pmap", compile_events.TRACE, fun.__name__, avals,
+                      start_time, jaxpr=jaxpr)
 
   # TODO(skye,mattjj): allow more collectives on multi-host as we test them, but
   # for now raise an error
@@ -635,6 +820,7 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
 
   tuple_args = len(sharded_avals) > 100  # pass long arg lists as tuple for TPU
 
+  start_time = time.perf_counter()
   c = xb.make_computation_builder("pmap_{}".format(fun.__name__))
   xla_consts = map(partial(xb.constant, c), consts)
   xla_args = xla._xla_callable_args(c, sharded_avals, tuple_args,
@@ -650,7 +836,15 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
   backend = xb.get_backend(backend)
   if backend.platform in ("gpu", "tpu"):
     donated_invars = xla.set_up_aliases(c, xla_args, out_tuple, donated_invars, tuple_args)
+  if any(donated_invars):
+    # Donations that could not be aliased to an output are left as ordinary
+    # inputs: their buffers are not invalidated when the computation runs.
+    unused_donations = [str(c.GetShape(a))
+                        for a, d in zip(xla_args, donated_invars) if d]
+    warn("Some donated buffers were not usable: {}".format(", ".join(unused_donations)))
   built = c.Build(out_tuple)
+  compile_events.emit("pmap", compile_events.LOWER, fun.__name__, avals,
+                      start_time, jaxpr=jaxpr, hlo=built)
 
   if devices is None:
     if num_global_shards > xb.device_count(backend):
@@ -703,7 +897,10 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
       use_spmd_partitioning=use_spmd_partitioning,
   )
   compile_options.parameter_is_tupled_arguments = tuple_args
-  compiled = xla.backend_compile(backend, built, compile_options)
+  start_time = time.perf_counter()
+  compiled = xla.compile_or_get_cached(backend, built, compile_options)
+  compile_events.emit("pmap", compile_events.COMPILE, fun.__name__, avals,
+                      start_time, hlo=built)
 
   arg_parts_ = arg_parts or [None] * len(avals)
   input_sharding_specs = [
@@ -935,6 +1132,98 @@ def execute_replicated(compiled, backend, in_handler, out_handler, *args):
   return out_handler(out_bufs)
 
 
+def fast_path_applies() -> bool:
+  """Whether a pmap called now may bypass ``xla_pmap`` and run directly."""
+  return (FLAGS.jax_pmap_fast_path and config.omnistaging_enabled and
+          core.thread_local_state.trace_state.trace_stack.dynamic.level == 0)
+
+class FastPathEntry:
+  """The dispatch decisions of ``parallel_callable`` for one argument signature.
+
+  Calling an entry with the flattened arguments of a pmap runs the executable
+  directly on their buffers, without the per-argument type, sharding and device
+  checks of ``shard_args``, provided each argument is a ShardedDeviceArray whose
+  ``indices`` object is the one it saw last time for that position (typically
+  the indices of an output of the same computation, as in a training loop).
+  Otherwise the sharding is checked once; if it differs from what the
+  executable expects, the call returns None and the caller takes the slow path.
+  """
+  __slots__ = ["compiled", "devices", "input_indices", "out_handler",
+               "out_tree", "_trusted_indices"]
+
+  def __init__(self, compiled, devices, input_indices, out_handler, out_tree):
+    self.compiled = compiled
+    self.devices = devices
+    self.input_indices = input_indices
+    self.out_handler = out_handler
+    self.out_tree = out_tree
+    self._trusted_indices = [None] * len(input_indices)
+
+  @classmethod
+  def from_callable(cls, compiled_fun, out_tree) -> Optional['FastPathEntry']:
+    """Builds an entry from the result of ``parallel_callable``, if possible."""
+    if not (isinstance(compiled_fun, functools.partial) and
+            compiled_fun.func is execute_replicated):
+      return None
+    compiled, _, in_handler, out_handler = compiled_fun.args
+    if not (isinstance(in_handler, functools.partial) and
+            in_handler.func is shard_args):
+      return None
+    devices, input_indices = in_handler.args
+    if any(idx is None for idx in input_indices):
+      return None
+    return cls(compiled, devices, input_indices, out_handler, out_tree)
+
+  def __call__(self, args):
+    trusted = self._trusted_indices
+    for a, arg in enumerate(args):
+      if arg.device_buffers is None:
+        return None
+      if arg.indices is not trusted[a]:
+        if (arg.indices != self.input_indices[a] or
+            any(buf.device() != d
+                for buf, d in zip(arg.device_buffers, self.devices))):
+          return None
+        trusted[a] = arg.indices
+    input_bufs = [list(bufs) for bufs in zip(*[arg.device_buffers for arg in args])]
+    if not input_bufs:
+      return None
+    out_bufs = self.compiled.execute_on_local_devices(input_bufs)
+    return self.out_handler(out_bufs)
+
+
+class FastPathCache:
+  """The ``FastPathEntry``s of one pmapped function, keyed on argument signature.
+
+  At most ``FAST_PATH_CACHE_SIZE`` entries are kept, in least-recently-used
+  order. Since entries hold executables of ``parallel_callable``, all of them
+  are dropped whenever it evicts an executable, e.g. to stay within its bounds
+  or in ``jax.clear_caches``, so that evicted executables are neither kept alive
+  nor run.
+  """
+  __slots__ = ["_entries", "__weakref__"]
+
+  def __init__(self):
+    self._entries: "OrderedDict[Any, FastPathEntry]" = OrderedDict()
+    _fast_path_caches.add(self)
+
+  def get(self, key) -> Optional[FastPathEntry]:
+    return self._entries.get(key)
+
+  def hit(self, key):
+    self._entries.move_to_end(key)
+
+  def put(self, key, entry: FastPathEntry):
+    self._entries[key] = entry
+    if len(self._entries) > FAST_PATH_CACHE_SIZE:
+      self._entries.popitem(last=False)
+
+  def clear(self):
+    self._entries.clear()
+
+FAST_PATH_CACHE_SIZE = 64
+
+
 xla_pmap_p = core.MapPrimitive('xla_pmap')
 xla_pmap = xla_pmap_p.bind
 xla_pmap_p.def_impl(xla_pmap_impl)
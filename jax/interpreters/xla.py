@@ -16,6 +16,8 @@
 from collections import defaultdict, deque, namedtuple
 import itertools as it
 import operator as op
+import os
+import time
 from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Type, Tuple
 from warnings import warn
 
@@ -25,7 +27,10 @@ import numpy as np
 from ..config import flags, bool_env, config
 from .. import core
 from .. import ad_util
+from .. import compilation_cache as cc
+from .. import compile_events
 from .. import dtypes
+from .. import jaxpr_passes
 from .. import lazy
 from .. import linear_util as lu
 from .. import source_info_util
@@ -34,7 +39,7 @@ from ..abstract_arrays import (ConcreteArray, ShapedArray, AbstractToken,
                                abstract_token)
 from ..core import Literal, pp_eqn_compact
 from ..pprint_util import pp
-from ..util import (partial, partialmethod, cache, prod, unzip2,
+from ..util import (partial, partialmethod, cache, prod, unzip2, split_list,
                     extend_name_stack, wrap_name, safe_zip, safe_map)
 from ..lib import xla_bridge as xb
 from ..lib import xla_client as xc
@@ -65,6 +70,13 @@ flags.DEFINE_bool('jax_debug_nans',
 flags.DEFINE_bool('jax_log_compiles',
                   bool_env('JAX_LOG_COMPILES', False),
                   'Print a message each time a `jit` computation is compiled.')
+flags.DEFINE_integer(
+    'jax_hoist_constants_min_bytes',
+    int(os.getenv('JAX_HOIST_CONSTANTS_MIN_BYTES', '-1')),
+    'Closed-over array constants of a `jit` computation of at least this many '
+    'bytes are passed to the executable as parameters, transferred to the '
+    'device once when it is compiled, instead of being embedded in its HLO. '
+    'Hoisting is disabled if negative.')
 
 # This flag is set on exit; no logging should be attempted
 _on_exit = False
@@ -242,7 +254,31 @@ def _partition_outputs(avals, outs):
   return [[next(outs) for _ in range(nout)] for nout in nouts]
 
 
-@cache()
+def executable_nbytes(compiled: XlaExecutable) -> int:
+  """Estimates the memory held by a compiled executable.
+
+  Uses the size of the generated code when the backend reports it, and falls
+  back to the size of the optimized HLO text otherwise.
+  """
+  try:
+    return int(compiled.size_of_generated_code_in_bytes())
+  except AttributeError:
+    pass
+  try:
+    return sum(len(m.to_string()) for m in compiled.hlo_modules())
+  except AttributeError:
+    return 0
+
+def _compiled_callable_nbytes(compiled_fun) -> int:
+  # Compiled callables are partial applications of one of the _execute_*
+  # functions below to an executable (see _xla_callable and
+  # xla_primitive_callable); trivial computations hold no executable.
+  for arg in getattr(compiled_fun, "args", ()):
+    if hasattr(arg, "execute_on_local_devices"):
+      return executable_nbytes(arg)
+  return 0
+
+@partial(lu.bounded_cache, weigher=_compiled_callable_nbytes)
 def xla_primitive_callable(prim, *arg_specs: Tuple[core.AbstractValue,
                                                    Optional[Device]], **params):
   avals, arg_devices = unzip2(arg_specs)
@@ -273,14 +309,20 @@ def xla_primitive_callable(prim, *arg_specs: Tuple[core.AbstractValue,
         f"compiling a primitive computation `{prim}` that requires {nreps} "
         f"replicas, but only {xb.device_count(backend)} XLA devices are "
         f"available on backend {backend.platform}.")
+  start_time = time.perf_counter()
   built_c = primitive_computation(prim, AxisEnv(nreps, (), (), None), backend,
                                   tuple_args, *avals, **params)
+  compile_events.emit("primitive", compile_events.LOWER, prim.name, avals,
+                      start_time, hlo=built_c)
   options = xb.get_compile_options(
       num_replicas=nreps,
       num_partitions=1,
       device_assignment=device and (device.id,))
   options.parameter_is_tupled_arguments = tuple_args
+  start_time = time.perf_counter()
   compiled = backend_compile(backend, built_c, options)
+  compile_events.emit("primitive", compile_events.COMPILE, prim.name, avals,
+                      start_time, hlo=built_c)
   if nreps == 1:
     return partial(_execute_compiled_primitive, prim, compiled, handle_result)
   else:
@@ -343,6 +385,24 @@ def backend_compile(backend, built_c, options):
   # separately in Python profiling results
   return backend.compile(built_c, compile_options=options)
 
+def compile_or_get_cached(backend, computation, compile_options):
+  """Like `backend_compile`, but consults the persistent compilation cache."""
+  if not (cc.is_initialized() and cc.supports_serialization(backend)):
+    return backend_compile(backend, computation, compile_options)
+  cached_executable = cc.get_executable(computation, compile_options, backend)
+  if cached_executable is not None:
+    logging.info("Persistent compilation cache hit for %s.", computation.name())
+    return cached_executable
+  compiled = backend_compile(backend, computation, compile_options)
+  try:
+    cc.put_executable(computation, compile_options, compiled, backend)
+  except Exception as e:  # pylint: disable=broad-except
+    # Failing to persist an executable, e.g. because the cache directory is
+    # full or read-only, must not fail an otherwise successful compile.
+    logging.warning("Failed to write %s to the persistent compilation cache: "
+                    "%s", computation.name(), e)
+  return compiled
+
 def _execute_compiled_primitive(prim, compiled, result_handler, *args):
   device, = compiled.local_devices()
   input_bufs = list(it.chain.from_iterable(device_put(x, device) for x in args if x is not token))
@@ -562,6 +622,22 @@ def _xla_call_impl(fun: lu.WrappedFun, *args, device, backend, name, donated_inv
           "Calling the de-optimized version.")
     return fun.call_wrapped(*args)  # probably won't return
 
+def precompile_xla_call(fun: lu.WrappedFun, *arg_specs, device, backend, name,
+                        donated_invars):
+  """Compiles ``fun`` into the cache consulted by top-level ``xla_call``.
+
+  ``arg_specs`` are ``(aval, device)`` pairs as produced by ``arg_spec``. The
+  cache entry is keyed exactly like the one ``_xla_call_impl`` would create
+  when ``xla_call_p`` is bound outside of any transformation, so that a later
+  call with matching arguments is a cache hit. Safe to call from any thread.
+  """
+  params = dict(device=device, backend=backend, name=name,
+                donated_invars=donated_invars)
+  top_trace = core.find_top_trace(())
+  fun, _ = core.process_env_traces(
+      fun, xla_call_p, top_trace and top_trace.level, tuple(params.items()))
+  _xla_callable(fun, device, backend, name, donated_invars, *arg_specs)
+
 def flatten_shape(s: XlaShape) -> Sequence[Tuple[Sequence[int], XlaShape]]:
   """Expands a given shape tree into a flat list of indices to arrays.
 
@@ -605,19 +681,52 @@ def flatten_shape(s: XlaShape) -> Sequence[Tuple[Sequence[int], XlaShape]]:
           yield subindex, sub
   return tuple(_flatten_shape(s, index=()))
 
-def _xla_consts(c, consts):
+def _xla_consts(c, consts, hoisted_params=None):
+  """Embeds `consts` in `c`, except those with an entry in `hoisted_params`.
+
+  `hoisted_params` maps the `id` of a hoisted constant to the XLA parameter
+  that stands in for it.
+  """
+  hoisted_params = hoisted_params or {}
   unique_consts = {id(const): const for const in consts}
   xla_consts = {
-      id_: xb.constant(c, const) for id_, const in unique_consts.items()}
+      id_: hoisted_params[id_] if id_ in hoisted_params
+      else xb.constant(c, const) for id_, const in unique_consts.items()}
   return [xla_consts[id(const)] for const in consts]
 
-@lu.cache
+def hoisted_consts(consts, min_bytes: Optional[int]) -> List[Any]:
+  """Returns the unique array constants of at least `min_bytes` bytes.
+
+  Hoisted constants are passed to a computation as trailing parameters rather
+  than embedded in its HLO, so that its size and compile time don't scale with
+  theirs. Nothing is hoisted if `min_bytes` is None or negative.
+  """
+  if min_bytes is None or min_bytes < 0:
+    return []
+  unique_consts = {id(const): const for const in consts}
+  return [const for const in unique_consts.values()
+          if isinstance(const, (np.ndarray, DeviceArray))
+          and _const_nbytes(const) >= min_bytes]
+
+def _const_nbytes(const) -> int:
+  aval = abstractify(const)
+  assert isinstance(aval, ShapedArray)
+  return prod(aval.shape) * np.dtype(aval.dtype).itemsize
+
+@partial(lu.cache, weigher=_compiled_callable_nbytes)
 def _xla_callable(fun: lu.WrappedFun, device, backend, name, donated_invars, *arg_specs):
+  return lower_xla_callable(fun, device, backend, name, donated_invars,
+                            *arg_specs).compile().unsafe_call
+
+def lower_xla_callable(fun: lu.WrappedFun, device, backend, name,
+                       donated_invars, *arg_specs) -> 'XlaComputation':
+  """Traces `fun` and builds (but does not compile) its XLA computation."""
   if device is not None and backend is not None:
     raise ValueError("can't specify both a device and a backend for jit, "
                      "got device={} and backend={}".format(device, backend))
 
   abstract_args, arg_devices = unzip2(arg_specs)
+  start_time = time.perf_counter()
   if config.omnistaging_enabled:
     jaxpr, out_avals, consts = pe.trace_to_jaxpr_final(fun, abstract_args)
     if any(isinstance(c, core.Tracer) for c in consts):
@@ -626,8 +735,12 @@ def _xla_callable(fun: lu.WrappedFun, device, backend, name, donated_invars, *ar
     pvals: Sequence[pe.PartialVal] = [pe.PartialVal.unknown(aval) for aval in abstract_args]
     jaxpr, pvals, consts = pe.trace_to_jaxpr(  # type: ignore
         fun, pvals, instantiate=False, stage_out=True, bottom=True)  # type: ignore
+  if FLAGS.jax_optimize_jaxprs:
+    jaxpr = jaxpr_passes.optimize_jaxpr(jaxpr)
   map(prefetch, it.chain(consts, jaxpr_literals(jaxpr)))
   jaxpr = apply_outfeed_rewriter(jaxpr)
+  compile_events.emit("jit", compile_events.TRACE, fun.__name__, abstract_args,
+                      start_time, jaxpr=jaxpr)
 
   nreps = jaxpr_replicas(jaxpr)
   device = _xla_callable_device(nreps, backend, device, arg_devices)
@@ -642,7 +755,10 @@ def _xla_callable(fun: lu.WrappedFun, device, backend, name, donated_invars, *ar
   # which are often produced from partial evaluation, don't need compilation,
   # and don't need to force their (potentially lazy) arguments.
   if not jaxpr.eqns:
-    return partial(_execute_trivial, jaxpr, device, consts, out_avals, result_handlers)
+    return XlaComputation(
+        name, None, True, jaxpr, consts, abstract_args, out_avals,
+        trivial_call=partial(_execute_trivial, jaxpr, device, consts,
+                             out_avals, result_handlers))
 
   if not _on_exit:
     log_priority = logging.WARNING if FLAGS.jax_log_compiles else logging.DEBUG
@@ -666,11 +782,18 @@ def _xla_callable(fun: lu.WrappedFun, device, backend, name, donated_invars, *ar
         "jit of multi-host pmap not implemented (and jit-of-pmap can cause "
         "extra data movement anyway, so maybe you don't want it after all).")
 
-  tuple_args = len(abstract_args) > 100  # pass long arg lists as tuple for TPU
+  hoisted = hoisted_consts(consts, FLAGS.jax_hoist_constants_min_bytes
+                           if nreps == 1 else None)
+  hoisted_avals = [raise_to_shaped(abstractify(x)) for x in hoisted]
+  # pass long arg lists as tuple for TPU
+  tuple_args = len(abstract_args) + len(hoisted) > 100
 
+  start_time = time.perf_counter()
   c = xb.make_computation_builder("jit_{}".format(fun.__name__))
-  xla_consts = _xla_consts(c, consts)
-  xla_args = _xla_callable_args(c, abstract_args, tuple_args)
+  xla_args = _xla_callable_args(c, list(abstract_args) + hoisted_avals,
+                                tuple_args)
+  xla_args, hoisted_params = split_list(xla_args, [len(abstract_args)])
+  xla_consts = _xla_consts(c, consts, dict(zip(map(id, hoisted), hoisted_params)))
   out_nodes = jaxpr_subcomp(
       c, jaxpr, backend, AxisEnv(nreps, (), (), None), xla_consts,
       extend_name_stack(wrap_name(name, 'jit')), *xla_args)
@@ -684,17 +807,96 @@ def _xla_callable(fun: lu.WrappedFun, device, backend, name, donated_invars, *ar
                         for a, d in zip(xla_args, donated_invars) if d]
     warn("Some donated buffers were not usable: {}".format(", ".join(unused_donations)))
   built = c.build(out_tuple)
+  compile_events.emit("jit", compile_events.LOWER, fun.__name__, abstract_args,
+                      start_time, jaxpr=jaxpr, hlo=built)
+  return XlaComputation(
+      name, built, False, jaxpr, consts, abstract_args, out_avals,
+      nreps=nreps, device=device, backend=backend, tuple_args=tuple_args,
+      result_handlers=result_handlers, hoisted_consts=hoisted)
+
+
+class XlaComputation:
+  """A traced and lowered, but not yet compiled, XLA computation.
+
+  Trivial computations, whose jaxpr has no equations, have no HLO and are
+  "compiled" into a Python function that forwards their inputs and constants.
+  """
+  def __init__(self, name: str, hlo: Optional[xc.XlaComputation],
+               is_trivial: bool, jaxpr: core.Jaxpr, consts: Sequence[Any],
+               in_avals: Sequence[core.AbstractValue],
+               out_avals: Sequence[core.AbstractValue], **compile_args):
+    self.name = name
+    self._hlo = hlo
+    self._is_trivial = is_trivial
+    self.jaxpr = jaxpr
+    self.consts = consts
+    self.in_avals = in_avals
+    self.out_avals = out_avals
+    self.compile_args = compile_args
+    self._executable: Optional['XlaCompiledComputation'] = None
+
+  @property
+  def is_trivial(self) -> bool:
+    return self._is_trivial
+
+  def hlo(self) -> xc.XlaComputation:
+    if self.is_trivial:
+      raise ValueError("A trivial computation has no HLO")
+    return self._hlo
+
+  def compile(self) -> 'XlaCompiledComputation':
+    if self._executable is None:
+      if self.is_trivial:
+        self._executable = XlaCompiledComputation(
+            None, self.compile_args["trivial_call"])
+      else:
+        start_time = time.perf_counter()
+        self._executable = XlaCompiledComputation.from_xla_computation(
+            self._hlo, self.out_avals, **self.compile_args)
+        compile_events.emit("jit", compile_events.COMPILE, self.name,
+                            self.in_avals, start_time, hlo=self._hlo)
+    return self._executable
 
-  options = xb.get_compile_options(
-      num_replicas=nreps,
-      num_partitions=1,
-      device_assignment=(device.id,) if device else None)
-  options.parameter_is_tupled_arguments = tuple_args
-  compiled = backend_compile(backend, built, options)
-  if nreps == 1:
-    return partial(_execute_compiled, compiled, out_avals, result_handlers)
-  else:
-    return partial(_execute_replicated, compiled, out_avals, result_handlers)
+
+class XlaCompiledComputation:
+  """A compiled XLA executable together with the function that runs it.
+
+  `unsafe_call` takes flat arguments and performs no checks that they match
+  the abstract values the executable was compiled for.
+  """
+  def __init__(self, xla_executable: Optional[XlaExecutable],
+               unsafe_call: Callable):
+    self._xla_executable = xla_executable
+    self.unsafe_call = unsafe_call
+
+  @staticmethod
+  def from_xla_computation(built: xc.XlaComputation,
+                           out_avals: Sequence[core.AbstractValue], *, nreps,
+                           device, backend, tuple_args, result_handlers,
+                           hoisted_consts=()) -> 'XlaCompiledComputation':
+    options = xb.get_compile_options(
+        num_replicas=nreps,
+        num_partitions=1,
+        device_assignment=(device.id,) if device else None)
+    options.parameter_is_tupled_arguments = tuple_args
+    compiled = compile_or_get_cached(backend, built, options)
+    if nreps == 1:
+      # Hoisted constants are transferred once, and their buffers are kept
+      # alive by the returned callable.
+      hoisted_device, = compiled.local_devices()
+      hoisted_bufs = list(it.chain.from_iterable(
+          device_put(x, hoisted_device) for x in hoisted_consts))
+      unsafe_call = partial(_execute_compiled, compiled, out_avals,
+                            result_handlers, hoisted_bufs=hoisted_bufs)
+    else:
+      assert not hoisted_consts
+      unsafe_call = partial(_execute_replicated, compiled, out_avals, result_handlers)
+    return XlaCompiledComputation(compiled, unsafe_call)
+
+  def xla_executable(self) -> XlaExecutable:
+    if self._xla_executable is None:
+      raise ValueError("A trivial computation has no executable")
+    return self._xla_executable
 
 def set_up_aliases(c, xla_args, out_tuple, donated_args, tuple_args):
   """Configures input/output "must" aliasing based on `donated_args`."""
@@ -785,9 +987,11 @@ def _xla_param(builder, param_num, xla_shape, replicated, partitions):
   else:
     return xb.with_sharding(builder, partitions, make_param)
 
-def _execute_compiled(compiled: XlaExecutable, avals, handlers, *args):
+def _execute_compiled(compiled: XlaExecutable, avals, handlers, *args,
+                      hoisted_bufs=()):
   device, = compiled.local_devices()
   input_bufs = list(it.chain.from_iterable(device_put(x, device) for x in args if x is not token))
+  input_bufs.extend(hoisted_bufs)
   out_bufs = compiled.execute(input_bufs)
   if FLAGS.jax_debug_nans: check_nans(xla_call_p, out_bufs)
   return [handler(*bs) for handler, bs in zip(handlers, _partition_outputs(avals, out_bufs))]
@@ -1203,23 +1407,35 @@ def _force(x: DeviceArray) -> DeviceArray:
       device = x._device
     else:
       device = x.device_buffer.device()
-    force_fun = _lazy_force_computation(x.aval, device, x._lazy_expr)
-    result = force_fun(x)
-    return DeviceArray(x.aval, x._device, lazy.array(x.aval.shape), result)
+    if lazy.is_constant(x._lazy_expr):
+      force_fun = _lazy_force_computation(x.aval, device, x._lazy_expr, None)
+      return DeviceArray(x.aval, x._device, lazy.array(x.aval.shape),
+                         force_fun(x))
+    input_shape = x.device_buffer.shape()
+    input_aval = ShapedArray(input_shape.dimensions(),
+                             input_shape.numpy_dtype())
+    force_fun = _lazy_force_computation(x.aval, device, x._lazy_expr,
+                                        input_aval)
+    # Memoize the forced buffer so that later uses don't dispatch again, and
+    # so that x no longer keeps its (possibly much larger) base buffer alive.
+    # Constants are left lazy so that they can still be staged into jitted
+    # computations without materializing them.
+    x.device_buffer = force_fun(x)
+    x._lazy_expr = lazy.array(x.aval.shape)
+    return x
 
 @cache()
 def _lazy_force_computation(aval: core.ShapedArray,
-                            device: Device, lexpr: lazy.LazyExpr
+                            device: Device, lexpr: lazy.LazyExpr,
+                            input_aval: Optional[core.ShapedArray]
                             ) -> Callable[[DeviceArray], PyLocalBuffer]:
   c = xb.make_computation_builder("lazy_force")
   if lazy.is_constant(lexpr):
     param = None
   else:
-    idxs = [(src, dst) for dst, src in enumerate(lexpr.dims) if src is not None]
-    param_shape = [None] * len(idxs)
-    for src, dst in idxs:
-      param_shape[src] = aval.shape[dst]
-    param = xb.parameter(c, 0, xc.Shape.array_shape(aval.dtype, param_shape))
+    assert input_aval is not None
+    param = xb.parameter(c, 0, xc.Shape.array_shape(input_aval.dtype,
+                                                    input_aval.shape))
   xla_out = lazy.stage_lexpr(c, lexpr, param)
   built_c = c.build(xla_out)
 
@@ -1261,13 +1477,14 @@ masking.defvectorized(device_put_p)
 
 def _remat_translation_rule(c, axis_env, in_nodes,
                             name_stack, backend, name, call_jaxpr,
-                            device=None, concrete=None):
+                            device=None, concrete=None, policy=None,
+                            memory_budget=None):
   """Lower remat to a Conditional which always returns true. This:
     1. Circumvents common subexpression elimination.
     2. In common case of `jax.grad(jax.remat(f))`, ensures the remat blocks
        occur after the primal blocks, because cotangent is an input to the
        Conditional."""
-  del device, concrete  # Unused.
+  del device, concrete, policy, memory_budget  # Unused.
   # Fake condition which always selects True branch.
   rng = xops.RngUniform(xb.constant(c, np.array(0, dtype=np.float32)),
                         xb.constant(c, np.array(1, dtype=np.float32)),
@@ -0,0 +1,273 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Optimization passes over jaxprs, run before lowering to XLA.
+
+Jaxprs produced by compositions of transformations often contain duplicated
+subexpressions, operations on constants and dead code. XLA eventually removes
+most of these, but only after they have inflated the HLO and the time spent
+translating and compiling it. The passes here are run on the jaxpr of a
+``jit``-compiled function when the ``jax_optimize_jaxprs`` flag is set.
+
+Each pass maps a ``core.Jaxpr`` to a new ``core.Jaxpr`` with the same
+``constvars``, ``invars`` and output types, and never mutates its input.
+:func:`optimize_jaxpr` applies a pipeline of passes to a jaxpr and, first, to
+all jaxprs nested in its equations' parameters. Passes are registered by name in
+``passes``:
+
+* ``"fold_constants"``: evaluates equations whose operands are all scalar
+  literals and replaces their scalar outputs with literals;
+* ``"simplify"``: applies the algebraic rewrites registered per primitive in
+  ``simplification_rules``, e.g. ``x + 0 -> x``;
+* ``"cse"``: merges equations applying the same primitive, with equal
+  parameters, to the same operands;
+* ``"dce"``: removes equations whose outputs are unused, and prunes unused
+  outputs of call primitives and of primitives with an entry in
+  ``output_pruning_rules`` (e.g. ``cond`` and ``scan``).
+
+Equations of primitives in ``effectful_primitives``, or containing such
+equations in nested jaxprs, are never merged, folded or removed.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from . import core
+from .core import Literal, Var
+from .config import flags, bool_env
+from .util import safe_map, safe_zip
+
+map = safe_map
+zip = safe_zip
+
+flags.DEFINE_bool(
+    'jax_optimize_jaxprs',
+    bool_env('JAX_OPTIMIZE_JAXPRS', False),
+    'Run common-subexpression elimination, constant folding, algebraic '
+    'simplification and dead-code elimination on the jaxprs of jit-compiled '
+    'functions before lowering them to XLA.')
+
+Pass = Callable[[core.Jaxpr], core.Jaxpr]
+SimplificationRule = Callable[[core.JaxprEqn, Callable[[Var], Optional[core.JaxprEqn]]],
+                              Optional[core.Atom]]
+PruningRule = Callable[[core.JaxprEqn, Sequence[bool]], core.JaxprEqn]
+
+effectful_primitives: Set[core.Primitive] = set()
+simplification_rules: Dict[core.Primitive, SimplificationRule] = {}
+output_pruning_rules: Dict[core.Primitive, PruningRule] = {}
+
+
+def optimize_jaxpr(jaxpr: core.Jaxpr,
+                   pipeline: Optional[Sequence[str]] = None) -> core.Jaxpr:
+  """Runs the passes named in ``pipeline`` on ``jaxpr`` and nested jaxprs."""
+  pipeline = default_pipeline if pipeline is None else pipeline
+  for name in pipeline:
+    if name not in passes:
+      raise ValueError(f"Unknown jaxpr pass {name!r}; registered passes are "
+                       f"{sorted(passes)}.")
+  optimize_subjaxpr = lambda jaxpr: optimize_jaxpr(jaxpr, pipeline)
+  eqns = [eqn._replace(params=_map_subjaxprs(optimize_subjaxpr, eqn.params))
+          for eqn in jaxpr.eqns]
+  jaxpr = core.Jaxpr(jaxpr.constvars, jaxpr.invars, jaxpr.outvars, eqns)
+  for name in pipeline:
+    jaxpr = passes[name](jaxpr)
+  return jaxpr
+
+def _map_subjaxprs(f: Pass, params):
+  def map_param(param):
+    if type(param) is core.Jaxpr:
+      return f(param)
+    elif type(param) is core.ClosedJaxpr:
+      return core.ClosedJaxpr(f(param.jaxpr), param.consts)
+    elif type(param) is tuple and any(type(p) in (core.Jaxpr, core.ClosedJaxpr)
+                                      for p in param):
+      return tuple(map(map_param, param))
+    else:
+      return param
+  return {name: map_param(param) for name, param in params.items()}
+
+def is_effectful(eqn: core.JaxprEqn) -> bool:
+  """Whether ``eqn`` has effects beyond computing its outputs."""
+  return (eqn.primitive in effectful_primitives or
+          any(any(map(is_effectful, j.eqns))
+              for j in core.jaxprs_in_params(eqn.params)))
+
+
+def _substitute(env, atom):
+  return env.get(atom, atom) if type(atom) is not Literal else atom
+
+def _rebuild(jaxpr, env, eqns):
+  outvars = [_substitute(env, v) for v in jaxpr.outvars]
+  return core.Jaxpr(jaxpr.constvars, jaxpr.invars, outvars, eqns)
+
+
+def fold_constants(jaxpr: core.Jaxpr) -> core.Jaxpr:
+  env: Dict[Var, core.Atom] = {}
+  eqns = []
+  for eqn in jaxpr.eqns:
+    invars = [_substitute(env, v) for v in eqn.invars]
+    if (invars and all(type(v) is Literal and not np.shape(v.val)
+                       for v in invars) and
+        not any(core.jaxprs_in_params(eqn.params)) and not is_effectful(eqn) and
+        all(isinstance(v.aval, core.ShapedArray) and not v.aval.shape
+            for v in eqn.outvars)):
+      with core.eval_context():
+        outs = eqn.primitive.bind(*[v.val for v in invars], **eqn.params)
+      outs = outs if eqn.primitive.multiple_results else [outs]
+      for v, out in zip(eqn.outvars, outs):
+        env[v] = Literal(np.asarray(out)[()])
+    else:
+      eqns.append(eqn._replace(invars=invars))
+  return _rebuild(jaxpr, env, eqns)
+
+
+def simplify(jaxpr: core.Jaxpr) -> core.Jaxpr:
+  env: Dict[Var, core.Atom] = {}
+  producers: Dict[Var, core.JaxprEqn] = {}
+  eqns = []
+  for eqn in jaxpr.eqns:
+    eqn = eqn._replace(invars=[_substitute(env, v) for v in eqn.invars])
+    rule = simplification_rules.get(eqn.primitive)
+    replacement = rule(eqn, producers.get) if rule else None
+    if replacement is not None:
+      outvar, = eqn.outvars
+      env[outvar] = replacement
+    else:
+      eqns.append(eqn)
+      producers.update((v, eqn) for v in eqn.outvars)
+  return _rebuild(jaxpr, env, eqns)
+
+def def_identity_element(prim: core.Primitive, value, commutative=True):
+  """Registers ``prim(x, value) -> x`` (and ``prim(value, x)``) rewrites."""
+  def rule(eqn, producer):
+    x, y = eqn.invars
+    if _is_literal_value(y, value) and _same_type(x, eqn.outvars[0]):
+      return x
+    if (commutative and _is_literal_value(x, value) and
+        _same_type(y, eqn.outvars[0])):
+      return y
+    return None
+  simplification_rules[prim] = rule
+
+def def_involution(prim: core.Primitive):
+  """Registers ``prim(prim(x)) -> x`` rewrites for a unary primitive."""
+  def rule(eqn, producer):
+    operand, = eqn.invars
+    inner = producer(operand) if type(operand) is not Literal else None
+    if (inner is not None and inner.primitive is prim and
+        inner.params == eqn.params):
+      x, = inner.invars
+      if _same_type(x, eqn.outvars[0]):
+        return x
+    return None
+  simplification_rules[prim] = rule
+
+def forward_if_same_type(eqn, producer):
+  """A rule rewriting ``prim(x) -> x`` when the output type equals x's type."""
+  x = eqn.invars[0]
+  return x if _same_type(x, eqn.outvars[0]) else None
+
+def _is_literal_value(atom, value) -> bool:
+  return (type(atom) is Literal and not np.shape(atom.val) and
+          atom.val == value)
+
+def _same_type(atom, var) -> bool:
+  a, b = atom.aval, var.aval
+  return (isinstance(a, core.ShapedArray) and isinstance(b, core.ShapedArray)
+          and a.shape == b.shape and a.dtype == b.dtype)
+
+
+def cse(jaxpr: core.Jaxpr) -> core.Jaxpr:
+  env: Dict[Var, core.Atom] = {}
+  seen: Dict[tuple, core.JaxprEqn] = {}
+  eqns = []
+  for eqn in jaxpr.eqns:
+    eqn = eqn._replace(invars=[_substitute(env, v) for v in eqn.invars])
+    key = _cse_key(eqn)
+    prev = seen.get(key) if key is not None else None
+    if prev is not None:
+      env.update(zip(eqn.outvars, prev.outvars))
+      continue
+    if key is not None:
+      seen[key] = eqn
+    eqns.append(eqn)
+  return _rebuild(jaxpr, env, eqns)
+
+def _cse_key(eqn: core.JaxprEqn):
+  if (is_effectful(eqn) or eqn.params.get('prevent_cse') or
+      any(type(v) is core.DropVar for v in eqn.outvars)):
+    return None
+  try:
+    params = tuple(sorted(eqn.params.items()))
+    hash(params)
+    invars = tuple(map(_atom_key, eqn.invars))
+  except TypeError:
+    return None
+  return (eqn.primitive, invars, params)
+
+def _atom_key(atom):
+  if type(atom) is not Literal:
+    return atom
+  if np.shape(atom.val):
+    raise TypeError("only scalar literals are compared")
+  # Keyed by bit pattern rather than value, so that e.g. 0. and -0. differ.
+  val = np.asarray(atom.val)
+  return (Literal, type(atom.val), val.dtype, val.tobytes())
+
+
+def dce(jaxpr: core.Jaxpr) -> core.Jaxpr:
+  used = {v for v in jaxpr.outvars if type(v) is not Literal}
+  eqns: List[core.JaxprEqn] = []
+  for eqn in jaxpr.eqns[::-1]:
+    used_outputs = [v in used for v in eqn.outvars]
+    if not any(used_outputs) and not is_effectful(eqn):
+      continue
+    if not all(used_outputs) and not is_effectful(eqn):
+      eqn = _prune_outputs(eqn, used_outputs)
+    eqns.append(eqn)
+    used.update(v for v in eqn.invars if type(v) is not Literal)
+  return core.Jaxpr(jaxpr.constvars, jaxpr.invars, jaxpr.outvars, eqns[::-1])
+
+def _prune_outputs(eqn, used_outputs):
+  rule = output_pruning_rules.get(eqn.primitive)
+  if rule is not None:
+    return rule(eqn, used_outputs)
+  if eqn.primitive.call_primitive and type(eqn.params.get('call_jaxpr')) is core.Jaxpr:
+    call_jaxpr = eqn.params['call_jaxpr']
+    outvars = [v for v, used in zip(call_jaxpr.outvars, used_outputs) if used]
+    call_jaxpr = dce(core.Jaxpr(call_jaxpr.constvars, call_jaxpr.invars,
+                                outvars, call_jaxpr.eqns))
+    return eqn._replace(
+        outvars=[v for v, used in zip(eqn.outvars, used_outputs) if used],
+        params=dict(eqn.params, call_jaxpr=call_jaxpr))
+  return eqn
+
+def prune_closed_jaxpr_outputs(closed_jaxpr: core.ClosedJaxpr,
+                               used_outputs: Sequence[bool]) -> core.ClosedJaxpr:
+  """Drops the outputs of ``closed_jaxpr`` not in ``used_outputs``, then DCEs."""
+  jaxpr = closed_jaxpr.jaxpr
+  outvars = [v for v, used in zip(jaxpr.outvars, used_outputs) if used]
+  jaxpr = dce(core.Jaxpr(jaxpr.constvars, jaxpr.invars, outvars, jaxpr.eqns))
+  return core.ClosedJaxpr(jaxpr, closed_jaxpr.consts)
+
+
+passes: Dict[str, Pass] = {
+    "fold_constants": fold_constants,
+    "simplify": simplify,
+    "cse": cse,
+    "dce": dce,
+}
+
+default_pipeline = ("fold_constants", "simplify", "cse", "dce")
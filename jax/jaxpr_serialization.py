@@ -0,0 +1,566 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A compact binary serialization format for closed jaxprs.
+
+Serialized jaxprs can be shipped between processes, or stored, to skip tracing
+Python code at startup:
+
+  from jax import jaxpr_serialization, make_jaxpr
+
+  data = jaxpr_serialization.serialize(make_jaxpr(f)(*example_args))
+  ...
+  closed_jaxpr = jaxpr_serialization.deserialize(data)
+  f_jit = jax.jit(jax.core.jaxpr_as_fun(closed_jaxpr))
+
+The format covers variables and their abstract values, literals, constants and
+equation parameters, including nested jaxprs. Primitives are identified by
+name, and are looked up among the primitives with an XLA translation rule or
+registered with :func:`register_primitive`. Source information is only kept
+if requested, as the file name, function name and line number of each frame.
+
+Some parameters are Python callables used only by transformations, e.g. the
+JVP rules of ``custom_jvp`` functions or the ``computation`` of ``reduce``.
+They cannot be serialized, and are replaced by placeholders that raise an
+error if called: deserialized jaxprs can be evaluated and compiled, but
+transformations relying on those callables fail. The format is not stable
+across JAX versions.
+
+Parameters that are named tuples or enums are identified by the qualified name
+of their class, which is only resolved among the classes of JAX's own
+parameters, the classes serialized earlier in the process and the classes
+registered with :func:`register_class`; classes are never imported by name.
+Still, only deserialize data from trusted sources: like a pickle, a crafted
+jaxpr can run arbitrary computations when evaluated.
+"""
+
+import enum
+import struct
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from . import core
+from . import dtypes
+from . import linear_util as lu
+from .util import safe_map
+
+map = safe_map
+
+_MAGIC = b"JXPR"
+_VERSION = 1
+
+# Atoms
+_ATOM_LITERAL, _ATOM_UNITVAR, _ATOM_DROPVAR, _ATOM_VAR = range(4)
+
+# Abstract values; binders use _AVAL_DROPVAR for `core.dropvar`.
+(_AVAL_SHAPED, _AVAL_SHAPED_WEAK, _AVAL_UNIT, _AVAL_TOKEN, _AVAL_BOT,
+ _AVAL_DROPVAR) = range(6)
+
+# Values
+(_NONE, _FALSE, _TRUE, _INT, _FLOAT, _COMPLEX, _STR, _TUPLE, _LIST, _DICT,
+ _DTYPE, _ARRAY, _NUMPY_SCALAR, _JAXPR, _CLOSED_JAXPR, _NAMEDTUPLE, _ENUM,
+ _DEVICE, _UNIT, _AVAL, _CALLABLE) = range(21)
+
+
+class SerializationError(Exception):
+  pass
+
+
+_extra_primitives: Dict[str, core.Primitive] = {}
+_primitives_by_name: Dict[str, core.Primitive] = {}
+
+def register_primitive(prim: core.Primitive) -> None:
+  """Makes ``prim`` deserializable even if it has no XLA translation rule."""
+  _extra_primitives[prim.name] = prim
+
+def _lookup_primitive(name: str) -> core.Primitive:
+  prim = _primitives_by_name.get(name)
+  if prim is None:
+    _primitives_by_name.update(_known_primitives())
+    prim = _primitives_by_name.get(name)
+    if prim is None:
+      raise SerializationError(
+          f"Unknown primitive {name!r}; primitives without an XLA translation "
+          "rule must be registered with register_primitive.")
+  return prim
+
+_classes: Dict[str, type] = {}
+_known_classes_loaded = False
+
+def register_class(cls: type) -> None:
+  """Makes the named tuple or enum class ``cls`` deserializable."""
+  if not (_is_namedtuple_class(cls) or _is_enum_class(cls)):
+    raise TypeError(f"Only named tuple and enum classes can be registered, got "
+                    f"{cls}.")
+  _classes[_qualified_name(cls)] = cls
+
+def _is_namedtuple_class(cls) -> bool:
+  return isinstance(cls, type) and issubclass(cls, tuple) and hasattr(cls, "_fields")
+
+def _is_enum_class(cls) -> bool:
+  # XLA's enums, e.g. lax.Precision, are pybind11 enums with __members__.
+  return isinstance(cls, type) and (issubclass(cls, enum.Enum) or
+                                    isinstance(getattr(cls, "__members__", None),
+                                               dict))
+
+def _lookup_class(name: str, is_kind: Callable[[Any], bool]) -> type:
+  global _known_classes_loaded
+  if name not in _classes and not _known_classes_loaded:
+    _known_classes_loaded = True
+    for known_cls in _known_classes():
+      _classes.setdefault(_qualified_name(known_cls), known_cls)
+  cls: Optional[type] = _classes.get(name)
+  if cls is None or not is_kind(cls):
+    raise SerializationError(
+        f"Unknown parameter class {name!r}; classes of parameters must be "
+        "registered with register_class.")
+  return cls
+
+def _known_classes() -> List[type]:
+  from .lax import lax, lax_control_flow
+  from .lib import xla_client
+  return [lax.Precision, lax.ConvDimensionNumbers, lax.GatherDimensionNumbers,
+          lax.ScatterDimensionNumbers, lax_control_flow._RootTuple,
+          lax_control_flow._LinearSolveTuple, xla_client.FftType]
+
+def _known_primitives() -> Dict[str, core.Primitive]:
+  from .interpreters import xla
+  tables = [xla.translations, xla.parallel_translations,
+            xla.initial_style_translations, xla.call_translations,
+            *xla.backend_specific_translations.values()]
+  prims = {p.name: p for table in tables for p in table}
+  prims.update(_extra_primitives)
+  return prims
+
+
+def serialize(closed_jaxpr: core.ClosedJaxpr,
+              include_source_info: bool = False) -> bytes:
+  """Serializes ``closed_jaxpr``, and its constants, to bytes."""
+  w = _Writer(include_source_info)
+  w.buf += _MAGIC
+  w.uint(_VERSION)
+  w.uint(int(include_source_info))
+  w.closed_jaxpr(closed_jaxpr)
+  return bytes(w.buf)
+
+def deserialize(data: bytes) -> core.ClosedJaxpr:
+  """Reads a closed jaxpr written by :func:`serialize`."""
+  if bytes(data[:len(_MAGIC)]) != _MAGIC:
+    raise SerializationError("Not a serialized jaxpr.")
+  r = _Reader(data, len(_MAGIC))
+  version = r.uint()
+  if version != _VERSION:
+    raise SerializationError(f"Unsupported serialized jaxpr version {version}; "
+                             f"expected {_VERSION}.")
+  r.include_source_info = bool(r.uint())
+  return r.closed_jaxpr()
+
+
+class Frame(NamedTuple):
+  file_name: str
+  function_name: str
+  line_num: int
+
+class Traceback(NamedTuple):
+  """The source information of a deserialized equation."""
+  frames: List[Frame]
+
+
+class _MissingCallable:
+  """Stands in for a callable parameter that could not be serialized."""
+  def __init__(self, name: str):
+    self.name = name
+
+  def __call__(self, *args, **kwargs):
+    raise SerializationError(
+        f"{self.name} is not available in a deserialized jaxpr.")
+
+  def __repr__(self):
+    return f"<missing {self.name}>"
+
+
+def _dtype_name(dtype) -> str:
+  return "float0" if dtype == dtypes.float0 else np.dtype(dtype).name
+
+_special_dtypes = {"bfloat16": np.dtype(dtypes.bfloat16),
+                   "float0": dtypes.float0}
+
+def _dtype_from_name(name: str):
+  return _special_dtypes[name] if name in _special_dtypes else np.dtype(name)
+
+def _qualified_name(cls) -> str:
+  return f"{cls.__module__}:{cls.__qualname__}"
+
+
+class _Writer:
+  def __init__(self, include_source_info: bool):
+    self.buf = bytearray()
+    self.include_source_info = include_source_info
+    self.strings: Dict[str, int] = {}
+
+  def uint(self, n: int):
+    while n >= 0x80:
+      self.buf.append((n & 0x7f) | 0x80)
+      n >>= 7
+    self.buf.append(n)
+
+  def sint(self, n: int):
+    self.uint(n << 1 if n >= 0 else (-n << 1) - 1)
+
+  def string(self, s: str):
+    # Strings are interned: the first occurrence of each is written in full,
+    # later ones as the index of the first.
+    index = self.strings.get(s)
+    if index is None:
+      self.uint(len(self.strings))
+      self.strings[s] = len(self.strings)
+      self.blob(s.encode("utf-8"))
+    else:
+      self.uint(index)
+
+  def blob(self, b):
+    self.uint(len(b))
+    self.buf += b
+
+  def dtype(self, dtype):
+    self.string(_dtype_name(dtype))
+
+  def class_name(self, cls):
+    name = _qualified_name(cls)
+    _classes.setdefault(name, cls)
+    self.string(name)
+
+  def aval(self, aval):
+    if isinstance(aval, core.ShapedArray):
+      self.uint(_AVAL_SHAPED_WEAK if aval.weak_type else _AVAL_SHAPED)
+      self.dtype(aval.dtype)
+      self.uint(len(aval.shape))
+      for d in aval.shape:
+        if type(d) is not int and not isinstance(d, np.integer):
+          raise SerializationError(f"Cannot serialize polymorphic shape {aval}.")
+        self.uint(int(d))
+    elif aval is core.abstract_unit:
+      self.uint(_AVAL_UNIT)
+    elif aval is core.abstract_token:
+      self.uint(_AVAL_TOKEN)
+    elif aval is core.bot:
+      self.uint(_AVAL_BOT)
+    else:
+      raise SerializationError(f"Cannot serialize abstract value {aval}.")
+
+  def closed_jaxpr(self, closed_jaxpr: core.ClosedJaxpr):
+    self.jaxpr(closed_jaxpr.jaxpr)
+    for const in closed_jaxpr.consts:
+      self.value(const)
+
+  def jaxpr(self, jaxpr: core.Jaxpr):
+    env: Dict[core.Var, int] = {}
+    def binder(v):
+      if type(v) is core.DropVar:
+        self.uint(_AVAL_DROPVAR)
+      else:
+        self.aval(v.aval)
+        env[v] = len(env)
+    def atom(v):
+      if type(v) is core.Literal:
+        self.uint(_ATOM_LITERAL)
+        self.value(v.val)
+      elif v is core.unitvar:
+        self.uint(_ATOM_UNITVAR)
+      elif type(v) is core.DropVar:
+        self.uint(_ATOM_DROPVAR)
+      else:
+        self.uint(_ATOM_VAR + env[v])
+
+    self.uint(len(jaxpr.constvars))
+    map(binder, jaxpr.constvars)
+    self.uint(len(jaxpr.invars))
+    map(binder, jaxpr.invars)
+    self.uint(len(jaxpr.eqns))
+    for eqn in jaxpr.eqns:
+      self.string(eqn.primitive.name)
+      self.uint(len(eqn.invars))
+      map(atom, eqn.invars)
+      self.uint(len(eqn.params))
+      for name, param in eqn.params.items():
+        self.string(name)
+        self.value(param, f"parameter {name} of {eqn.primitive}")
+      self.uint(len(eqn.outvars))
+      map(binder, eqn.outvars)
+      if self.include_source_info:
+        self.source_info(eqn.source_info)
+    self.uint(len(jaxpr.outvars))
+    map(atom, jaxpr.outvars)
+
+  def source_info(self, source_info):
+    frames = source_info.frames if source_info is not None else []
+    self.uint(len(frames))
+    for frame in frames:
+      self.string(frame.file_name)
+      self.string(frame.function_name)
+      self.uint(max(frame.line_num, 0))
+
+  def value(self, x, context: str = "constant"):
+    typ = type(x)
+    if x is None:
+      self.uint(_NONE)
+    elif typ is bool:
+      self.uint(_TRUE if x else _FALSE)
+    elif typ is int:
+      self.uint(_INT)
+      self.sint(x)
+    elif typ is float:
+      self.uint(_FLOAT)
+      self.buf += struct.pack("<d", x)
+    elif typ is complex:
+      self.uint(_COMPLEX)
+      self.buf += struct.pack("<dd", x.real, x.imag)
+    elif typ is str:
+      self.uint(_STR)
+      self.string(x)
+    elif typ in (tuple, list):
+      self.uint(_TUPLE if typ is tuple else _LIST)
+      self.uint(len(x))
+      for y in x:
+        self.value(y, context)
+    elif typ is dict:
+      self.uint(_DICT)
+      self.uint(len(x))
+      for k, v in x.items():
+        self.value(k, context)
+        self.value(v, context)
+    elif isinstance(x, tuple) and hasattr(typ, "_fields"):
+      self.uint(_NAMEDTUPLE)
+      self.class_name(typ)
+      self.uint(len(x))
+      for y in x:
+        self.value(y, context)
+    elif isinstance(x, np.dtype) or (isinstance(x, type) and
+                                     issubclass(x, np.generic)):
+      self.uint(_DTYPE)
+      self.dtype(x)
+    elif isinstance(x, np.generic):
+      self.uint(_NUMPY_SCALAR)
+      self.dtype(x.dtype)
+      self.blob(np.asarray(x).tobytes())
+    elif isinstance(x, np.ndarray) or hasattr(x, "__array__") and hasattr(x, "aval"):
+      x = np.asarray(x)
+      self.uint(_ARRAY)
+      self.dtype(x.dtype)
+      self.uint(x.ndim)
+      for d in x.shape:
+        self.uint(d)
+      self.blob(np.ascontiguousarray(x).tobytes())
+    elif typ is core.Jaxpr:
+      self.uint(_JAXPR)
+      self.jaxpr(x)
+    elif typ is core.ClosedJaxpr:
+      self.uint(_CLOSED_JAXPR)
+      self.closed_jaxpr(x)
+    elif isinstance(x, enum.Enum) or hasattr(typ, "__members__"):
+      self.uint(_ENUM)
+      self.class_name(typ)
+      self.string(x.name)
+    elif hasattr(x, "platform") and hasattr(x, "id"):
+      self.uint(_DEVICE)
+      self.string(x.platform)
+      self.uint(x.id)
+    elif x is core.unit:
+      self.uint(_UNIT)
+    elif isinstance(x, core.AbstractValue):
+      self.uint(_AVAL)
+      self.aval(x)
+    elif callable(x) or isinstance(x, lu.WrappedFun):
+      self.uint(_CALLABLE)
+      self.string(context)
+    else:
+      raise SerializationError(f"Cannot serialize {context}: {x!r} of type "
+                               f"{typ}.")
+
+
+class _Reader:
+  def __init__(self, data: bytes, pos: int):
+    self.data = memoryview(data)
+    self.pos = pos
+    self.include_source_info = False
+    self.strings: List[str] = []
+
+  def uint(self) -> int:
+    data, pos = self.data, self.pos
+    n = shift = 0
+    while True:
+      b = data[pos]
+      pos += 1
+      n |= (b & 0x7f) << shift
+      if b < 0x80:
+        self.pos = pos
+        return n
+      shift += 7
+
+  def sint(self) -> int:
+    n = self.uint()
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+  def string(self) -> str:
+    index = self.uint()
+    if index == len(self.strings):
+      self.strings.append(bytes(self.blob()).decode("utf-8"))
+    return self.strings[index]
+
+  def blob(self) -> memoryview:
+    n = self.uint()
+    b = self.data[self.pos:self.pos + n]
+    self.pos += n
+    return b
+
+  def unpack(self, fmt: str):
+    out = struct.unpack_from(fmt, self.data, self.pos)
+    self.pos += struct.calcsize(fmt)
+    return out
+
+  def dtype(self):
+    return _dtype_from_name(self.string())
+
+  def aval(self, tag: Optional[int] = None):
+    tag = self.uint() if tag is None else tag
+    if tag in (_AVAL_SHAPED, _AVAL_SHAPED_WEAK):
+      dtype = self.dtype()
+      shape = tuple(self.uint() for _ in range(self.uint()))
+      return core.ShapedArray(shape, dtype, weak_type=tag == _AVAL_SHAPED_WEAK)
+    elif tag == _AVAL_UNIT:
+      return core.abstract_unit
+    elif tag == _AVAL_TOKEN:
+      return core.abstract_token
+    elif tag == _AVAL_BOT:
+      return core.bot
+    else:
+      raise SerializationError(f"Invalid abstract value tag {tag}.")
+
+  def closed_jaxpr(self) -> core.ClosedJaxpr:
+    jaxpr = self.jaxpr()
+    consts = [self.value() for _ in jaxpr.constvars]
+    return core.ClosedJaxpr(jaxpr, consts)
+
+  def jaxpr(self) -> core.Jaxpr:
+    env: List[core.Var] = []
+    def binder():
+      tag = self.uint()
+      if tag == _AVAL_DROPVAR:
+        return core.dropvar
+      v = core.Var(len(env), '', self.aval(tag))
+      env.append(v)
+      return v
+    def atom():
+      tag = self.uint()
+      if tag == _ATOM_LITERAL:
+        return core.Literal(self.value())
+      elif tag == _ATOM_UNITVAR:
+        return core.unitvar
+      elif tag == _ATOM_DROPVAR:
+        return core.dropvar
+      else:
+        return env[tag - _ATOM_VAR]
+
+    constvars = [binder() for _ in range(self.uint())]
+    invars = [binder() for _ in range(self.uint())]
+    eqns = []
+    for _ in range(self.uint()):
+      prim = _lookup_primitive(self.string())
+      eqn_invars = [atom() for _ in range(self.uint())]
+      params = {}
+      for _ in range(self.uint()):
+        name = self.string()
+        params[name] = self.value()
+      eqn_outvars = [binder() for _ in range(self.uint())]
+      source_info = self.source_info() if self.include_source_info else None
+      eqns.append(core.new_jaxpr_eqn(eqn_invars, eqn_outvars, prim, params,
+                                     source_info))
+    outvars = [atom() for _ in range(self.uint())]
+    return core.Jaxpr(constvars, invars, outvars, eqns)
+
+  def source_info(self) -> Optional[Traceback]:
+    num_frames = self.uint()
+    if not num_frames:
+      return None
+    return Traceback([Frame(self.string(), self.string(), self.uint())
+                      for _ in range(num_frames)])
+
+  def value(self) -> Any:
+    tag = self.uint()
+    if tag == _NONE:
+      return None
+    elif tag == _FALSE:
+      return False
+    elif tag == _TRUE:
+      return True
+    elif tag == _INT:
+      return self.sint()
+    elif tag == _FLOAT:
+      x, = self.unpack("<d")
+      return x
+    elif tag == _COMPLEX:
+      return complex(*self.unpack("<dd"))
+    elif tag == _STR:
+      return self.string()
+    elif tag in (_TUPLE, _LIST):
+      elts = [self.value() for _ in range(self.uint())]
+      return tuple(elts) if tag == _TUPLE else elts
+    elif tag == _DICT:
+      return {self.value(): self.value() for _ in range(self.uint())}
+    elif tag == _NAMEDTUPLE:
+      cls = _lookup_class(self.string(), _is_namedtuple_class)
+      return cls(*[self.value() for _ in range(self.uint())])
+    elif tag == _DTYPE:
+      return self.dtype()
+    elif tag == _NUMPY_SCALAR:
+      dtype = self.dtype()
+      return np.frombuffer(self.blob(), dtype)[0]
+    elif tag == _ARRAY:
+      dtype = self.dtype()
+      shape = tuple(self.uint() for _ in range(self.uint()))
+      data = self.blob()
+      if not dtype.itemsize:
+        return np.zeros(shape, dtype)
+      return np.frombuffer(data, dtype).reshape(shape).copy()
+    elif tag == _JAXPR:
+      return self.jaxpr()
+    elif tag == _CLOSED_JAXPR:
+      return self.closed_jaxpr()
+    elif tag == _ENUM:
+      cls = _lookup_class(self.string(), _is_enum_class)
+      member = self.string()
+      # pybind11 enums are not enum.Enum subclasses but have __members__ too.
+      members = (cls.__members__ if issubclass(cls, enum.Enum) else
+                 getattr(cls, "__members__"))
+      try:
+        return members[member]
+      except KeyError as err:
+        raise SerializationError(
+            f"Unknown member {member!r} of enum {cls}.") from err
+    elif tag == _DEVICE:
+      from .lib import xla_bridge as xb
+      platform, device_id = self.string(), self.uint()
+      for device in xb.devices(platform):
+        if device.id == device_id:
+          return device
+      raise ValueError(f"No {platform} device with id {device_id}.")
+    elif tag == _UNIT:
+      return core.unit
+    elif tag == _AVAL:
+      return self.aval()
+    elif tag == _CALLABLE:
+      return _MissingCallable(self.string())
+    else:
+      raise SerializationError(f"Invalid value tag {tag}.")
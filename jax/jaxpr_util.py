@@ -15,7 +15,10 @@
 """Utilities for the Jaxpr IR."""
 
 import collections
-from typing import Any, Callable, Dict, List, Optional
+import itertools as it
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
 
 from jax import core, source_info_util, util
 
@@ -113,6 +116,87 @@ def vars_by_fanout(jaxpr: core.Jaxpr):
 
   return [(j, hist(j, reads)) for j, reads in var_defs_and_refs(jaxpr)]
 
+class MemoryEstimate(NamedTuple):
+  """A static estimate of the memory used to evaluate a jaxpr.
+
+  Attributes:
+    peak_bytes: the largest number of bytes live at once, including the
+      jaxpr's inputs and constants.
+    peak_eqns: the equation being evaluated at the peak, preceded by the
+      equations enclosing it when the peak is inside a nested jaxpr (e.g. the
+      ``scan`` whose body contains it).
+    allocations: the number of bytes of the outputs of each primitive, summed
+      over all equations of the jaxpr and nested jaxprs. Equations in loop
+      bodies are counted once.
+  """
+  peak_bytes: int
+  peak_eqns: Tuple[core.JaxprEqn, ...]
+  allocations: Dict[str, int]
+
+# Primitives whose nested jaxprs run while all of their outputs are allocated.
+loop_primitives = {'scan', 'while'}
+
+def estimate_memory(jaxpr: Union[core.Jaxpr, core.ClosedJaxpr]) -> MemoryEstimate:
+  """Estimates the peak memory used to evaluate ``jaxpr`` by liveness analysis.
+
+  A value is live from the equation computing it to its last use; inputs,
+  constants and outputs stay live throughout. While an equation runs, its
+  operands, its outputs and the values live in its nested jaxprs (``xla_call``,
+  ``scan``, ``while``, ``cond``, ...) are all counted. The estimate ignores
+  buffer donation, fusion and the rematerialization XLA may perform, so it is an
+  approximation of, not a bound on, what the compiled computation allocates. No
+  device is needed, e.g. ``estimate_memory(jax.make_jaxpr(f)(*args))``.
+  """
+  if isinstance(jaxpr, core.ClosedJaxpr):
+    jaxpr = jaxpr.jaxpr
+  allocations: Dict[str, int] = collections.defaultdict(int)
+  inputs = sum(_var_bytes(v) for v in it.chain(jaxpr.constvars, jaxpr.invars))
+  peak, peak_eqns = _peak_live_bytes(jaxpr, allocations)
+  return MemoryEstimate(inputs + peak, peak_eqns, dict(allocations))
+
+def _var_bytes(v) -> int:
+  aval = v.aval
+  if not isinstance(aval, core.ShapedArray):
+    return 0
+  return int(np.prod(aval.shape, dtype=np.int64)) * np.dtype(aval.dtype).itemsize
+
+def _peak_live_bytes(jaxpr: core.Jaxpr, allocations: Dict[str, int]):
+  # Returns the peak bytes of the values computed inside ``jaxpr`` (i.e. not
+  # counting its inputs, which belong to the caller) and the equations at it.
+  last_use: Dict[core.Var, int] = {}
+  for i, eqn in enumerate(jaxpr.eqns):
+    for v in eqn.invars:
+      if isinstance(v, core.Var):
+        last_use[v] = i
+  for v in jaxpr.outvars:
+    if isinstance(v, core.Var):
+      last_use[v] = len(jaxpr.eqns)
+  frees: Dict[int, List[core.Var]] = collections.defaultdict(list)
+  live, peak = 0, 0
+  peak_eqns: Tuple[core.JaxprEqn, ...] = ()
+  for i, eqn in enumerate(jaxpr.eqns):
+    out_bytes = sum(map(_var_bytes, eqn.outvars))
+    allocations[eqn.primitive.name] += out_bytes
+    inner, inner_eqns = 0, ()
+    for subjaxpr in core.jaxprs_in_params(eqn.params):
+      sub_peak, sub_eqns = _peak_live_bytes(subjaxpr, allocations)
+      if sub_peak > inner:
+        inner, inner_eqns = sub_peak, sub_eqns
+    if eqn.primitive.name in loop_primitives:
+      eqn_peak = out_bytes + inner
+    else:
+      # The nested jaxpr computes the outputs, so they are part of its peak.
+      eqn_peak = max(out_bytes, inner)
+      if inner <= out_bytes:
+        inner_eqns = ()
+    if live + eqn_peak > peak:
+      peak, peak_eqns = live + eqn_peak, (eqn,) + inner_eqns
+    live += out_bytes
+    for v in eqn.outvars:
+      frees[last_use.get(v, i)].append(v)
+    live -= sum(map(_var_bytes, frees.pop(i, ())))
+  return peak, peak_eqns
+
 def print_histogram(histogram: Dict[Any, int]):
   count_width = max(len(str(v)) for v in histogram.values())
   count_fmt = '{:>' + str(count_width) + 'd}'
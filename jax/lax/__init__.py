@@ -333,6 +333,9 @@ from .lax_parallel import (
   ppermute_p,
   pshuffle,
   psum,
+  psum_bucketed,
   psum_p,
+  psum_scatter,
   pswapaxes,
+  reduce_scatter_p,
 )
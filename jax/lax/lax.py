@@ -17,7 +17,7 @@ import builtins
 import functools
 import itertools
 import operator
-from typing import (Any, Callable, List, NamedTuple, Optional, Sequence, Union, Tuple)
+from typing import (Any, Callable, List, NamedTuple, Optional, Sequence, Set, Union, Tuple)
 import warnings
 
 import numpy as np
@@ -28,6 +28,7 @@ from .. import ad_util
 from .. import api
 from .. import linear_util as lu
 from .. import dtypes
+from .. import jaxpr_passes
 from .. import lazy
 from ..config import flags, config
 from ..core import Primitive, _canonicalize_dimension
@@ -1929,12 +1930,16 @@ def unop_dtype_rule(result_dtype, accepted_dtypes, name, aval, **kwargs):
   return result_dtype(aval.dtype)
 
 
+# Primitives applying a scalar function to each element of their operands.
+elementwise_primitives: Set[core.Primitive] = set()
+
 def unop(result_dtype, accepted_dtypes, name, translation_rule=None):
   dtype_rule = partial(unop_dtype_rule, result_dtype, accepted_dtypes, name)
   prim = standard_primitive(_attrgetter('shape'), dtype_rule, name,
                             translation_rule=translation_rule)
   batching.defvectorized(prim)
   masking.defvectorized(prim)
+  elementwise_primitives.add(prim)
   return prim
 standard_unop = partial(unop, _identity)
 _attrgetter = lambda name: lambda x, **kwargs: getattr(x, name)
@@ -1984,6 +1989,7 @@ def naryop(result_dtype, accepted_dtypes, name, translation_rule=None):
                             translation_rule=translation_rule)
   batching.defbroadcasting(prim)
   masking.defnaryop(prim)
+  elementwise_primitives.add(prim)
   return prim
 standard_naryop = partial(naryop, _input_dtype)
 
@@ -2050,6 +2056,7 @@ _bool_or_int = _int | _bool
 
 neg_p = standard_unop(_num, 'neg')
 ad.deflinear(neg_p, lambda t: [neg(t)])
+jaxpr_passes.def_involution(neg_p)
 
 def _sign_translation_rule(c, x):
   shape = c.get_shape(x)
@@ -2328,6 +2335,7 @@ def _add_inverse(r, x, y):
   yr = r - x
   return xr, yr
 iad.definverse(add_p, _add_inverse)
+jaxpr_passes.def_identity_element(add_p, 0)
 
 def _sub_transpose(t, x, y):
   # The following linearity assertion is morally true, but because in some cases
@@ -2340,6 +2348,7 @@ ad.defjvp(sub_p,
           lambda g, x, y: _brcast(g, y),
           lambda g, x, y: _brcast(neg(g), x))
 ad.primitive_transposes[sub_p] = _sub_transpose
+jaxpr_passes.def_identity_element(sub_p, 0, commutative=False)
 
 mul_p = standard_naryop([_num, _num], 'mul')
 ad.defbilinear_broadcasting(_brcast, mul_p, mul, mul)
@@ -2348,6 +2357,7 @@ def _mul_inverse(r, x, y):
   yr = r / x
   return xr, yr
 iad.definverse(mul_p, _mul_inverse)
+jaxpr_passes.def_identity_element(mul_p, 1)
 
 def _div_transpose_rule(cotangent, x, y):
   assert ad.is_undefined_primal(x) and not ad.is_undefined_primal(y)
@@ -2459,13 +2469,29 @@ def _convert_element_type_jvp_rule(tangent, operand , *, new_dtype, old_dtype):
     return convert_element_type_p.bind(tangent, new_dtype=new_dtype,
                                        old_dtype=old_dtype)
 
+# We have a nonstandard convert_element_type impl so that we can be lazy about
+# data movement.
+def _convert_element_type_impl(operand, *, new_dtype, old_dtype):
+  if (type(operand) is xla.DeviceArray and
+      not (dtypes.issubdtype(old_dtype, np.complexfloating) and
+           not dtypes.issubdtype(new_dtype, np.complexfloating))):
+    lazy_expr = lazy.convert_element_type(operand._lazy_expr, new_dtype)
+    aval = ShapedArray(operand.shape, new_dtype)
+    return xla.DeviceArray(aval, operand._device, lazy_expr, operand.device_buffer)
+  return xla.apply_primitive(convert_element_type_p, operand,
+                             new_dtype=new_dtype, old_dtype=old_dtype)
+
 convert_element_type_p = standard_primitive(
     _convert_element_type_shape_rule, _convert_element_type_dtype_rule,
     'convert_element_type', _convert_element_type_translation_rule)
+convert_element_type_p.def_impl(_convert_element_type_impl)
 ad.defjvp(convert_element_type_p, _convert_element_type_jvp_rule)
 ad.primitive_transposes[convert_element_type_p] = _convert_element_type_transpose_rule
 batching.defvectorized(convert_element_type_p)
 masking.defvectorized(convert_element_type_p)
+elementwise_primitives.add(convert_element_type_p)
+jaxpr_passes.simplification_rules[convert_element_type_p] = \
+    jaxpr_passes.forward_if_same_type
 
 
 def _bitcast_convert_type_shape_rule(operand, *, new_dtype):
@@ -2816,6 +2842,15 @@ batching.primitive_batchers[conv_general_dilated_p] = \
 masking.masking_rules[conv_general_dilated_p] = \
   _conv_general_dilated_masking_rule
 
+def _conv_general_dilated_remat_cost(lhs, rhs, *, dimension_numbers,
+                                     **unused_kwargs):
+  out_features = rhs.shape[dimension_numbers.rhs_spec[0]]
+  out = _conv_general_dilated_shape_rule(lhs, rhs,
+                                         dimension_numbers=dimension_numbers,
+                                         **unused_kwargs)
+  return 2 * prod(out) * prod(rhs.shape) / max(out_features, 1)
+pe.remat_cost_rules[conv_general_dilated_p] = _conv_general_dilated_remat_cost
+
 def _reshape_axis_into(src, dst, x):
   perm = [i for i in range(x.ndim) if i != src]
   perm.insert(dst, src)
@@ -3034,6 +3069,13 @@ ad.defbilinear(dot_general_p,
 batching.primitive_batchers[dot_general_p] = _dot_general_batch_rule
 masking.masking_rules[dot_general_p] = _dot_general_masking_rule
 
+def _dot_general_remat_cost(lhs, rhs, *, dimension_numbers, precision):
+  (lhs_contracting, _), _ = dimension_numbers
+  out = _dot_general_shape_rule(lhs, rhs, dimension_numbers=dimension_numbers,
+                                precision=precision)
+  return 2 * prod(out) * prod(lhs.shape[d] for d in lhs_contracting)
+pe.remat_cost_rules[dot_general_p] = _dot_general_remat_cost
+
 
 def _broadcast_shape_rule(operand, sizes):
   _check_shapelike('broadcast', 'sizes', sizes)
@@ -3115,6 +3157,8 @@ broadcast_in_dim_p = standard_primitive(
 broadcast_in_dim_p.def_impl(_broadcast_in_dim_impl)
 ad.deflinear(broadcast_in_dim_p, _broadcast_in_dim_transpose_rule)
 batching.primitive_batchers[broadcast_in_dim_p] = _broadcast_in_dim_batch_rule
+jaxpr_passes.simplification_rules[broadcast_in_dim_p] = \
+    jaxpr_passes.forward_if_same_type
 
 
 def _clamp_shape_rule(min, operand, max):
@@ -3140,6 +3184,7 @@ ad.defjvp(clamp_p,
           lambda g, min, operand, max:
           select(lt(max, operand), _brcast(g, operand), _zeros(operand)))
 batching.defbroadcasting(clamp_p)
+elementwise_primitives.add(clamp_p)
 
 
 def _concatenate_shape_rule(*operands, **kwargs):
@@ -3357,6 +3402,10 @@ def _reshape_impl(operand, *, new_sizes, dimensions):
       aval = ShapedArray(new_sizes, operand.dtype)
       lazy_expr = lazy.broadcast(operand._lazy_expr, new_sizes, bcast_dims)
       return xla.DeviceArray(aval, operand._device, lazy_expr, operand.device_buffer)
+    lazy_expr = lazy.reshape(operand._lazy_expr, new_sizes)
+    if lazy_expr is not None:
+      aval = ShapedArray(new_sizes, operand.dtype)
+      return xla.DeviceArray(aval, operand._device, lazy_expr, operand.device_buffer)
   return xla.apply_primitive(reshape_p, operand, new_sizes=new_sizes,
                              dimensions=dimensions)
 
@@ -3444,6 +3493,13 @@ ad.deflinear2(reshape_p, _reshape_transpose_rule)
 batching.primitive_batchers[reshape_p] = _reshape_batch_rule
 masking.masking_rules[reshape_p] = _reshape_masking_rule
 
+def _reshape_simplification_rule(eqn, producer):
+  if eqn.params['dimensions'] is not None:
+    return None
+  return jaxpr_passes.forward_if_same_type(eqn, producer)
+
+jaxpr_passes.simplification_rules[reshape_p] = _reshape_simplification_rule
+
 def _rev_shape_rule(operand, *, dimensions):
   _check_shapelike('rev', 'dimensions', dimensions)
   if len(set(dimensions)) != len(dimensions):
@@ -3461,7 +3517,16 @@ def _rev_batch_rule(batched_args, batch_dims, *, dimensions):
   new_dimensions = [i + 1 if i >= bdim else i for i in dimensions]
   return rev(operand, new_dimensions), bdim
 
+def _rev_impl(operand, *, dimensions):
+  if type(operand) is xla.DeviceArray:
+    lazy_expr = lazy.rev(operand._lazy_expr, dimensions)
+    return xla.DeviceArray(operand.aval, operand._device, lazy_expr,
+                           operand.device_buffer)
+  else:
+    return xla.apply_primitive(rev_p, operand, dimensions=dimensions)
+
 rev_p = standard_primitive(_rev_shape_rule, _input_dtype, 'rev')
+rev_p.def_impl(_rev_impl)
 ad.deflinear(rev_p, lambda t, dimensions: [rev(t, dimensions)])
 batching.primitive_batchers[rev_p] = _rev_batch_rule
 
@@ -3501,6 +3566,14 @@ ad.deflinear(transpose_p,
 batching.primitive_batchers[transpose_p] = _transpose_batch_rule
 masking.masking_rules[transpose_p] = _transpose_masking_rule
 
+def _transpose_simplification_rule(eqn, producer):
+  operand, = eqn.invars
+  if tuple(eqn.params['permutation']) != tuple(range(len(operand.aval.shape))):
+    return None
+  return operand
+
+jaxpr_passes.simplification_rules[transpose_p] = _transpose_simplification_rule
+
 
 def _select_shape_rule(pred, on_true, on_false):
   if on_true.shape != on_false.shape:
@@ -3580,6 +3653,7 @@ ad.defjvp(select_p,
           lambda g, b, x, y: select(b, _zeros(g), g))
 ad.primitive_transposes[select_p] = _select_transpose_rule
 batching.primitive_batchers[select_p] = _select_batch_rule
+elementwise_primitives.add(select_p)
 masking.masking_rules[select_p] = _select_masking_rule
 
 
@@ -3673,8 +3747,30 @@ def _slice_masking_rule(
                limit_indices=masking.padded_shape_as_value(limit_indices),
                strides=strides)
 
+# Eager slices smaller than 1/_LAZY_SLICE_MAX_SHRINK of their base buffer are
+# not kept lazy.
+_LAZY_SLICE_MAX_SHRINK = 2
+
+def _slice_impl(operand, *, start_indices, limit_indices, strides):
+  if type(operand) is xla.DeviceArray:
+    lazy_expr = lazy.slice(operand._lazy_expr, start_indices, limit_indices,
+                           strides)
+    aval = ShapedArray(lazy_expr.shape, operand.dtype)
+    out = xla.DeviceArray(aval, operand._device, lazy_expr, operand.device_buffer)
+    # A lazy slice keeps its whole base buffer alive, so slices that are much
+    # smaller than the buffer are materialized right away.
+    if (not xla.is_device_constant(operand) and
+        _LAZY_SLICE_MAX_SHRINK * prod(aval.shape) <
+        prod(operand.device_buffer.shape().dimensions())):
+      return xla._force(out)
+    return out
+  else:
+    return xla.apply_primitive(slice_p, operand, start_indices=start_indices,
+                               limit_indices=limit_indices, strides=strides)
+
 slice_p = standard_primitive(_slice_shape_rule, _input_dtype, 'slice',
                              _slice_translation_rule)
+slice_p.def_impl(_slice_impl)
 ad.deflinear2(slice_p, _slice_transpose_rule)
 batching.primitive_batchers[slice_p] = _slice_batching_rule
 masking.masking_rules[slice_p] = _slice_masking_rule
@@ -5773,6 +5869,7 @@ infeed_p.multiple_results = True
 infeed_p.def_impl(partial(xla.apply_primitive, infeed_p))
 infeed_p.def_abstract_eval(_infeed_abstract_eval)
 xla.translations[infeed_p] = _infeed_translation_rule
+jaxpr_passes.effectful_primitives.add(infeed_p)
 
 def outfeed(token, xs):
   """Outfeeds value `xs` to the host. Experimental.
@@ -5796,6 +5893,7 @@ outfeed_p = Primitive("outfeed")
 outfeed_p.def_impl(partial(xla.apply_primitive, outfeed_p))
 outfeed_p.def_abstract_eval(_outfeed_abstract_eval)
 xla.translations[outfeed_p] = _outfeed_translation_rule
+jaxpr_passes.effectful_primitives.add(outfeed_p)
 
 def rng_uniform(a, b, shape):
   """Stateful PRNG generator. Experimental and its use is discouraged.
@@ -5828,6 +5926,7 @@ rng_uniform_p = Primitive("rng_uniform")
 rng_uniform_p.def_impl(partial(xla.apply_primitive, rng_uniform_p))
 rng_uniform_p.def_abstract_eval(_rng_uniform_abstract_eval)
 xla.translations[rng_uniform_p] = _rng_uniform_translation_rule
+jaxpr_passes.effectful_primitives.add(rng_uniform_p)
 
 ### util
 
@@ -30,6 +30,7 @@ import numpy as np
 import jax
 from jax import core
 from jax import dtypes
+from jax import jaxpr_passes
 from jax import source_info_util
 from jax import util
 from jax.lax import lax
@@ -1098,6 +1099,14 @@ batching.primitive_batchers[cond_p] = _cond_batching_rule
 xla.initial_style_translations[cond_p] = _cond_translation_rule
 core.custom_typechecks[cond_p] = _cond_typecheck
 
+def _cond_pruning_rule(eqn, used_outputs):
+  branches = tuple(jaxpr_passes.prune_closed_jaxpr_outputs(jaxpr, used_outputs)
+                   for jaxpr in eqn.params['branches'])
+  outvars = [v for v, used in zip(eqn.outvars, used_outputs) if used]
+  return eqn._replace(outvars=outvars, params=dict(eqn.params, branches=branches))
+
+jaxpr_passes.output_pruning_rules[cond_p] = _cond_pruning_rule
+
 
 ### scan
 
@@ -1811,6 +1820,19 @@ batching.primitive_batchers[scan_p] = _scan_batching_rule
 masking.masking_rules[scan_p] = _scan_masking_rule
 core.custom_typechecks[scan_p] = partial(_scan_typecheck, False)
 
+def _scan_pruning_rule(eqn, used_outputs):
+  # Carried outputs feed back into the loop, so only unused `ys` are pruned.
+  num_carry = eqn.params['num_carry']
+  used_outputs = [True] * num_carry + list(used_outputs[num_carry:])
+  if all(used_outputs):
+    return eqn
+  jaxpr = jaxpr_passes.prune_closed_jaxpr_outputs(eqn.params['jaxpr'],
+                                                  used_outputs)
+  outvars = [v for v, used in zip(eqn.outvars, used_outputs) if used]
+  return eqn._replace(outvars=outvars, params=dict(eqn.params, jaxpr=jaxpr))
+
+jaxpr_passes.output_pruning_rules[scan_p] = _scan_pruning_rule
+
 
 def map(f, xs):
   """Map a function over leading array axes.
@@ -115,6 +115,79 @@ def pmean(x, axis_name, *, axis_index_groups=None):
   n = psum(1, axis_name=axis_name, axis_index_groups=axis_index_groups)
   return tree_util.tree_map(lambda v: v / n, x)
 
+def psum_bucketed(x, axis_name, *, bucket_bytes=2 ** 22,
+                  axis_index_groups=None):
+  """Compute an all-reduce sum on the leaves of ``x`` in size-bounded buckets.
+
+  Equivalent to :func:`psum`, but rather than one all-reduce per leaf of ``x``,
+  leaves of the same dtype are flattened and concatenated, in order, into
+  buckets of at most ``bucket_bytes`` bytes, and one all-reduce is performed per
+  bucket. For pytrees with many small leaves, e.g. the gradients of a model's
+  parameters, this bounds the number of collectives launched by the total size
+  of ``x`` rather than its number of leaves. Leaves larger than
+  ``bucket_bytes`` get a bucket of their own.
+
+  Args:
+    x: array(s) with a mapped axis named ``axis_name``.
+    axis_name: hashable Python object used to name a pmapped axis (see the
+      :func:`jax.pmap` documentation for more details).
+    bucket_bytes: the maximum size in bytes of the concatenated leaves reduced
+      by a single all-reduce.
+    axis_index_groups: optional list of lists containing axis indices, as in
+      :func:`psum`.
+
+  Returns:
+    Array(s) with the same shapes as ``x`` representing the result of an
+    all-reduce sum along the axis ``axis_name``.
+
+  For example, with 4 XLA devices available:
+
+  >>> grads = {'w': np.ones((4, 3)), 'b': np.arange(4.)}
+  >>> f = lambda g: jax.lax.psum_bucketed(g, 'i')
+  >>> y = jax.pmap(f, axis_name='i')(grads)
+  >>> print(y['b'])
+  [6. 6. 6. 6.]
+  """
+  _validate_axis_index_groups(axis_index_groups)
+  leaves, treedef = tree_util.tree_flatten(x)
+  leaves = [lax.convert_element_type(l, np.int32)
+            if dtypes.dtype(l) == np.bool_ else lax_numpy.asarray(l)
+            for l in leaves]
+  buckets = _bucket_leaves(leaves, bucket_bytes)
+  summed = psum([_concatenate_bucket(leaves, bucket) for bucket in buckets],
+                axis_name, axis_index_groups=axis_index_groups)
+  out_flat = [None] * len(leaves)
+  for bucket, flat in zip(buckets, summed):
+    offset = 0
+    for i in bucket:
+      size = prod(np.shape(leaves[i]))
+      out_flat[i] = lax.reshape(lax.slice(flat, (offset,), (offset + size,)),
+                                np.shape(leaves[i]))
+      offset += size
+  return tree_util.tree_unflatten(treedef, out_flat)
+
+def _bucket_leaves(leaves, bucket_bytes):
+  """Groups leaf indices into same-dtype buckets of at most bucket_bytes."""
+  buckets = []
+  open_buckets = {}  # dtype -> (index into buckets, bytes so far)
+  for i, leaf in enumerate(leaves):
+    dtype = dtypes.dtype(leaf)
+    nbytes = prod(np.shape(leaf)) * dtype.itemsize
+    current = open_buckets.get(dtype)
+    if nbytes > bucket_bytes:
+      buckets.append([i])
+    elif current is not None and current[1] + nbytes <= bucket_bytes:
+      buckets[current[0]].append(i)
+      open_buckets[dtype] = (current[0], current[1] + nbytes)
+    else:
+      open_buckets[dtype] = (len(buckets), nbytes)
+      buckets.append([i])
+  return buckets
+
+def _concatenate_bucket(leaves, bucket):
+  flats = [lax.reshape(leaves[i], (prod(np.shape(leaves[i])),)) for i in bucket]
+  return flats[0] if len(flats) == 1 else lax.concatenate(flats, 0)
+
 def pmax(x, axis_name, *, axis_index_groups=None):
   """Compute an all-reduce max on ``x`` over the pmapped axis ``axis_name``.
 
@@ -736,15 +809,171 @@ def all_gather(x, axis_name, *, axis_index_groups=None):
     [ 4.  5.  6.  7.]]
   """
 
+  index = _index_in_group(axis_name, axis_index_groups)
+  axis_size = psum(1, axis_name, axis_index_groups=axis_index_groups)
+
+  return _allgather(x, 0, axis_size, index, axis_name, axis_index_groups)
+
+def _index_in_group(axis_name, axis_index_groups):
   index = axis_index(axis_name)
   if axis_index_groups is not None:
     indices = np.array(axis_index_groups).flatten()
     axis_index_to_group_index = indices.argsort() % len(axis_index_groups[0])
     index = lax_numpy.array(axis_index_to_group_index)[index]
+  return index
+
+
+def psum_scatter(x, axis_name, *, scatter_dimension=0, axis_index_groups=None,
+                 tiled=False):
+  """Compute an all-reduce sum over ``axis_name``, and scatter the result.
+
+  Each replica receives only its part of the sum along ``scatter_dimension``:
+  this is equivalent to indexing the result of :func:`psum` with the replica's
+  :func:`axis_index`, but never materializes the full sum in user code. It is
+  the transpose of :func:`all_gather`, and can be used e.g. to keep a shard of
+  reduced gradients and optimizer state on each replica.
+
+  If ``x`` is a pytree then the result is equivalent to mapping this function to
+  each leaf in the tree.
 
+  Args:
+    x: array(s) with a mapped axis named ``axis_name``.
+    axis_name: hashable Python object used to name a pmapped axis (see the
+      :func:`jax.pmap` documentation for more details).
+    scatter_dimension: a positional axis of ``x`` along which the sum is
+      scattered.
+    axis_index_groups: optional list of lists containing axis indices, as in
+      :func:`psum`. The sum is scattered among the members of each group.
+    tiled: when False, the size of dimension ``scatter_dimension`` must equal
+      the size of axis ``axis_name`` (or the group size if
+      ``axis_index_groups`` is given), and the dimension is removed from the
+      result. When True, the size must be divisible by the axis size, and each
+      replica receives a contiguous chunk of the dimension.
+
+  Returns:
+    Array(s) with the same shape as ``x``, except for dimension
+    ``scatter_dimension``, which is removed if ``tiled`` is False and divided by
+    the axis size otherwise.
+
+  For example, with 4 XLA devices available:
+
+  >>> x = np.arange(16.).reshape(4, 4)
+  >>> y = jax.pmap(lambda x: jax.lax.psum_scatter(x, 'i'), axis_name='i')(x)
+  >>> print(y)
+  [24. 28. 32. 36.]
+  """
   axis_size = psum(1, axis_name, axis_index_groups=axis_index_groups)
+  def bind(leaf):
+    return reduce_scatter_p.bind(
+        leaf, axis_name=axis_name, scatter_dimension=scatter_dimension,
+        axis_index_groups=axis_index_groups, axis_size=axis_size, tiled=tiled)
+  _validate_axis_index_groups(axis_index_groups)
+  return tree_util.tree_map(bind, x)
 
-  return _allgather(x, 0, axis_size, index, axis_name, axis_index_groups)
+def _reduce_scatter_abstract_eval(x, *, axis_name, scatter_dimension,
+                                  axis_index_groups, axis_size, tiled):
+  input_aval = raise_to_shaped(x)
+  shape = list(input_aval.shape)
+  size = shape[scatter_dimension]
+  if tiled:
+    if size % axis_size != 0:
+      raise ValueError(f"tiled psum_scatter requires the size of dimension "
+                       f"{scatter_dimension} of its operand, {size}, to be "
+                       f"divisible by the axis size {axis_size}.")
+    shape[scatter_dimension] = size // axis_size
+  else:
+    if size != axis_size:
+      raise ValueError(f"psum_scatter requires the size of dimension "
+                       f"{scatter_dimension} of its operand, {size}, to equal "
+                       f"the axis size {axis_size}.")
+    del shape[scatter_dimension]
+  return ShapedArray(tuple(shape), input_aval.dtype, weak_type=False)
+
+def _reduce_scatter_translation_rule(c, x, *, axis_name, scatter_dimension,
+                                     axis_index_groups, axis_size, tiled,
+                                     axis_env, platform):
+  dtype = c.get_shape(x).numpy_dtype()
+  if dtypes.issubdtype(dtype, np.complexfloating):
+    scatter = partial(_reduce_scatter_translation_rule, c, axis_name=axis_name,
+                      scatter_dimension=scatter_dimension,
+                      axis_index_groups=axis_index_groups, axis_size=axis_size,
+                      tiled=tiled, axis_env=axis_env, platform=platform)
+    return xops.Complex(scatter(xops.Real(x)), scatter(xops.Imag(x)))
+  summed = _allreduce_translation_rule(
+      lax.add_p, c, x, axis_name=axis_name, axis_index_groups=axis_index_groups,
+      axis_env=axis_env, platform=platform)
+  # The position of each replica in its replica group, indexed by replica id.
+  replica_groups = _replica_groups(axis_env, axis_name, axis_index_groups)
+  positions = np.zeros(axis_env.nreps, np.int32)
+  for group in replica_groups:
+    positions[list(group)] = np.arange(len(group))
+  replica_id = xops.ConvertElementType(xops.ReplicaId(c),
+                                       xb.dtype_to_etype(np.int32))
+  position = xops.Reshape(
+      xops.DynamicSlice(xb.constant(c, positions), [replica_id], [1]), ())
+  shape = list(c.get_shape(x).dimensions())
+  chunk_size = shape[scatter_dimension] // axis_size
+  zero = xb.constant(c, np.array(0, np.int32))
+  start_indices = [zero] * len(shape)
+  start_indices[scatter_dimension] = xops.Mul(
+      position, xb.constant(c, np.array(chunk_size, np.int32)))
+  slice_sizes = list(shape)
+  slice_sizes[scatter_dimension] = chunk_size
+  out = xops.DynamicSlice(summed, start_indices, slice_sizes)
+  if not tiled:
+    del slice_sizes[scatter_dimension]
+    out = xops.Reshape(out, slice_sizes)
+  return out
+
+def _reduce_scatter_transpose_rule(ct, *, axis_name, scatter_dimension,
+                                   axis_index_groups, axis_size, tiled):
+  index = _index_in_group(axis_name, axis_index_groups)
+  out = _allgather(ct, scatter_dimension, axis_size, index, axis_name,
+                   axis_index_groups)
+  if tiled:
+    shape = list(ct.shape)
+    shape[scatter_dimension] *= axis_size
+    out = lax.reshape(out, shape)
+  return [out]
+
+def _reduce_scatter_batcher(vals_in, dims_in, *, axis_name, scatter_dimension,
+                            axis_index_groups, axis_size, tiled):
+  x, = vals_in
+  d, = dims_in
+  scatter_dimension += d <= scatter_dimension
+  out = reduce_scatter_p.bind(
+      x, axis_name=axis_name, scatter_dimension=scatter_dimension,
+      axis_index_groups=axis_index_groups, axis_size=axis_size, tiled=tiled)
+  if not tiled and d > scatter_dimension:
+    d -= 1
+  return out, d
+
+def _reduce_scatter_batched_collective(vals_in, dims_in, frame_size, *,
+                                       axis_name, scatter_dimension,
+                                       axis_index_groups, axis_size, tiled):
+  if axis_index_groups is not None:
+    raise NotImplementedError("axis_index_groups not implemented in vmap collectives. "
+                              "Please open a feature request!")
+  x, = vals_in
+  d, = dims_in
+  if d is batching.not_mapped:
+    x = x * axis_size
+  else:
+    x = lax._reduce_sum(x, [d])
+  if tiled:
+    shape = list(x.shape)
+    shape[scatter_dimension:scatter_dimension + 1] = [
+        axis_size, shape[scatter_dimension] // axis_size]
+    x = lax.reshape(x, shape)
+  return [x], [scatter_dimension]
+
+reduce_scatter_p = core.Primitive('reduce_scatter')
+reduce_scatter_p.def_abstract_eval(_reduce_scatter_abstract_eval)
+xla.parallel_translations[reduce_scatter_p] = _reduce_scatter_translation_rule
+ad.deflinear(reduce_scatter_p, _reduce_scatter_transpose_rule)
+pxla.multi_host_supported_collectives.add(reduce_scatter_p)
+batching.primitive_batchers[reduce_scatter_p] = _reduce_scatter_batcher
+batching.collective_rules[reduce_scatter_p] = _reduce_scatter_batched_collective
 
 
 def _axis_index_translation_rule(c, *, axis_name, axis_env, platform):
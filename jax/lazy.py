@@ -13,6 +13,7 @@
 # limitations under the License.
 
 
+import builtins
 from collections import namedtuple
 import functools
 import operator as op
@@ -67,6 +68,15 @@ def taggedtuple(name, fields) -> Callable[..., Any]:
 #   * Delta builds a Kronecker delta array with ones along its multidimensional
 #     main diagonal and zeros elsewhere (for use in tensor contractions).
 #
+# Before reindexing, a sequence of operations may be applied to the input. The
+# operations, which are expressed in the coordinates of the input, are
+#   * Slice, a static strided slice (like lax.slice),
+#   * Rev, a reversal of some axes (like lax.rev),
+#   * Reshape, a row-major reshape (like lax.reshape without dimensions), and
+#   * Convert, an element type conversion (like lax.convert_element_type).
+# Chains of these operations on DeviceArrays are thus staged out as a single
+# computation when the array is forced, rather than dispatched one by one.
+#
 # The reindexing specification encodes the shape of the final result and a list
 # of dimensions, which are integers or Nones. The integer entries take on values
 # 0, 1, ..., R-1 where R is the rank of the input array, and encode where the
@@ -101,12 +111,17 @@ def taggedtuple(name, fields) -> Callable[..., Any]:
 # but we want hashes to be sensitive to the type tag (while still being fast).
 
 # pytype: disable=wrong-arg-count
-LazyExpr = namedtuple('LazyExpr', ['input', 'shape', 'dims'])
+LazyExpr = namedtuple('LazyExpr', ['input', 'shape', 'dims', 'ops'],
+                      defaults=((),))
 ArrayVar = taggedtuple('ArrayVar', [])
 Iota = taggedtuple('Iota', ['dtype', 'size'])           # like np.arange(N)
 Eye = taggedtuple('Eye', ['dtype', 'shape', 'offset'])  # like np.eye
 Tri = taggedtuple('Tri', ['dtype', 'shape', 'offset'])  # like np.tri
 Delta = taggedtuple('Delta', ['dtype', 'shape'])  # kronecker delta arrays
+Slice = taggedtuple('Slice', ['start_indices', 'limit_indices', 'strides'])
+Rev = taggedtuple('Rev', ['dimensions'])
+Reshape = taggedtuple('Reshape', ['new_sizes'])
+Convert = taggedtuple('Convert', ['dtype'])
 # pytype: enable=wrong-arg-count
 
 def array(shape):
@@ -130,18 +145,64 @@ def broadcast(lexpr, shape, broadcast_dimensions):
   new_dims = [None] * len(shape)
   for i, d in enumerate(broadcast_dimensions):
     new_dims[d] = lexpr.dims[i]
-  return LazyExpr(lexpr.input, shape, tuple(new_dims))
+  return lexpr._replace(shape=shape, dims=tuple(new_dims))
 
 def transpose(lexpr: LazyExpr, perm: Sequence[int]):
   new_shape = tuple(lexpr.shape[i] for i in perm)
   new_dims = tuple(lexpr.dims[i] for i in perm)
-  return LazyExpr(lexpr.input, new_shape, new_dims)
+  return lexpr._replace(shape=new_shape, dims=new_dims)
+
+def slice(lexpr: LazyExpr, start_indices: Sequence[int],
+          limit_indices: Sequence[int], strides: Optional[Sequence[int]]):
+  strides = strides or (1,) * len(lexpr.shape)
+  in_start = [0] * len(lexpr.dims)
+  in_limit = list(_input_shape(lexpr))
+  in_strides = [1] * len(lexpr.dims)
+  new_shape = []
+  for d, lo, hi, stride in zip(lexpr.dims, start_indices, limit_indices,
+                               strides):
+    lo, hi, stride = int(lo), int(hi), int(stride)
+    if d is not None:
+      in_start[d], in_limit[d], in_strides[d] = lo, hi, stride
+    new_shape.append(max(0, (hi - lo + stride - 1) // stride))
+  op = Slice(tuple(in_start), tuple(in_limit), tuple(in_strides))
+  return lexpr._replace(shape=tuple(new_shape), ops=lexpr.ops + (op,))
+
+def rev(lexpr: LazyExpr, dimensions: Sequence[int]):
+  in_dims = tuple(sorted(lexpr.dims[i] for i in dimensions
+                         if lexpr.dims[i] is not None))
+  if not in_dims:
+    return lexpr
+  return lexpr._replace(ops=lexpr.ops + (Rev(in_dims),))
+
+def reshape(lexpr: LazyExpr, new_sizes: Sequence[int]) -> Optional[LazyExpr]:
+  """Returns a reshaped `lexpr`, or None if it is broadcast or transposed."""
+  if lexpr.dims != tuple(range(len(lexpr.shape))):
+    return None
+  new_sizes = tuple(new_sizes)
+  return LazyExpr(lexpr.input, new_sizes, tuple(range(len(new_sizes))),
+                  lexpr.ops + (Reshape(new_sizes),))
+
+def convert_element_type(lexpr: LazyExpr, dtype):
+  input_ = lexpr.input
+  if not lexpr.ops and type(input_) in (Eye, Tri, Delta):
+    # These constructors only produce zeros and ones.
+    return lexpr._replace(input=type(input_)(dtype, *input_[2:]))
+  return lexpr._replace(ops=lexpr.ops + (Convert(dtype),))
+
+def _input_shape(lexpr: LazyExpr):
+  # Every axis of the input appears exactly once in `dims`, with its size.
+  shape = [None] * len([d for d in lexpr.dims if d is not None])
+  for d, size in zip(lexpr.dims, lexpr.shape):
+    if d is not None:
+      shape[d] = size
+  return tuple(shape)
 
 def is_constant(lexpr: Optional[LazyExpr]):
   return lexpr is not None and type(lexpr.input) is not ArrayVar
 
 def is_trivial(lexpr: LazyExpr) -> bool:
-  return (type(lexpr.input) is ArrayVar and
+  return (type(lexpr.input) is ArrayVar and not lexpr.ops and
           lexpr.dims == tuple(range(len(lexpr.shape))))
 
 
@@ -156,7 +217,7 @@ def eval_lexpr(lexpr, x):
   if is_trivial(lexpr):
     return x
 
-  input_, shape, dims = lexpr
+  input_, shape, dims, ops = lexpr
 
   # first create a starting ndarray from input_
   t = type(input_)
@@ -182,6 +243,21 @@ def eval_lexpr(lexpr, x):
   else:
     assert False
 
+  # then apply the operations on the input
+  for lop in ops:
+    t = type(lop)
+    if t is Slice:
+      x = x[tuple(map(builtins.slice, lop.start_indices, lop.limit_indices,
+                      lop.strides))]
+    elif t is Rev:
+      x = np.flip(x, lop.dimensions)
+    elif t is Reshape:
+      x = np.reshape(x, lop.new_sizes)
+    elif t is Convert:
+      x = np.asarray(x, lop.dtype)
+    else:
+      assert False
+
   # then apply the reindexing operation
   perm = [d for d in dims if d is not None]
   if perm != list(range(len(perm))):
@@ -205,7 +281,7 @@ def stage_lexpr(c, lexpr: Optional[LazyExpr], x):
   if lexpr is None or is_trivial(lexpr):
     return x
 
-  input_, shape, dims = lexpr
+  input_, shape, dims, ops = lexpr
 
   # first create a starting XlaOp from input_
   t = type(input_)
@@ -241,6 +317,20 @@ def stage_lexpr(c, lexpr: Optional[LazyExpr], x):
   else:
     assert False
 
+  # then apply the operations on the input
+  for lop in ops:
+    t = type(lop)
+    if t is Slice:
+      x = xops.Slice(x, lop.start_indices, lop.limit_indices, lop.strides)
+    elif t is Rev:
+      x = xops.Rev(x, lop.dimensions)
+    elif t is Reshape:
+      x = xops.Reshape(x, lop.new_sizes)
+    elif t is Convert:
+      x = xops.ConvertElementType(x, xb.dtype_to_etype(lop.dtype))
+    else:
+      assert False
+
   # then apply the operations encoded in reindex
   bcast_dims, perm = unzip2((i, d) for i, d in enumerate(dims) if d is not None)
   if tuple(perm) != tuple(range(len(perm))):
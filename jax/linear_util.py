@@ -62,11 +62,27 @@ dynamic positional arguments for the generators, and also the auxiliary output
 data must be immutable, because it will be stored in function memoization tables.
 """
 
-from typing import Any, Tuple, Callable
+from collections import OrderedDict
+import functools
+import threading
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
 import weakref
 
+from .config import flags
 from .util import curry
 
+FLAGS = flags.FLAGS
+flags.DEFINE_integer(
+    'jax_compilation_cache_max_entries', 4096,
+    'Maximum number of entries kept by each in-memory compilation cache '
+    '(e.g. the caches behind jit, pmap and op-by-op dispatch) before the least '
+    'recently used entries are evicted. A non-positive value means unbounded.')
+flags.DEFINE_integer(
+    'jax_compilation_cache_max_bytes', 0,
+    'Maximum estimated size in bytes of the executables kept by each in-memory '
+    'compilation cache before the least recently used entries are evicted. A '
+    'non-positive value means unbounded.')
+
 class StoreException(Exception): pass
 
 
@@ -210,33 +226,260 @@ def wrap_init(f, params={}) -> WrappedFun:
   return WrappedFun(f, (), (), tuple(sorted(params.items())))
 
 
-def cache(call: Callable):
+class CacheInfo(NamedTuple):
+  """Statistics about the cached entries of one function (or all functions)."""
+  hits: int
+  misses: int
+  num_entries: int
+  nbytes: int
+
+
+class _OwnerStats(object):
+  __slots__ = ("name", "hits", "misses", "keys", "nbytes")
+
+  def __init__(self, name):
+    self.name = name
+    self.hits = 0
+    self.misses = 0
+    self.keys = set()
+    self.nbytes = 0
+
+  def info(self) -> CacheInfo:
+    return CacheInfo(self.hits, self.misses, len(self.keys), self.nbytes)
+
+
+class BoundedCache(object):
+  """A least-recently-used table bounded by entry count and estimated bytes.
+
+  Entries are grouped by an `owner`, typically the Python callable whose
+  compilation produced them, so that statistics can be reported and entries
+  evicted per owner. Owners are referenced weakly: all of an owner's entries are
+  dropped when it is garbage collected.
+
+  The bounds are read from the ``jax_compilation_cache_max_entries`` and
+  ``jax_compilation_cache_max_bytes`` flags at insertion time. If given,
+  ``on_evict`` is called once per operation that evicts entries; replacing an
+  entry is not an eviction.
+  """
+
+  def __init__(self, on_evict: Optional[Callable[[], None]] = None):
+    self._owners: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    # Maps (owner stats, key) to (value, nbytes), in least-recently-used order.
+    self._entries: OrderedDict = OrderedDict()
+    self._nbytes = 0
+    self._lock = threading.RLock()
+    self._on_evict = on_evict
+
+  def _stats(self, owner) -> _OwnerStats:
+    stats = self._owners.get(owner)
+    if stats is None:
+      stats = self._owners[owner] = _OwnerStats(fun_name(owner))
+      weakref.finalize(owner, self._drop, stats)
+    return stats
+
+  def get(self, owner, key, default=None):
+    with self._lock:
+      stats = self._stats(owner)
+      entry = self._entries.get((stats, key))
+      if entry is None:
+        stats.misses += 1
+        return default
+      stats.hits += 1
+      self._entries.move_to_end((stats, key))
+      return entry[0]
+
+  def record_hit(self, owner, count: int = 1):
+    """Counts `count` hits for `owner` served without consulting the table."""
+    with self._lock:
+      self._stats(owner).hits += count
+
+  def put(self, owner, key, value, nbytes: int = 0):
+    """Inserts `value`, whose estimated size is `nbytes`, and evicts."""
+    with self._lock:
+      stats = self._stats(owner)
+      old = self._entries.pop((stats, key), None)
+      if old is not None:
+        self._remove_accounting(stats, key, old[1])
+      self._entries[(stats, key)] = (value, nbytes)
+      stats.keys.add(key)
+      stats.nbytes += nbytes
+      self._nbytes += nbytes
+      if self._evict_to_bounds():
+        self._notify_evict()
+
+  def _remove_accounting(self, stats, key, nbytes):
+    stats.keys.discard(key)
+    stats.nbytes -= nbytes
+    self._nbytes -= nbytes
+
+  def _notify_evict(self):
+    if self._on_evict is not None:
+      self._on_evict()
+
+  def _evict_to_bounds(self) -> bool:
+    max_entries = FLAGS.jax_compilation_cache_max_entries
+    max_bytes = FLAGS.jax_compilation_cache_max_bytes
+    evicted = False
+    # Never evict the most recently inserted entry.
+    while len(self._entries) > 1 and (
+        (max_entries > 0 and len(self._entries) > max_entries) or
+        (max_bytes > 0 and self._nbytes > max_bytes)):
+      (stats, key), (_, nbytes) = self._entries.popitem(last=False)
+      self._remove_accounting(stats, key, nbytes)
+      evicted = True
+    return evicted
+
+  def _drop(self, stats):
+    with self._lock:
+      if not stats.keys:
+        return
+      for key in list(stats.keys):
+        _, nbytes = self._entries.pop((stats, key))
+        self._remove_accounting(stats, key, nbytes)
+      self._notify_evict()
+
+  def info(self, owner=None) -> CacheInfo:
+    """Returns statistics for `owner`, or totals over all owners if None."""
+    with self._lock:
+      if owner is not None:
+        stats = self._owners.get(owner)
+        return stats.info() if stats is not None else CacheInfo(0, 0, 0, 0)
+      infos = [stats.info() for stats in self._owners.values()]
+      return CacheInfo(sum(i.hits for i in infos), sum(i.misses for i in infos),
+                       len(self._entries), self._nbytes)
+
+  def evict(self, owner=None):
+    """Evicts the entries of `owner`, or all entries if None.
+
+    Hit and miss counts are kept.
+    """
+    with self._lock:
+      if owner is None:
+        self._entries.clear()
+        self._nbytes = 0
+        for stats in self._owners.values():
+          stats.keys.clear()
+          stats.nbytes = 0
+        self._notify_evict()
+      else:
+        stats = self._owners.get(owner)
+        if stats is not None:
+          self._drop(stats)
+
+  def clear(self):
+    """Evicts all entries and forgets all statistics."""
+    with self._lock:
+      self.evict()
+      self._owners = weakref.WeakKeyDictionary()
+
+
+def cache(call: Callable, weigher: Optional[Callable[[Any], int]] = None,
+          on_evict: Optional[Callable[[], None]] = None):
   """Memoization decorator for functions taking a WrappedFun as first argument.
 
   Args:
     call: a Python callable that takes a WrappedFun as its first argument. The
       underlying transforms and params on the WrappedFun are used as part of the
       memoization cache key.
+    weigher: optional callable estimating the size in bytes of a result of
+      ``call``, used to bound the memory held by the cache.
+    on_evict: optional callable, called once per operation evicting entries.
 
   Returns:
-     A memoized version of ``call``.
+     A memoized version of ``call``. Entries are evicted in least-recently-used
+     order according to the ``jax_compilation_cache_max_entries`` and
+     ``jax_compilation_cache_max_bytes`` flags. The memoized function has a
+     ``cache_info(f=None)`` method returning a ``CacheInfo`` for the underlying
+     Python callable ``f`` (or totals), a ``cache_evict(f=None)`` method, a
+     ``cache_clear()`` method, and a ``cache_record_hit(f)`` method counting a
+     hit for ``f`` served without consulting the cache.
   """
-  fun_caches: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+  fun_caches = BoundedCache(on_evict=on_evict)
 
   def memoized_fun(fun: WrappedFun, *args):
-    cache = fun_caches.setdefault(fun.f, {})
     key = (fun.transforms, fun.params, args)
-    result = cache.get(key, None)
+    result = fun_caches.get(fun.f, key)
     if result is not None:
       ans, stores = result
       fun.populate_stores(stores)
     else:
       ans = call(fun, *args)
-      cache[key] = (ans, fun.stores)
+      nbytes = weigher(ans) if weigher else 0
+      fun_caches.put(fun.f, key, (ans, fun.stores), nbytes)
     return ans
 
   memoized_fun.cache_clear = fun_caches.clear  # type: ignore
+  memoized_fun.cache_info = fun_caches.info  # type: ignore
+  memoized_fun.cache_evict = fun_caches.evict  # type: ignore
+  memoized_fun.cache_record_hit = fun_caches.record_hit  # type: ignore
   return memoized_fun
+class _FrontEntry(object):
+  __slots__ = ("owner", "ans", "calls")
+
+  def __init__(self, owner, ans):
+    self.owner = owner
+    self.ans = ans
+    self.calls = 0
+
+def bounded_cache(call: Callable, weigher: Optional[Callable[[Any], int]] = None):
+  """Memoization decorator grouping cache entries by the first argument.
+
+  Like :func:`cache`, but for functions whose first argument is a plain hashable
+  and weak-referenceable object (e.g. a primitive or a Python function) rather
+  than a WrappedFun. All arguments must be hashable.
+
+  Since this decorates the op-by-op dispatch path, hits are served by a
+  ``functools.lru_cache`` in front of the bounded table, which is only consulted
+  on misses of the front cache and is cleared whenever the table evicts entries.
+  Owners are kept alive by the front cache until then. Hits of the front cache
+  are counted without taking a lock, so concurrent calls may go uncounted.
+  """
+  not_found = object()
+  # The entries of the front cache, whose hits are counted without locking.
+  # Their counts are added to the table's statistics when the front cache is
+  # cleared, and to the reported ones in the meantime.
+  front_entries: List[_FrontEntry] = []
+
+  def clear_front():
+    lookup.cache_clear()
+    entries = front_entries[:]
+    del front_entries[:]
+    for entry in entries:
+      if entry.calls > 1:
+        owner_caches.record_hit(entry.owner, entry.calls - 1)
+
+  owner_caches = BoundedCache(on_evict=clear_front)
+
+  @functools.lru_cache(maxsize=None)
+  def lookup(owner, *args, **kwargs):
+    key = (args, tuple(sorted(kwargs.items())))
+    ans = owner_caches.get(owner, key, not_found)
+    if ans is not_found:
+      ans = call(owner, *args, **kwargs)
+      nbytes = weigher(ans) if weigher else 0
+      owner_caches.put(owner, key, ans, nbytes)
+    entry = _FrontEntry(owner, ans)
+    front_entries.append(entry)
+    return entry
+
+  @functools.wraps(call)
+  def memoized_fun(owner, *args, **kwargs):
+    entry = lookup(owner, *args, **kwargs)
+    entry.calls += 1
+    return entry.ans
+
+  def cache_info(owner=None) -> CacheInfo:
+    info = owner_caches.info(owner)
+    front_hits = sum(entry.calls - 1 for entry in front_entries[:]
+                     if entry.calls > 1 and
+                     (owner is None or entry.owner is owner))
+    return info._replace(hits=info.hits + front_hits)
+
+  memoized_fun.cache_clear = owner_caches.clear  # type: ignore
+  memoized_fun.cache_info = cache_info  # type: ignore
+  memoized_fun.cache_evict = owner_caches.evict  # type: ignore
+  return memoized_fun
+
 
 @transformation
 def hashable_partial(x, *args):
@@ -36,11 +36,16 @@ The approach is based on:
 
 See also https://github.com/google/jax/blob/master/design_notes/prng.md
 for the design and its motivation.
+
+Random values are generated by a PRNG implementation, selected per key with the
+``impl`` argument of :func:`PRNGKey` and registered in ``prng_impls``. The
+default, ``"threefry2x32"``, uses the Threefry 2x32 hash; ``"philox4x32"`` uses
+the Philox 4x32-10 bijection, from the same paper.
 """
 
 
 from functools import partial
-from typing import Optional, Sequence, Union
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Tuple, Union
 import warnings
 
 import numpy as np
@@ -65,19 +70,34 @@ from jax.util import prod
 _UINT_DTYPES = {8: jnp.uint8, 16: jnp.uint16, 32: jnp.uint32, 64: jnp.uint64}
 
 
-def PRNGKey(seed: int) -> jnp.ndarray:
+def PRNGKey(seed: int, impl: Optional[str] = None) -> jnp.ndarray:
   """Create a pseudo-random number generator (PRNG) key given an integer seed.
 
   Args:
     seed: a 64- or 32-bit integer used as the value of the key.
+    impl: optional, the name of the PRNG implementation generating random values
+      from the key and its descendants, a key of ``prng_impls``. Defaults to
+      ``"threefry2x32"``.
 
   Returns:
-    A PRNG key, which is modeled as an array of shape (2,) and dtype uint32. The
-    key is constructed from a 64-bit seed by effectively bit-casting to a pair
-    of uint32 values (or from a 32-bit seed by first padding out with zeros).
+    A PRNG key. With the default implementation, it is modeled as an array of
+    shape (2,) and dtype uint32. The key is constructed from a 64-bit seed by
+    effectively bit-casting to a pair of uint32 values (or from a 32-bit seed by
+    first padding out with zeros).
   """
   if np.shape(seed):
     raise TypeError("PRNGKey seed must be a scalar.")
+  if impl is None:
+    impl = default_prng_impl
+  try:
+    prng_impl = prng_impls[impl]
+  except KeyError as err:
+    raise ValueError(f"Unknown PRNG implementation {impl!r}; available "
+                     f"implementations are {sorted(prng_impls)}.") from err
+  return prng_impl.seed(seed)
+
+def _seed_words(seed) -> jnp.ndarray:
+  """Bit-casts a 64- or 32-bit integer seed to a pair of uint32 values."""
   convert = lambda k: lax.reshape(lax.convert_element_type(k, np.uint32), [1])
   if isinstance(seed, (int, np.ndarray)):
     # Special handling of raw integer values, which may have be 64bit even
@@ -88,11 +108,17 @@ def PRNGKey(seed: int) -> jnp.ndarray:
   k2 = convert(jnp.bitwise_and(seed, 0xFFFFFFFF))
   return lax.concatenate([k1, k2], 0)
 
-def _is_prng_key(key: jnp.ndarray) -> bool:
+def _key_impl(key: jnp.ndarray) -> Optional["PRNGImpl"]:
+  """The PRNG implementation of ``key``, or None if it is not a PRNG key."""
   try:
-    return key.shape == (2,) and key.dtype == np.uint32
+    if key.dtype != np.uint32:
+      return None
+    return _prng_impls_by_key_shape.get(tuple(key.shape))
   except AttributeError:
-    return False
+    return None
+
+def _is_prng_key(key: jnp.ndarray) -> bool:
+  return _key_impl(key) is not None
 
 
 ### utilities
@@ -263,18 +289,148 @@ def threefry_2x32(keypair, count):
   return lax.reshape(out[:-1] if odd_size else out, count.shape)
 
 
+def _philox4x32_abstract_eval(*args):
+  if any(a.dtype != jnp.uint32 for a in args):
+    raise TypeError("Arguments to philox4x32 must have uint32 type, got {}"
+                    .format(args))
+  if all(isinstance(arg, abstract_arrays.ShapedArray) for arg in args):
+    shape = lax._broadcasting_shape_rule("philox4x32", *args)
+    aval = abstract_arrays.ShapedArray(shape, jnp.dtype(jnp.uint32))
+  else:
+    aval = abstract_arrays.UnshapedArray(jnp.dtype(jnp.uint32))
+  return (aval,) * 4
+
+_PHILOX_MULTIPLIERS = (0xD2511F53, 0xCD9E8D57)
+_PHILOX_KEY_INCREMENTS = (0x9E3779B9, 0xBB67AE85)
+
+def _philox4x32_translation_rule(c, k1, k2, x1, x2, x3, x4):
+  """Applies the 10 rounds of the Philox 4x32 bijection.
+
+  Each round computes the full 64-bit products of two of the counter words with
+  the Philox multipliers, using 64-bit integer arithmetic in XLA regardless of
+  whether ``jax_enable_x64`` is set.
+  """
+  args = (k1, k2, x1, x2, x3, x4)
+  shape = lax.broadcast_shapes(*(c.get_shape(x).dimensions() for x in args))
+  rank = len(shape)
+  def _broadcast(x):
+    ndims = c.get_shape(x).rank()
+    return xla_client.ops.BroadcastInDim(x, shape,
+                                         tuple(range(rank - ndims, rank)))
+  def _constant(value, dtype):
+    return xla_client.ops.Broadcast(
+        xla_bridge.constant(c, np.array(value, dtype), canonicalize_types=False),
+        shape)
+  u32 = xla_bridge.dtype_to_etype(np.uint32)
+  u64 = xla_bridge.dtype_to_etype(np.uint64)
+  m1, m2 = (_constant(m, np.uint64) for m in _PHILOX_MULTIPLIERS)
+  w1, w2 = (_constant(w, np.uint32) for w in _PHILOX_KEY_INCREMENTS)
+  thirty_two = _constant(32, np.uint64)
+
+  def mulhilo(m, x):
+    product = xla_client.ops.Mul(m, xla_client.ops.ConvertElementType(x, u64))
+    hi = xla_client.ops.ShiftRightLogical(product, thirty_two)
+    return (xla_client.ops.ConvertElementType(hi, u32),
+            xla_client.ops.ConvertElementType(product, u32))
+
+  Xor = xla_client.ops.Xor
+  k1, k2, x1, x2, x3, x4 = map(_broadcast, args)
+  for i in range(10):
+    if i:
+      k1 = xla_client.ops.Add(k1, w1)
+      k2 = xla_client.ops.Add(k2, w2)
+    hi1, lo1 = mulhilo(m1, x1)
+    hi2, lo2 = mulhilo(m2, x3)
+    x1, x2, x3, x4 = Xor(Xor(hi2, x2), k1), lo2, Xor(Xor(hi1, x4), k2), lo1
+  return xla_client.ops.Tuple(c, [x1, x2, x3, x4])
+
+philox4x32_p = core.Primitive("philox4x32")
+philox4x32_p.multiple_results = True
+philox4x32_p.def_impl(partial(xla.apply_primitive, philox4x32_p))
+philox4x32_p.def_abstract_eval(_philox4x32_abstract_eval)
+batching.defbroadcasting(philox4x32_p)
+xla.translations[philox4x32_p] = _philox4x32_translation_rule
+
+@jit
+def philox_4x32(keypair, count):
+  """Apply the Philox 4x32 bijection with 10 rounds.
+
+  Args:
+    keypair: a pair of 32bit unsigned integers used for the key.
+    count: an array of dtype uint32 used for the counts.
+
+  Returns:
+    An array of dtype uint32 with the same shape as `count`.
+  """
+  key1, key2 = keypair
+  if not lax.dtype(key1) == lax.dtype(key2) == lax.dtype(count) == np.uint32:
+    msg = "philox_4x32 requires uint32 arguments, got {}"
+    raise TypeError(msg.format([lax.dtype(x) for x in [key1, key2, count]]))
+
+  padding = -count.size % 4
+  x = count.ravel()
+  if padding:
+    x = jnp.concatenate([x, np.zeros(padding, np.uint32)])
+  x = philox4x32_p.bind(key1, key2, *jnp.split(x, 4))
+  out = jnp.concatenate(x)
+  return lax.reshape(out[:count.size], count.shape)
+
+
+### PRNG implementations
+
+
+class PRNGImpl(NamedTuple):
+  """A PRNG implementation, i.e. the functions generating random values.
+
+  Keys of all implementations are arrays of dtype uint32, distinguished by their
+  shape, so that the implementation of a key is known from its type alone.
+
+  Attributes:
+    name: the name of the implementation, as passed to :func:`PRNGKey`.
+    key_shape: the shape of the keys of the implementation.
+    seed: maps an integer seed to a key.
+    split: maps a key and a static number of keys ``num`` to ``num`` new keys,
+      stacked along a leading axis.
+    fold_in: maps a key and a 32bit integer to a new key.
+    random_bits: maps a key, a static bit width (8, 16, 32 or 64) and a static
+      shape to an array of unsigned integers of that width and shape.
+  """
+  name: str
+  key_shape: Tuple[int, ...]
+  # The functions are typed loosely so that jitted functions can be used.
+  seed: Callable[..., jnp.ndarray]
+  split: Callable[..., jnp.ndarray]
+  fold_in: Callable[..., jnp.ndarray]
+  random_bits: Callable[..., jnp.ndarray]
+
+prng_impls: Dict[str, PRNGImpl] = {}
+_prng_impls_by_key_shape: Dict[Tuple[int, ...], PRNGImpl] = {}
+default_prng_impl = "threefry2x32"
+
+def register_prng_impl(impl: PRNGImpl) -> None:
+  """Makes ``impl`` available to :func:`PRNGKey` and all samplers."""
+  other = _prng_impls_by_key_shape.get(impl.key_shape)
+  if other is not None and other.name != impl.name:
+    raise ValueError(f"PRNG implementation {impl.name!r} has the same key shape "
+                     f"{impl.key_shape} as {other.name!r}.")
+  prng_impls[impl.name] = impl
+  _prng_impls_by_key_shape[impl.key_shape] = impl
+
+
 def split(key: jnp.ndarray, num: int = 2) -> jnp.ndarray:
   """Splits a PRNG key into `num` new keys by adding a leading axis.
 
   Args:
-    key: a PRNGKey (an array with shape (2,) and dtype uint32).
+    key: a PRNGKey (an array with shape (2,) and dtype uint32, or a key of
+      another PRNG implementation).
     num: optional, a positive integer indicating the number of keys to produce
       (default 2).
 
   Returns:
-    An array with shape (num, 2) and dtype uint32 representing `num` new keys.
+    An array with shape (num, 2) and dtype uint32 representing `num` new keys
+    (with shape ``(num,) + key.shape`` for other PRNG implementations).
   """
-  return _split(key, int(num))  # type: ignore
+  return _check_prng_key("split", key).split(key, int(num))  # type: ignore
 
 @partial(jit, static_argnums=(1,))
 def _split(key, num) -> jnp.ndarray:
@@ -286,26 +442,35 @@ def fold_in(key, data):
   """Folds in data to a PRNG key to form a new PRNG key.
 
   Args:
-    key: a PRNGKey (an array with shape (2,) and dtype uint32).
+    key: a PRNGKey (an array with shape (2,) and dtype uint32, or a key of
+      another PRNG implementation).
     data: a 32bit integer representing data to be folded in to the key.
 
   Returns:
     A new PRNGKey that is a deterministic function of the inputs and is
     statistically safe for producing a stream of new pseudo-random values.
   """
-  return _fold_in(key, data)
+  return _check_prng_key("fold_in", key).fold_in(key, data)
 
 @jit
 def _fold_in(key, data):
-  return threefry_2x32(key, PRNGKey(data))
+  return threefry_2x32(key, _seed_words(data))
 
 
+def _check_prng_key(name, key) -> PRNGImpl:
+  impl = _key_impl(key)
+  if impl is None:
+    raise TypeError(f"{name} got invalid prng key.")
+  return impl
+
 def _random_bits(key, bit_width, shape):
   """Sample uniform random bits of given width and shape using PRNG key."""
-  if not _is_prng_key(key):
-    raise TypeError("_random_bits got invalid prng key.")
+  impl = _check_prng_key("_random_bits", key)
   if bit_width not in (8, 16, 32, 64):
     raise TypeError("requires 8-, 16-, 32- or 64-bit field width.")
+  return impl.random_bits(key, bit_width, shape)
+
+def _threefry_random_bits(key, bit_width, shape):
   size = prod(shape)
   max_count = int(np.ceil(bit_width * size / 32))
 
@@ -318,7 +483,12 @@ def _random_bits(key, bit_width, shape):
               for k in subkeys]
     last = threefry_2x32(last_key, lax.iota(np.uint32, rem))
     bits = lax.concatenate(blocks + [last], 0)
+  return _bits_from_words(bits, bit_width, shape)
 
+def _bits_from_words(bits, bit_width, shape):
+  """Reinterprets an array of random uint32 words as bits of given width."""
+  size = prod(shape)
+  max_count = bits.shape[0]
   dtype = _UINT_DTYPES[bit_width]
   if bit_width == 64:
     bits = [lax.convert_element_type(x, dtype) for x in jnp.split(bits, 2)]
@@ -339,6 +509,132 @@ def _random_bits(key, bit_width, shape):
     bits = lax.convert_element_type(bits, dtype)[:size]
   return lax.reshape(bits, shape)
 
+register_prng_impl(PRNGImpl(
+    name="threefry2x32", key_shape=(2,), seed=_seed_words, split=_split,
+    fold_in=_fold_in, random_bits=_threefry_random_bits))
+
+
+# Philox keys hold the two key words of the bijection and the two high words of
+# its counters, which index independent streams. Random words are generated
+# from counters whose low word is their index and whose second word is zero;
+# fold_in uses the second word 0xFFFFFFFF, which random bits never reach.
+
+def _philox_words(key, count, second_word=0):
+  ncounters = -(-count // 4)
+  words = philox4x32_p.bind(
+      key[0], key[1], lax.iota(np.uint32, ncounters),
+      lax.full((ncounters,), np.uint32(second_word)), key[2], key[3])
+  words = lax.concatenate([lax.reshape(w, (ncounters, 1)) for w in words], 1)
+  return lax.reshape(words, (4 * ncounters,))[:count]
+
+def _philox_seed(seed):
+  return lax.concatenate([_seed_words(seed), np.zeros(2, np.uint32)], 0)
+
+@partial(jit, static_argnums=(1,))
+def _philox_split(key, num):
+  return lax.reshape(_philox_words(key, 4 * num), (num, 4))
+
+@jit
+def _philox_fold_in(key, data):
+  words = philox4x32_p.bind(key[0], key[1],
+                            lax.convert_element_type(data, np.uint32),
+                            np.uint32(0xFFFFFFFF), key[2], key[3])
+  return lax.concatenate([lax.reshape(w, (1,)) for w in words], 0)
+
+def _philox_random_bits(key, bit_width, shape):
+  max_count = int(np.ceil(bit_width * prod(shape) / 32))
+  return _bits_from_words(_philox_words(key, max_count), bit_width, shape)
+
+register_prng_impl(PRNGImpl(
+    name="philox4x32", key_shape=(4,), seed=_philox_seed, split=_philox_split,
+    fold_in=_philox_fold_in, random_bits=_philox_random_bits))
+
+
+### key streams
+
+
+class KeyStream:
+  """An iterator over new PRNG keys, split from a key in blocks.
+
+  Calling :func:`split` once per key dispatches a computation per key. A
+  ``KeyStream`` instead splits ``block_size`` keys at a time and hands them out
+  one by one with ``next``, or in batches with :meth:`take`:
+
+  >>> keys = random.KeyStream(random.PRNGKey(0))
+  >>> for i in range(num_steps):
+  ...   params = compiled_update(next(keys), params, next(batches))
+
+  Outside of transformations, blocks of keys are transferred to the host once
+  and keys are returned as ``np.ndarray`` slices of them. When the key is a
+  tracer, e.g. inside :func:`jax.jit`, keys are slices of the traced block, and
+  :attr:`key` gives a key to continue from, to be returned from the traced
+  function. As with other Python state, a stream used inside a traced function
+  should not be used after the function returns.
+
+  Args:
+    key: a PRNGKey, of any PRNG implementation.
+    block_size: optional, the number of keys split at a time (default 1024).
+  """
+
+  def __init__(self, key: jnp.ndarray, block_size: int = 1024):
+    _check_prng_key("KeyStream", key)
+    if block_size < 1:
+      raise ValueError(f"KeyStream block_size must be positive, got {block_size}.")
+    self._key = key
+    self._block_size = int(block_size)
+    self._block: Any = None  # np.ndarray, or a tracer inside transformations
+    self._index = 0
+    self._num_keys = 0
+
+  @property
+  def key(self) -> jnp.ndarray:
+    """A new key, independent of all keys handed out, or still to be handed out.
+
+    The stream's own key is split on each access, so the key returned is never
+    split again by the stream, and later accesses return different keys.
+    """
+    self._key, key = split(self._key)
+    return key
+
+  def __iter__(self):
+    return self
+
+  def __next__(self) -> jnp.ndarray:
+    if self._index == self._num_keys:
+      self._refill(self._block_size)
+    self._index += 1
+    return self._block[self._index - 1]
+
+  def take(self, num: int) -> Union[np.ndarray, jnp.ndarray]:
+    """Returns the next ``num`` keys, stacked along a leading axis."""
+    num = int(num)
+    if num <= 0:
+      return np.zeros((0,) + np.shape(self._key), np.uint32)
+    parts = []
+    while num:
+      if self._index == self._num_keys:
+        self._refill(max(num, self._block_size))
+      count = min(num, self._num_keys - self._index)
+      parts.append(self._block[self._index:self._index + count])
+      self._index += count
+      num -= count
+    if len(parts) == 1:
+      return parts[0]
+    if any(isinstance(part, core.Tracer) for part in parts):
+      return jnp.concatenate(parts)
+    return np.concatenate(parts)
+
+  def _refill(self, num):
+    self._key, block = _split_block(self._key, num)
+    if not isinstance(block, core.Tracer):
+      block = np.asarray(block)
+    self._block, self._index, self._num_keys = block, 0, num
+
+@partial(jit, static_argnums=(1,))
+def _split_block(key, num):
+  keys = split(key, num + 1)
+  return keys[0], keys[1:]
+
 
 ### random samplers
 
@@ -539,18 +835,83 @@ def _shuffle(key, x, axis) -> jnp.ndarray:
   # info, and for the original implementation of this algorithm. See also
   # Section 2 of http://people.csail.mit.edu/costis/6896sp11/lec5s.pdf for
   # another analysis (where the keys are generated one bit at a time).
+  # Successive stable sorts order the elements lexicographically by their keys,
+  # the last sort's keys first, so we sort once with all the keys instead.
   exponent = 3  # see tjablin@'s analysis for explanation of this parameter
   uint32max = jnp.iinfo(np.uint32).max
   num_rounds = int(np.ceil(exponent * np.log(x.size) / np.log(uint32max)))
+  if not num_rounds:
+    return x
 
-  for _ in range(num_rounds):
-    key, subkey = split(key)
-    sort_keys = _random_bits(subkey, 32, x.shape)
-    _, x = lax.sort_key_val(sort_keys, x, axis)
-
+  sort_keys = _random_bits(key, 32, (num_rounds,) + x.shape)
+  *_, x = lax.sort([*sort_keys, x], axis, num_keys=num_rounds)
   return x
 
 
+_FEISTEL_ROUNDS = 8
+
+def permutation_index(key: jnp.ndarray, index: jnp.ndarray, n: int) -> jnp.ndarray:
+  """Computes elements of a random permutation of ``range(n)`` one at a time.
+
+  The permutation is never materialized: each element is computed in constant
+  expected time, independently of the others, so that e.g. the indices of a
+  shuffled dataset can be computed per batch. For a fixed key, the function is a
+  bijection from ``range(n)`` to itself. It is computed with a Feistel network
+  keyed by ``key``, and gives a different permutation than
+  :func:`permutation`.
+
+  Args:
+    key: a PRNGKey used as the random key.
+    index: an int or array of ints, the positions in the permutation of the
+      elements to compute. Like out-of-bounds indexing in JAX, positions
+      outside of ``range(n)`` are clamped to it.
+    n: a positive concrete int at most ``2 ** 32``, the size of the permutation.
+
+  Returns:
+    An array with the shape of ``index`` holding the elements of the permutation
+    at positions ``index``, of dtype uint32 if they may not fit in the default
+    int dtype.
+  """
+  n = core.concrete_or_error(int, n, "The n argument of permutation_index")
+  if not 0 < n <= 2 ** 32:
+    raise ValueError(f"permutation_index requires 0 < n <= 2 ** 32, got {n}.")
+  if not jnp.issubdtype(lax.dtype(index), np.integer):
+    raise TypeError("permutation_index requires integer indices.")
+  return _permutation_index(key, index, n)
+
+@partial(jit, static_argnums=(2,))
+def _permutation_index(key, index, n) -> jnp.ndarray:
+  # The Feistel network permutes the 2 * half_bits bit integers. Elements of
+  # the smallest such range containing range(n), which is less than 4 * n in
+  # size, are mapped into range(n) by cycle walking: the permutation is applied
+  # again until the result is less than n.
+  half_bits = max(1, (int(n - 1).bit_length() + 1) // 2)
+  mask = np.uint32((1 << half_bits) - 1)
+  round_keys = _random_bits(key, 32, (_FEISTEL_ROUNDS, 2))
+
+  def encrypt(x):
+    left = lax.shift_right_logical(x, np.uint32(half_bits))
+    right = x & mask
+    for i in range(_FEISTEL_ROUNDS):
+      left, right = right, left ^ (threefry_2x32(round_keys[i], right) & mask)
+    return lax.shift_left(left, np.uint32(half_bits)) | right
+
+  def out_of_range(x):
+    return x > np.uint32(n - 1)
+
+  # Cycle walking only terminates from elements of range(n), whose cycles all
+  # return to range(n), so indices are clamped first.
+  max_index = min(n - 1, int(jnp.iinfo(lax.dtype(index)).max))
+  index = jnp.clip(index, 0, max_index)
+  x = encrypt(lax.convert_element_type(index, np.uint32))
+  x = lax.while_loop(lambda x: jnp.any(out_of_range(x)),
+                     lambda x: jnp.where(out_of_range(x), encrypt(x), x), x)
+  dtype = dtypes.canonicalize_dtype(dtypes.int_)
+  if n - 1 > jnp.iinfo(dtype).max:
+    dtype = np.dtype(np.uint32)
+  return lax.convert_element_type(x, dtype)
+
+
 def choice(key, a, shape=(), replace=True, p=None):
   """Generates a random sample from a given 1-D array.
 
@@ -592,9 +953,8 @@ def choice(key, a, shape=(), replace=True, p=None):
   if p is None:
     if replace:
       ind = randint(key, shape, 0, n_inputs)
-      result = ind if np.ndim(a) == 0 else a[ind]
     else:
-      result = permutation(key, a)[:n_draws]
+      ind = _uniform_indices_without_replacement(key, n_inputs, n_draws)
   else:
     if p.shape != (n_inputs,):
       raise ValueError("p must be None or match the shape of a")
@@ -602,15 +962,49 @@ def choice(key, a, shape=(), replace=True, p=None):
       p_cuml = jnp.cumsum(p)
       r = p_cuml[-1] * (1 - uniform(key, shape))
       ind = jnp.searchsorted(p_cuml, r)
-      result = ind if np.ndim(a) == 0 else a[ind]
     else:
-      # Gumbel top-k trick: https://timvieira.github.io/blog/post/2019/09/16/algorithms-for-sampling-without-replacement/
-      g = -gumbel(key, (n_inputs,)) - jnp.log(p)
-      ind = jnp.argsort(g)[:n_draws]
-      result = ind if np.ndim(a) == 0 else a[ind]
+      ind = _weighted_indices_without_replacement(key, p, n_draws)
+  result = ind if np.ndim(a) == 0 else a[ind]
   return result.reshape(shape)
 
 
+def _uniform_indices_without_replacement(key, n, k):
+  """Samples ``k`` distinct indices into ``range(n)``, in random order."""
+  if k * k <= n:
+    return _floyd_indices(key, n, k)
+  # The top_k of a single 32-bit random key per element would favor low indices
+  # among colliding keys, so use a prefix of a permutation, which sorts on
+  # enough random keys per element to make collisions unlikely.
+  return permutation(key, n)[:k]
+
+@partial(jit, static_argnums=(1, 2))
+def _floyd_indices(key, n, k):
+  # Robert Floyd's algorithm samples a set of k indices from k random integers,
+  # in O(k ** 2) time and O(k) memory independently of n. The order of the
+  # indices in the set is not uniformly random, so they are permuted.
+  dtype = dtypes.canonicalize_dtype(dtypes.int_)
+  key, subkey = split(key)
+  first = n - k
+  candidates = randint(subkey, (k,), 0, lax.iota(dtype, k) + (first + 1), dtype)
+  positions = lax.iota(dtype, k)
+
+  def body(i, indices):
+    candidate = candidates[i]
+    taken = jnp.any((indices == candidate) & (positions < i))
+    index = lax.select(taken, lax.convert_element_type(first + i, dtype),
+                       candidate)
+    return lax.dynamic_update_index_in_dim(indices, index, i, 0)
+
+  indices = lax.fori_loop(0, k, body, jnp.zeros(k, dtype))
+  return permutation(key, indices)
+
+@partial(jit, static_argnums=(2,))
+def _weighted_indices_without_replacement(key, p, k):
+  # Gumbel top-k trick: https://timvieira.github.io/blog/post/2019/09/16/algorithms-for-sampling-without-replacement/
+  _, indices = lax.top_k(gumbel(key, p.shape) + jnp.log(p), k)
+  return lax.convert_element_type(indices, dtypes.canonicalize_dtype(dtypes.int_))
+
+
 def normal(key: jnp.ndarray,
            shape: Sequence[int] = (),
            dtype: np.dtype = dtypes.float_) -> jnp.ndarray:
@@ -999,9 +1393,10 @@ def _gamma_impl(key, a, use_vmap=False):
   a_shape = jnp.shape(a)
   # split key to match the shape of a
   key_ndim = jnp.ndim(key) - 1
-  key = jnp.reshape(key, (-1, 2))
+  key_size = jnp.shape(key)[-1]
+  key = jnp.reshape(key, (-1, key_size))
   key = vmap(split, in_axes=(0, None))(key, prod(a_shape[key_ndim:]))
-  keys = jnp.reshape(key, (-1, 2))
+  keys = jnp.reshape(key, (-1, key_size))
   alphas = jnp.reshape(a, -1)
   if use_vmap:
     samples = vmap(_gamma_one)(keys, alphas)
@@ -1233,6 +1628,86 @@ def categorical(key, logits, axis=-1, shape=None):
   return jnp.argmax(gumbel(key, sample_shape + logits.shape, logits.dtype) + logits, axis=axis)
 
 
+class CategoricalTable(NamedTuple):
+  """A table for sampling from categorical distributions, see :func:`categorical_table`.
+
+  Attributes:
+    cdf: an array whose last axis holds the unnormalized cumulative
+      probabilities of the classes of each distribution.
+  """
+  cdf: jnp.ndarray
+
+
+def categorical_table(logits, axis=-1) -> CategoricalTable:
+  """Precomputes a table for drawing many samples from categorical distributions.
+
+  :func:`categorical` adds Gumbel noise to all logits for each sample, which
+  takes time and memory proportional to the number of samples times the number
+  of classes. Sampling from the table with :func:`categorical_from_table` only
+  takes time proportional to the number of samples times the logarithm of the
+  number of classes. The table can be reused for any number of samples.
+
+  The table holds cumulative probabilities in the dtype of ``logits``, so that
+  classes whose probability is small compared to the resolution of that dtype
+  near 1 (about 6e-8 for float32) are not sampled with their exact probability.
+
+  Args:
+    logits: Unnormalized log probabilities of the categorical distribution(s),
+      as in :func:`categorical`.
+    axis: Axis along which logits belong to the same categorical distribution.
+
+  Returns:
+    A ``CategoricalTable`` of the distributions, with batch shape
+    ``np.delete(logits.shape, axis)``.
+  """
+  return _categorical_table(logits, axis)
+
+@partial(jit, static_argnums=(1,))
+def _categorical_table(logits, axis) -> CategoricalTable:
+  logits = jnp.moveaxis(logits, axis, -1)
+  probs = jnp.exp(logits - logits.max(-1, keepdims=True))
+  return CategoricalTable(jnp.cumsum(probs, -1))
+
+
+def categorical_from_table(key, table: CategoricalTable, shape=None):
+  """Sample random values from categorical distributions given by a table.
+
+  The samples have the same distribution as those of :func:`categorical` with
+  the logits the table was computed from, but are different values.
+
+  Args:
+    key: a PRNGKey used as the random key.
+    table: a ``CategoricalTable`` computed by :func:`categorical_table`.
+    shape: Optional, a tuple of nonnegative integers representing the result
+      shape. Must be broadcast-compatible with the batch shape of the table,
+      ``table.cdf.shape[:-1]``, which is the default.
+
+  Returns:
+    A random array with int dtype and shape given by ``shape`` if ``shape``
+    is not None, or else the batch shape of the table.
+  """
+  batch_shape = tuple(table.cdf.shape[:-1])
+  if shape is None:
+    shape = batch_shape
+  else:
+    shape = abstract_arrays.canonicalize_shape(shape)
+    _check_shape("categorical_from_table", shape, batch_shape)
+  return _categorical_from_table(key, table.cdf, shape)
+
+@partial(jit, static_argnums=(2,))
+def _categorical_from_table(key, cdf, shape):
+  num_classes = cdf.shape[-1]
+  num_samples = prod(shape[:len(shape) - cdf.ndim + 1])
+  batch_shape = shape[len(shape) - cdf.ndim + 1:]
+  cdf = jnp.reshape(jnp.broadcast_to(cdf, batch_shape + (num_classes,)),
+                    (-1, num_classes))
+  # Like choice with p, sample r in (0, total] so that the first class whose
+  # cumulative probability is at least r has a nonzero probability.
+  r = cdf[:, -1] * (1 - uniform(key, (num_samples, len(cdf)), cdf.dtype))
+  ind = vmap(jnp.searchsorted, in_axes=(0, 1), out_axes=1)(cdf, r)
+  return jnp.reshape(ind, shape)
+
+
 def laplace(key, shape=(), dtype=dtypes.float_):
   """Sample Laplace random values with given shape and float dtype.
 
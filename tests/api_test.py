@@ -19,6 +19,7 @@ import copy
 from functools import partial
 import re
 import unittest
+from unittest import mock
 import types
 import warnings
 import weakref
@@ -33,7 +34,7 @@ import concurrent.futures
 import jax
 import jax.numpy as jnp
 from jax import float0, jit, grad, device_put, jacfwd, jacrev, hessian
-from jax import api, core, lax, lax_reference
+from jax import api, core, lax, lax_reference, lazy
 from jax.core import Primitive
 from jax.interpreters import ad
 from jax.interpreters import xla
@@ -659,6 +660,39 @@ class APITest(jtu.JaxTestCase):
     self.assertAllClose(y2, jnp.vstack([b for _, b in x]))
     self.assertTrue(all(b.device() == d for b, d in zip(y2.device_buffers, devices)))
 
+  def test_prefetch_to_devices(self):
+    n = api.device_count()
+    batches = [{'x': np.arange(i, i + 4 * n).reshape(n, 4), 'y': np.ones(n) * i}
+               for i in range(5)]
+    consumed = []
+    def iterator():
+      for i, batch in enumerate(batches):
+        consumed.append(i)
+        yield batch
+    f = api.pmap(lambda b: b['x'].sum() + b['y'])
+    prefetched = api.prefetch_to_devices(iterator(), size=2)
+    self.assertEqual(consumed, [])
+    first = next(prefetched)
+    self.assertEqual(consumed, [0, 1, 2])
+    outs = [f(first)] + [f(batch) for batch in prefetched]
+    self.assertEqual(consumed, list(range(5)))
+    for out, batch in zip(outs, batches):
+      self.assertAllClose(out, batch['x'].sum(1) + batch['y'],
+                          check_dtypes=False)
+    # The batches are laid out like pmap's own outputs.
+    expected = api.pmap(lambda x: x)(batches[0]['x'])
+    self.assertEqual(first['x'].indices, expected.indices)
+    self.assertEqual([b.device() for b in first['x'].device_buffers],
+                     [b.device() for b in expected.device_buffers])
+
+  def test_prefetch_to_devices_errors(self):
+    self.assertRaisesRegex(ValueError, "size must be positive",
+                           lambda: api.prefetch_to_devices([], size=0))
+    n = api.device_count()
+    prefetched = api.prefetch_to_devices([np.ones(n + 1)])
+    self.assertRaisesRegex(ValueError, "leading axis size",
+                           lambda: next(prefetched))
+
   @jtu.skip_on_devices("tpu")
   def test_jacobian(self):
     R = np.random.RandomState(0).randn
@@ -1449,6 +1483,17 @@ class APITest(jtu.JaxTestCase):
   def test_xla_computation_donate_argnums(self):
     api.xla_computation(lambda x: None, donate_argnums=(0,))(3)  # doesn't crash
 
+  def test_xla_computation_hoist_constants(self):
+    big = np.arange(1000, dtype=np.float32)
+    small = np.ones(1000, dtype=np.float32)[:2]
+    f = lambda x: (x + big, x[:2] * small)
+    c, consts = api.xla_computation(f, hoist_constants_min_bytes=1024)(big)
+    self.assertLen(consts, 1)
+    self.assertIs(consts[0], big)
+    self.assertLen(c.program_shape().parameter_shapes(), 2)
+    c = api.xla_computation(f, hoist_constants_min_bytes=None)(big)
+    self.assertLen(c.program_shape().parameter_shapes(), 1)
+
   def test_concurrent_device_get_and_put(self):
     def f(x):
       for _ in range(100):
@@ -1955,6 +2000,213 @@ class APITest(jtu.JaxTestCase):
       xla.device_put = orig_device_put
     self.assertEqual(count, 0)
 
+  def test_jit_lower_compile(self):
+    f = api.jit(lambda x, y: jnp.dot(x, y) + 1.)
+    spec = api.ShapeDtypeStruct((3, 3), jnp.float32)
+    lowered = f.lower(spec, spec)
+    self.assertIn("dot", lowered.as_hlo_text())
+    self.assertLen(lowered.jaxpr.in_avals, 2)
+    compiled = lowered.compile()
+    x = np.arange(9, dtype=np.float32).reshape((3, 3))
+    self.assertAllClose(compiled(x, x), f(x, x))
+
+  def test_jit_lower_does_not_execute(self):
+    side = []
+    def f(x):
+      side.append(None)
+      return x * 2
+    api.jit(f).lower(api.ShapeDtypeStruct((2,), jnp.float32))
+    self.assertLen(side, 1)  # traced once, never run
+
+  def test_jit_lower_static_argnums(self):
+    f = api.jit(lambda x, n: x ** n, static_argnums=1)
+    compiled = f.lower(api.ShapeDtypeStruct((), jnp.float32), 3).compile()
+    self.assertAllClose(compiled(np.float32(2.)), np.float32(8.))
+
+  def test_jit_lower_pytree_args(self):
+    f = api.jit(lambda d: {"out": d["a"] + d["b"]})
+    spec = api.ShapeDtypeStruct((2,), jnp.float32)
+    compiled = f.lower({"a": spec, "b": spec}).compile()
+    out = compiled({"a": np.ones(2, np.float32), "b": np.ones(2, np.float32)})
+    self.assertAllClose(out["out"], 2 * np.ones(2, np.float32))
+
+  def test_compiled_rejects_mismatched_args(self):
+    f = api.jit(lambda x: x + 1.)
+    compiled = f.lower(api.ShapeDtypeStruct((2,), jnp.float32)).compile()
+    self.assertRaisesRegex(
+        TypeError, "compiled for argument 0 of type f32\\[2\\]",
+        lambda: compiled(np.ones(3, np.float32)))
+    self.assertRaisesRegex(
+        TypeError, "compiled for arguments with structure",
+        lambda: compiled(np.ones(2, np.float32), np.ones(2, np.float32)))
+
+  def test_jit_lower_trivial_computation(self):
+    f = api.jit(lambda x: x)
+    compiled = f.lower(api.ShapeDtypeStruct((2,), jnp.float32)).compile()
+    self.assertAllClose(compiled(np.ones(2, np.float32)),
+                        np.ones(2, np.float32))
+
+  def test_precompile_populates_jit_cache(self):
+    def f(x, y):
+      return jnp.sin(x) * y
+    f_jit = api.jit(f)
+    shapes = [(2,), (3,), (4, 5)]
+    api.precompile([(f_jit, (api.ShapeDtypeStruct(s, jnp.float32),
+                             api.ShapeDtypeStruct(s, jnp.float32)))
+                    for s in shapes], max_workers=2)
+    self.assertEqual(api.cache_info(f).misses, len(shapes))
+    for s in shapes:
+      x = np.ones(s, np.float32)
+      self.assertAllClose(f_jit(x, x), f(x, x))
+    info = api.cache_info(f)
+    self.assertEqual(info.misses, len(shapes))
+    self.assertEqual(info.hits, len(shapes))
+
+  def test_precompile_static_args_and_kwargs(self):
+    def f(x, n, *, scale):
+      return x ** n * scale
+    f_jit = api.jit(f, static_argnums=1)
+    spec = api.ShapeDtypeStruct((3,), jnp.float32)
+    futures = api.precompile([(f_jit, (spec, 2), {"scale": spec})],
+                             block=False)
+    for future in futures:
+      self.assertIsNone(future.result())
+    x = np.arange(3, dtype=np.float32)
+    self.assertAllClose(f_jit(x, 2, scale=x), x ** 3)
+    self.assertEqual(api.cache_info(f).misses, 1)
+
+  def test_precompile_reraises_errors(self):
+    f_jit = api.jit(lambda x: jnp.dot(x, x))
+    bad = api.ShapeDtypeStruct((2, 3), jnp.float32)
+    self.assertRaises(TypeError, lambda: api.precompile([(f_jit, (bad,))]))
+    self.assertRaisesRegex(TypeError, "returned by jax.jit",
+                           lambda: api.precompile([(lambda x: x, (bad,))]))
+
+  def test_cache_info_counts_hits_and_misses(self):
+    def f(x):
+      return x + 1
+
+    self.assertEqual(api.cache_info(f), (0, 0, 0, 0))
+    api.jit(f)(1.)
+    api.jit(f)(2.)
+    api.jit(f)(np.ones(3))
+    info = api.cache_info(f)
+    self.assertEqual(info.hits, 1)
+    self.assertEqual(info.misses, 2)
+    self.assertEqual(info.num_entries, 2)
+
+  def test_clear_caches_for_one_function(self):
+    def f(x):
+      return x + 1
+    def g(x):
+      return x * 2
+
+    api.jit(f)(1.)
+    api.jit(g)(1.)
+    api.clear_caches(f)
+    self.assertEqual(api.cache_info(f).num_entries, 0)
+    self.assertEqual(api.cache_info(g).num_entries, 1)
+    with jtu.count_jit_and_pmap_compiles() as count:
+      api.jit(f)(1.)
+      api.jit(g)(1.)
+    self.assertEqual(count[0], 1)
+
+  def test_compilation_cache_max_entries(self):
+    def f(x):
+      return x + 1
+
+    prev = FLAGS.jax_compilation_cache_max_entries
+    config.update("jax_compilation_cache_max_entries", 2)
+    try:
+      for n in range(1, 5):
+        api.jit(f)(np.ones(n))
+      self.assertEqual(api.cache_info(f).num_entries, 2)
+      with jtu.count_jit_and_pmap_compiles() as count:
+        api.jit(f)(np.ones(4))  # most recently used, still cached
+        api.jit(f)(np.ones(1))  # least recently used, evicted
+      self.assertEqual(count[0], 1)
+    finally:
+      config.update("jax_compilation_cache_max_entries", prev)
+
+  def test_cache_entries_dropped_with_function(self):
+    def f(x):
+      return x + 1
+
+    api.jit(f)(1.)
+    num_entries = api.cache_info().num_entries
+    del f
+    self.assertEqual(api.cache_info().num_entries, num_entries - 1)
+
+  def test_primitive_cache_clear_and_evict(self):
+    x = np.arange(3, dtype=np.float32)
+    api.clear_caches(lax.sin_p)
+    lax.sin(x)
+    hits = api.cache_info(lax.sin_p).hits
+    lax.sin(x)
+    lax.sin(x)
+    self.assertEqual(api.cache_info(lax.sin_p).hits, hits + 2)
+    self.assertEqual(api.cache_info(lax.sin_p).num_entries, 1)
+    api.clear_caches(lax.sin_p)
+    self.assertEqual(api.cache_info(lax.sin_p).num_entries, 0)
+    misses = api.cache_info(lax.sin_p).misses
+    self.assertAllClose(lax.sin(x), np.sin(x))
+    self.assertEqual(api.cache_info(lax.sin_p).misses, misses + 1)
+    self.assertEqual(api.cache_info(lax.sin_p).num_entries, 1)
+
+  def test_bounded_cache_counts_nested_calls(self):
+    def inner(x):
+      return x
+    def outer(x):
+      return memoized(inner, x) + 1
+    memoized = lu.bounded_cache(lambda owner, x: owner(x))
+
+    for _ in range(3):
+      self.assertEqual(memoized(outer, 1), 2)
+    self.assertEqual(memoized.cache_info(outer)[:3], (2, 1, 1))
+    self.assertEqual(memoized.cache_info(inner)[:3], (0, 1, 1))
+    memoized(inner, 1)
+    self.assertEqual(memoized.cache_info(inner)[:3], (1, 1, 1))
+    self.assertEqual(memoized.cache_info()[:3], (3, 2, 2))
+
+  def test_bounded_cache_on_evict_only_when_evicting(self):
+    def f():
+      pass
+    evictions = []
+    cache = lu.BoundedCache(on_evict=lambda: evictions.append(None))
+
+    prev = FLAGS.jax_compilation_cache_max_entries
+    config.update("jax_compilation_cache_max_entries", 2)
+    try:
+      cache.put(f, 1, "a")
+      cache.put(f, 1, "b")  # replaces the entry, evicts nothing
+      cache.put(f, 2, "c")
+      self.assertEmpty(evictions)
+      cache.put(f, 3, "d")
+      self.assertLen(evictions, 1)
+      self.assertIsNone(cache.get(f, 1))
+      cache.evict(f)
+      self.assertLen(evictions, 2)
+      cache.evict(f)  # nothing left to evict
+      self.assertLen(evictions, 2)
+    finally:
+      config.update("jax_compilation_cache_max_entries", prev)
+
+  def test_jit_hoist_constants(self):
+    big = np.arange(1000, dtype=np.float32)
+    def f(x, y):
+      return x + big, y * big[:3]
+
+    x, y = np.ones(1000, np.float32), np.ones(3, np.float32)
+    prev = FLAGS.jax_hoist_constants_min_bytes
+    config.update("jax_hoist_constants_min_bytes", 1024)
+    try:
+      lowered = api.jit(f).lower(x, y)
+      self.assertLen(lowered.hlo().program_shape().parameter_shapes(), 3)
+      self.assertAllClose(api.jit(f)(x, y), f(x, y))
+      self.assertAllClose(api.jit(f)(x + 1, y), f(x + 1, y))
+    finally:
+      config.update("jax_hoist_constants_min_bytes", prev)
+
 
 class RematTest(jtu.JaxTestCase):
 
@@ -1993,6 +2245,113 @@ class RematTest(jtu.JaxTestCase):
     self.assertEqual(len(sin_calls), 1)
     self.assertEqual(len(cos_calls), 2)
 
+  def _count_impl_calls(self, fun, *args, prims=(lax.sin_p, lax.cos_p)):
+    calls = {prim.name: 0 for prim in prims}
+    impls = [prim.impl for prim in prims]
+    def counting(prim, impl):
+      def impl_(*args, **params):
+        calls[prim.name] += 1
+        return impl(*args, **params)
+      return impl_
+    try:
+      for prim, impl in zip(prims, impls):
+        prim.def_impl(counting(prim, impl))
+      fun(*args)
+    finally:
+      for prim, impl in zip(prims, impls):
+        prim.def_impl(impl)
+    return calls
+
+  def test_remat_policy_everything_saveable(self):
+    g = api.remat(lambda x: lax.sin(lax.sin(x)),
+                  policy=jax.checkpoint_policies.everything_saveable)
+    ans, f_lin = api.linearize(g, 2.)
+    self.assertAllClose(ans, np.sin(np.sin(2.)), check_dtypes=False)
+    self.assertAllClose(f_lin(3.), np.cos(np.sin(2.)) * np.cos(2.) * 3.,
+                        check_dtypes=False)
+    self.assertEqual(self._count_impl_calls(f_lin, 3.), {'sin': 0, 'cos': 0})
+
+  def test_remat_policy_dots_saveable(self):
+    W = np.arange(9, dtype=np.float32).reshape(3, 3) / 10
+    x = np.ones(3, np.float32)
+    prims = (lax.dot_general_p, lax.cos_p)
+    def f(x):
+      return lax.reduce(lax.sin(lax.dot(W, x)), np.float32(0), lax.add, (0,))
+    expected = api.grad(f)(x)
+
+    g = api.remat(f)
+    _, f_lin = api.linearize(g, x)
+    self.assertEqual(self._count_impl_calls(f_lin, x, prims=prims),
+                     {'dot_general': 2, 'cos': 1})
+
+    g = api.remat(f, policy=jax.checkpoint_policies.dots_saveable)
+    _, f_lin = api.linearize(g, x)
+    self.assertEqual(self._count_impl_calls(f_lin, x, prims=prims),
+                     {'dot_general': 1, 'cos': 1})
+    self.assertAllClose(api.grad(g)(x), expected)
+    # The saved dot is computed once on the forward pass, along with the output.
+    self.assertEqual(
+        self._count_impl_calls(lambda x: api.linearize(g, x), x,
+                               prims=(lax.dot_general_p,)),
+        {'dot_general': 1})
+
+  def test_remat_policy_elementwise(self):
+    f = lambda x: jnp.sin(lax.cumsum(jnp.sin(x), 0))
+    g = api.remat(
+        f, policy=jax.checkpoint_policies.everything_except_elementwise_saveable)
+    x = np.arange(3, dtype=np.float32)
+    _, f_lin = api.linearize(g, x)
+    prims = (lax.sin_p, lax.cos_p, lax.cumsum_p)
+    # The saved cumsum makes recomputing the inner sin unnecessary; the cumsum
+    # left is that of the tangents.
+    self.assertEqual(self._count_impl_calls(f_lin, x, prims=prims),
+                     {'sin': 0, 'cos': 2, 'cumsum': 1})
+    self.assertAllClose(api.grad(lambda x: g(x).sum())(x),
+                        api.grad(lambda x: f(x).sum())(x))
+
+  def test_remat_policy_names(self):
+    from jax.checkpoint_policies import checkpoint_name, save_only_these_names
+    def f(x):
+      y = checkpoint_name(lax.sin(x), "y")
+      return lax.sin(y)
+    g = api.remat(f, policy=save_only_these_names("y"))
+    ans, f_lin = api.linearize(g, 2.)
+    self.assertAllClose(ans, np.sin(np.sin(2.)), check_dtypes=False)
+    self.assertAllClose(f_lin(3.), np.cos(np.sin(2.)) * np.cos(2.) * 3.,
+                        check_dtypes=False)
+    self.assertEqual(self._count_impl_calls(f_lin, 3.), {'sin': 0, 'cos': 2})
+    g = api.remat(f, policy=save_only_these_names("z"))
+    _, f_lin = api.linearize(g, 2.)
+    self.assertEqual(self._count_impl_calls(f_lin, 3.), {'sin': 1, 'cos': 2})
+
+  def test_remat_memory_budget(self):
+    W = np.arange(9, dtype=np.float32).reshape(3, 3) / 10
+    x = np.ones(3, np.float32)
+    prims = (lax.dot_general_p, lax.cos_p)
+    f = lambda x: lax.sin(lax.dot(W, x))
+    # Each candidate residual is 12 bytes; the dot is more expensive to
+    # recompute per byte than the cosine, so it is saved first, but it is no
+    # longer read, nor charged, once the cosine of its output is saved.
+    for budget, expected in [(0, {'dot_general': 2, 'cos': 1}),
+                             (12, {'dot_general': 1, 'cos': 0}),
+                             (24, {'dot_general': 1, 'cos': 0})]:
+      _, f_lin = api.linearize(api.remat(f, memory_budget=budget), x)
+      self.assertEqual(self._count_impl_calls(f_lin, x, prims=prims), expected)
+      self.assertAllClose(f_lin(x), np.cos(W.dot(x)) * W.dot(x))
+
+  def test_remat_memory_budget_charges_only_read_values(self):
+    W = np.arange(9, dtype=np.float32).reshape(3, 3) / 10
+    x = np.ones(3, np.float32)
+    prims = (lax.dot_general_p, lax.cos_p)
+    f = lambda x: lax.sin(lax.dot(W, x)) + lax.sin(x)
+    # The candidates are the dot, both sines, both cosines and the sum, 12 bytes
+    # each. Once cos(dot(W, x)) is saved the dot is not read, and the sines and
+    # the sum are never read by the tangent, so both cosines fit in the budget.
+    _, f_lin = api.linearize(api.remat(f, memory_budget=24), x)
+    self.assertEqual(self._count_impl_calls(f_lin, x, prims=prims),
+                     {'dot_general': 1, 'cos': 0})
+    self.assertAllClose(f_lin(x), np.cos(W.dot(x)) * W.dot(x) + np.cos(x) * x)
+
   def test_remat_freevars(self):
     def f1(x):
       y = 2 * jnp.sin(x)
@@ -2505,7 +2864,8 @@ class LazyTest(jtu.JaxTestCase):
       return np_x, jax_x
 
     def random_op(rng, shape):
-      kind = rng.choice(['transpose', 'broadcast', 'reshape'])
+      kind = rng.choice(['transpose', 'broadcast', 'reshape', 'slice', 'rev',
+                         'convert'])
       if kind == 'transpose':
         perm = tuple(rng.permutation(len(shape)))
         return Op(partial(np.transpose, axes=perm),
@@ -2531,6 +2891,21 @@ class LazyTest(jtu.JaxTestCase):
         new_shape = tuple(new_shape)
         return Op(partial(np.reshape, newshape=new_shape),
                   partial(lax.reshape, new_sizes=new_shape))
+      elif kind == 'slice':
+        start = tuple(rng.randint(d + 1) for d in shape)
+        limit = tuple(rng.randint(lo, d + 1) for lo, d in zip(start, shape))
+        strides = tuple(rng.randint(1, 3) for _ in shape)
+        return Op(lambda x: x[tuple(map(slice, start, limit, strides))],
+                  partial(lax.slice, start_indices=start, limit_indices=limit,
+                          strides=strides))
+      elif kind == 'rev':
+        dims = tuple(sorted(rng.permutation(len(shape))[:rng.randint(len(shape) + 1)]))
+        return Op(partial(np.flip, axis=dims),
+                  partial(lax.rev, dimensions=dims))
+      elif kind == 'convert':
+        dtype = [np.float32, np.int32][rng.choice(2)]
+        return Op(lambda x: np.asarray(x, dtype),
+                  partial(lax.convert_element_type, new_dtype=dtype))
       else:
         assert False
     Op = collections.namedtuple('Op', ['np_fn', 'jax_fn'])
@@ -2580,6 +2955,45 @@ class LazyTest(jtu.JaxTestCase):
     jit_result = apply_ops_closure()
     self.assertAllClose(jit_result, np_x, check_dtypes=False)
 
+  def test_lazy_slice_reshape_convert_rev(self):
+    np_x = np.arange(24, dtype=np.float32).reshape(4, 6)
+    x = api.device_put(np_x)
+    y = lax.slice(x, (1, 0), (4, 6))
+    y = lax.reshape(y, (18,))
+    y = lax.convert_element_type(y, np.int32)
+    y = lax.rev(y, (0,))
+    self.assertIs(y.device_buffer, x.device_buffer)  # nothing was dispatched
+    self.assertFalse(lazy.is_trivial(y._lazy_expr))
+    expected = np.asarray(np_x[1:4].reshape(18), np.int32)[::-1]
+    self.assertAllClose(xla._force(y), expected)
+    self.assertAllClose(api.jit(lambda z: z + 1)(y), expected + 1)
+    self.assertAllClose(y, expected)
+
+  def test_lazy_force_is_memoized(self):
+    x = api.device_put(np.arange(6, dtype=np.float32))
+    y = lax.rev(x, (0,))
+    self.assertIs(xla._force(y), y)
+    self.assertTrue(lazy.is_trivial(y._lazy_expr))
+    self.assertIsNot(y.device_buffer, x.device_buffer)
+    forced_buffer = y.device_buffer
+    self.assertIs(xla._force(y).device_buffer, forced_buffer)
+    self.assertIs(xla.device_put(y)[0], forced_buffer)
+    self.assertAllClose(y, np.arange(6, dtype=np.float32)[::-1])
+
+  def test_small_slice_is_not_lazy(self):
+    np_x = np.arange(100, dtype=np.float32)
+    x = api.device_put(np_x)
+    y = lax.slice(x, (0,), (2,))
+    self.assertTrue(lazy.is_trivial(y._lazy_expr))
+    self.assertIsNot(y.device_buffer, x.device_buffer)
+    self.assertAllClose(y, np_x[:2])
+
+  def test_lazy_reshape_of_transpose_is_not_lazy(self):
+    x = api.device_put(np.arange(6, dtype=np.float32).reshape(2, 3))
+    y = lax.reshape(lax.transpose(x, (1, 0)), (6,))
+    self.assertTrue(lazy.is_trivial(y._lazy_expr))
+    self.assertAllClose(y, np.arange(6, dtype=np.float32).reshape(2, 3).T.ravel())
+
   def test_constant_forcing_computations_cached(self):
     # from https://github.com/google/jax/issues/1909
     xla._lazy_force_computation.cache_clear()  # clear force compile cache
@@ -3835,6 +4249,82 @@ class DeprecatedCustomTransformsTest(jtu.JaxTestCase):
 
 class BufferDonationTest(jtu.JaxTestCase):
 
+  # === jit(..., donate_argnums="auto") ===
+
+  @jtu.skip_on_devices("cpu")  # In/out aliasing not supported on CPU.
+  def test_jit_auto_donation_donates_temporaries(self):
+    move = jit(lambda x, y: (x + x - x, y.sum()), donate_argnums="auto")
+    _ = jnp.ones([3]) * 2, jnp.ones([2]) * 2  # compiles the op-by-op ops
+    with warnings.catch_warnings(), \
+         jtu.count_jit_and_pmap_compiles() as count:
+      warnings.simplefilter("error")
+      for _ in range(2):
+        y, _ = move(jnp.ones([3]) * 2, jnp.ones([2]) * 2)
+        np.testing.assert_allclose(y, [2.] * 3)
+        report = move.donation_report()
+        self.assertEqual(report.arguments, ("args[0]",))
+        self.assertEqual(report.avals, (api.ShapedArray((3,), jnp.float32),))
+        self.assertEqual(report.nbytes, 12)
+    self.assertEqual(count[0], 1)  # the first call already donates
+
+  @jtu.skip_on_devices("cpu")  # In/out aliasing not supported on CPU.
+  def test_jit_auto_donation_pytrees(self):
+    step = jit(lambda params: tree_util.tree_map(lambda p: p * 2, params),
+               donate_argnums="auto")
+    step({"w": jnp.ones([2, 2]) * 1, "b": [jnp.ones([2]) * 1]})
+    self.assertEqual(step.donation_report().arguments,
+                     ("args[0] (leaf 0)", "args[0] (leaf 1)"))
+
+  @jtu.skip_on_devices("cpu")  # In/out aliasing not supported on CPU.
+  def test_jit_auto_donation_keeps_referenced_arguments(self):
+    move = jit(lambda x: x + x - x, donate_argnums="auto")
+    x = jnp.ones([3, 3]) * 2
+    params = [jnp.ones([3, 3]) * 2]
+    for _ in range(2):
+      move(x)
+      self.assertEqual(move.donation_report(), api.DonationReport())
+      move(params[0])
+      self.assertEqual(move.donation_report(), api.DonationReport())
+      move(x.T)  # a lazy view sharing x's buffer
+      self.assertEqual(move.donation_report(), api.DonationReport())
+    self.assertNotDeleted(x)
+    self.assertNotDeleted(params[0])
+
+  def test_jit_auto_donation_selection(self):
+    # Pretends the backend supports donation, so that the choice of arguments
+    # to donate can be checked on every platform. Buffers are not checked for
+    # deletion, because the CPU backend ignores the donations.
+    move = jit(lambda x, y: (x + x - x, y.sum()), donate_argnums="auto")
+    x = jnp.ones([3]) * 2
+    cache = weakref.WeakValueDictionary()
+    with mock.patch.object(api._AutoDonation, "_supports_donation",
+                           return_value=True), \
+         warnings.catch_warnings():
+      warnings.simplefilter("ignore")
+      move(jnp.ones([3]) * 2, jnp.ones([2]) * 2)
+      report = move.donation_report()
+      self.assertEqual(report.arguments, ("args[0]",))
+      self.assertEqual(report.avals, (api.ShapedArray((3,), jnp.float32),))
+      self.assertEqual(report.nbytes, 12)
+      move(x, jnp.ones([2]) * 2)
+      self.assertEqual(move.donation_report(), api.DonationReport())
+      move(cache.setdefault("x", jnp.ones([3]) * 2), jnp.ones([2]) * 2)
+      self.assertEqual(move.donation_report(), api.DonationReport())
+
+  def test_jit_auto_donation_precompile(self):
+    move = jit(lambda x: x + x - x, donate_argnums="auto")
+    spec = api.ShapeDtypeStruct((3,), jnp.float32)
+    with mock.patch.object(api._AutoDonation, "_supports_donation",
+                           return_value=True), \
+         warnings.catch_warnings():
+      warnings.simplefilter("ignore")
+      api.precompile([(move, (spec,))])
+      _ = jnp.ones([3], jnp.float32) * 2  # compiles the op-by-op ops
+      with jtu.count_jit_and_pmap_compiles() as count:
+        move(jnp.ones([3], jnp.float32) * 2)
+      self.assertEqual(count[0], 0)
+      self.assertEqual(move.donation_report().arguments, ("args[0]",))
+
   # === pmap ===
 
   @jtu.skip_on_devices("cpu")  # In/out aliasing not supported on CPU.
@@ -3846,6 +4336,21 @@ class BufferDonationTest(jtu.JaxTestCase):
     self.assertDeleted(x)
     np.testing.assert_allclose(y, [1.] * n)
 
+  def test_pmap_donate_argnums_warning_raised(self):
+    n = jax.local_device_count()
+    f = api.pmap(lambda x, y: x.sum() + y.sum(), donate_argnums=(0, 1))
+    x = jnp.ones([n, 2], jnp.float32)
+    y = jnp.ones([n, 2], jnp.int32)
+    with warnings.catch_warnings(record=True) as w:
+      warnings.simplefilter("always")
+      f(x, y)
+
+      self.assertLen(w, 1)
+      self.assertTrue(issubclass(w[-1].category, UserWarning))
+      self.assertIn(
+          "Some donated buffers were not usable: f32[2]{0}, s32[2]{0}",
+          str(w[-1].message))
+
   def test_pmap_nested_donate_ignored(self):
     pmap_fun = jit(lambda x: api.pmap(lambda y: y ** 2, donate_argnums=0)(x))
     a = api.pmap(lambda x: x)(jnp.array([1]))
@@ -0,0 +1,143 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import time
+from unittest import SkipTest, mock
+
+from absl.testing import absltest
+import numpy as np
+
+from jax import api
+from jax import compilation_cache as cc
+from jax import test_util as jtu
+from jax.lib import xla_bridge as xb
+
+from jax.config import config
+config.parse_flags_with_absl()
+
+
+class FileSystemCacheTest(jtu.JaxTestCase):
+
+  def test_get_nonexistent_key(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = cc.FileSystemCache(tmpdir)
+      self.assertIsNone(cache.get("foo"))
+
+  def test_put_and_get(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = cc.FileSystemCache(tmpdir)
+      cache.put("foo", b"bar")
+      self.assertEqual(cache.get("foo"), b"bar")
+      cache.put("foo", b"baz")
+      self.assertEqual(cache.get("foo"), b"baz")
+
+  def test_empty_key_raises(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = cc.FileSystemCache(tmpdir)
+      self.assertRaisesRegex(ValueError, "key cannot be empty",
+                             lambda: cache.put("", b"bar"))
+      self.assertRaisesRegex(ValueError, "key cannot be empty",
+                             lambda: cache.get(""))
+
+  def test_evicts_least_recently_used(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = cc.FileSystemCache(tmpdir, max_size_bytes=8)
+      cache.put("a", b"1234")
+      os.utime(os.path.join(tmpdir, "a"), (time.time() - 20,) * 2)
+      cache.put("b", b"5678")
+      os.utime(os.path.join(tmpdir, "b"), (time.time() - 10,) * 2)
+      self.assertEqual(cache.get("a"), b"1234")  # refreshes "a"
+      cache.put("c", b"9012")
+      self.assertEqual(cache.get("a"), b"1234")
+      self.assertIsNone(cache.get("b"))
+      self.assertEqual(cache.get("c"), b"9012")
+
+  def test_entry_larger_than_cache_not_stored(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = cc.FileSystemCache(tmpdir, max_size_bytes=2)
+      cache.put("a", b"1234")
+      self.assertIsNone(cache.get("a"))
+
+
+class CompilationCacheTest(jtu.JaxTestCase):
+
+  def tearDown(self):
+    cc.reset_cache()
+    super().tearDown()
+
+  def _computation(self, fun, *args):
+    return api.xla_computation(fun)(*args)
+
+  def test_cache_key_deterministic(self):
+    c = self._computation(lambda x: x + 1, np.float32(1.))
+    options = xb.get_compile_options(1, 1)
+    backend = xb.get_backend()
+    self.assertEqual(cc.get_cache_key(c, options, backend),
+                     cc.get_cache_key(c, options, backend))
+
+  def test_cache_key_depends_on_computation(self):
+    c1 = self._computation(lambda x: x + 1, np.float32(1.))
+    c2 = self._computation(lambda x: x * 2, np.float32(1.))
+    options = xb.get_compile_options(1, 1)
+    backend = xb.get_backend()
+    self.assertNotEqual(cc.get_cache_key(c1, options, backend),
+                        cc.get_cache_key(c2, options, backend))
+
+  def test_cache_key_depends_on_compile_options(self):
+    c = self._computation(lambda x: x + 1, np.float32(1.))
+    options1 = xb.get_compile_options(1, 1)
+    options2 = xb.get_compile_options(1, 1)
+    options2.parameter_is_tupled_arguments = True
+    backend = xb.get_backend()
+    self.assertNotEqual(cc.get_cache_key(c, options1, backend),
+                        cc.get_cache_key(c, options2, backend))
+
+  def test_initialize_twice_with_different_path_raises(self):
+    with tempfile.TemporaryDirectory() as tmpdir1, \
+         tempfile.TemporaryDirectory() as tmpdir2:
+      cc.initialize_cache(tmpdir1)
+      self.assertTrue(cc.is_initialized())
+      self.assertRaisesRegex(ValueError, "already been initialized",
+                             lambda: cc.initialize_cache(tmpdir2))
+
+  def test_jit_populates_cache(self):
+    backend = xb.get_backend()
+    if not cc.supports_serialization(backend):
+      raise SkipTest("backend does not support executable serialization")
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cc.initialize_cache(tmpdir)
+      f = api.jit(lambda x: x * 3. + 1.)
+      self.assertAllClose(f(np.float32(2.)), np.float32(7.))
+      self.assertLen(os.listdir(tmpdir), 1)
+      g = api.jit(lambda x: x * 3. + 1.)
+      self.assertAllClose(g(np.float32(2.)), np.float32(7.))
+      self.assertLen(os.listdir(tmpdir), 1)
+
+  def test_failed_put_does_not_fail_compile(self):
+    backend = xb.get_backend()
+    if not cc.supports_serialization(backend):
+      raise SkipTest("backend does not support executable serialization")
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cc.initialize_cache(tmpdir)
+      with mock.patch.object(cc, "put_executable",
+                             side_effect=OSError("read-only file system")):
+        f = api.jit(lambda x: x * 5. - 1.)
+        self.assertAllClose(f(np.float32(2.)), np.float32(9.))
+      self.assertEmpty(os.listdir(tmpdir))
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -0,0 +1,114 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+
+from absl.testing import absltest
+import numpy as np
+
+from jax import api
+from jax import compile_events
+from jax import lax
+from jax import test_util as jtu
+
+from jax.config import config
+config.parse_flags_with_absl()
+
+
+class CompileEventsTest(jtu.JaxTestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.events = []
+    compile_events.register_listener(self.events.append)
+
+  def tearDown(self):
+    compile_events.unregister_listener(self.events.append)
+    super().tearDown()
+
+  def test_jit_reports_all_stages(self):
+    def my_function(x, y):
+      return lax.sin(x) * y.astype(np.float32)
+    api.jit(my_function)(np.ones(3, np.float32), np.ones(3, np.int32))
+    events = [e for e in self.events if e.fun_name == "my_function"]
+    self.assertEqual([e.stage for e in events],
+                     [compile_events.TRACE, compile_events.LOWER,
+                      compile_events.COMPILE])
+    for e in events:
+      self.assertEqual(e.kind, "jit")
+      self.assertEqual(e.signature, "(f32[3], i32[3])")
+      self.assertGreaterEqual(e.duration_secs, 0.)
+    trace, lower, compile = events
+    self.assertEqual(trace.num_eqns, 3)  # sin, convert_element_type, mul
+    self.assertIsNone(trace.hlo_size_bytes)
+    self.assertGreater(lower.hlo_size_bytes, 0)
+
+  def test_cache_hit_reports_nothing(self):
+    f = api.jit(lambda x: x + 1)
+    f(1.)
+    num_events = len(self.events)
+    f(2.)
+    self.assertLen(self.events, num_events)
+
+  def test_nested_eqns_are_counted(self):
+    def outer(x):
+      return api.jit(lambda y: y * 2 + 1)(x) - 1
+    api.jit(outer)(1.)
+    trace, = [e for e in self.events
+              if e.fun_name == "outer" and e.stage == compile_events.TRACE]
+    self.assertEqual(trace.num_eqns, 4)  # xla_call, mul, add, sub
+
+  def test_primitive_reports_lower_and_compile(self):
+    lax.cos(np.arange(7, dtype=np.float32))
+    stages = [e.stage for e in self.events
+              if e.kind == "primitive" and e.fun_name == "cos"
+              and e.signature == "(f32[7])"]
+    self.assertEqual(stages, [compile_events.LOWER, compile_events.COMPILE])
+
+  def test_pmap_reports_all_stages(self):
+    def pmapped_function(x):
+      return x * 2
+    n = api.device_count()
+    api.pmap(pmapped_function)(np.ones((n, 5), np.float32))
+    events = [e for e in self.events if e.fun_name == "pmapped_function"]
+    self.assertEqual([e.stage for e in events],
+                     [compile_events.TRACE, compile_events.LOWER,
+                      compile_events.COMPILE])
+    self.assertTrue(all(e.kind == "pmap" for e in events))
+
+  def test_unregister_unknown_listener_raises(self):
+    self.assertRaisesRegex(ValueError, "not a registered compile listener",
+                           lambda: compile_events.unregister_listener(print))
+
+  def test_json_lines_logger(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, "events.jsonl")
+      logger = compile_events.log_to_file(path)
+      api.jit(lambda x: x * 3)(np.ones(2, np.float32))
+      logger.close()
+      api.jit(lambda x: x * 4)(np.ones(2, np.float32))
+      with open(path) as f:
+        records = [json.loads(line) for line in f]
+    self.assertEqual([r["stage"] for r in records],
+                     [compile_events.TRACE, compile_events.LOWER,
+                      compile_events.COMPILE])
+    self.assertEqual(records[0]["signature"], "(f32[2])")
+    self.assertEqual(set(records[0]),
+                     set(compile_events.CompileEvent._fields))
+
+
+if __name__ == "__main__":
+  absltest.main()
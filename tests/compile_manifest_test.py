@@ -0,0 +1,112 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from functools import partial
+import os
+import tempfile
+import unittest
+
+from absl.testing import absltest
+import numpy as np
+
+from jax import api
+from jax import compile_manifest
+from jax import test_util as jtu
+from jax.lib import version
+import jax.numpy as jnp
+
+from jax.config import config
+config.parse_flags_with_absl()
+
+
+@partial(api.jit, static_argnums=(1,))
+def scaled_sum(x, n):
+  return jnp.sum(x) * n
+
+
+class CompileManifestTest(jtu.JaxTestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.tmpdir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmpdir.name, "manifest.jsonl")
+
+  def tearDown(self):
+    compile_manifest.stop_recording()
+    self.tmpdir.cleanup()
+    super().tearDown()
+
+  def _read_lines(self):
+    with open(self.path) as f:
+      return f.readlines()
+
+  def test_records_each_specialization_once(self):
+    compile_manifest.start_recording(self.path)
+    scaled_sum(np.ones(3, np.float32), 2)
+    scaled_sum(np.zeros(3, np.float32), 2)
+    scaled_sum(np.ones(4, np.float32), 2)
+    scaled_sum(np.ones(4, np.float32), 3)
+    api.vmap(lambda x: scaled_sum(x, 2))(np.ones((2, 5), np.float32))
+    compile_manifest.stop_recording()
+    scaled_sum(np.ones(6, np.float32), 2)
+    self.assertLen(self._read_lines(), 3)
+
+  def test_records_cpp_jit_specializations(self):
+    if version < (0, 1, 56):
+      raise unittest.SkipTest("C++ jit requires a newer jaxlib.")
+    f = api._cpp_jit(lambda x: x * 2)
+    compile_manifest.start_recording(self.path)
+    f(np.ones(3, np.float32))
+    f(np.ones(3, np.float32))
+    f(np.ones(4, np.float32))
+    compile_manifest.stop_recording()
+    self.assertLen(self._read_lines(), 2)
+
+  def test_unsupported_arguments_are_not_recorded(self):
+    compile_manifest.start_recording(self.path)
+    scaled_sum(np.ones(3, np.float32), np.int32(2))  # not serializable
+    compile_manifest.stop_recording()
+    self.assertEmpty(self._read_lines())
+
+  def test_replay_imports_functions(self):
+    compile_manifest.start_recording(self.path)
+    scaled_sum(np.ones(3, np.float32), 2)
+    scaled_sum(1., 3)
+    compile_manifest.stop_recording()
+
+    api.clear_caches(scaled_sum.__wrapped__)
+    compile_manifest.replay(self.path)
+    self.assertEqual(api.cache_info(scaled_sum.__wrapped__).num_entries, 2)
+    misses = api.cache_info(scaled_sum.__wrapped__).misses
+    scaled_sum(np.zeros(3, np.float32), 2)
+    scaled_sum(2., 3)
+    self.assertEqual(api.cache_info(scaled_sum.__wrapped__).misses, misses)
+
+  def test_replay_explicit_functions(self):
+    def f(x, y=None):
+      return x + y
+    f_jit = api.jit(f)
+    compile_manifest.start_recording(self.path)
+    f_jit(np.ones(3, np.float32), y=np.ones(3, np.float32))
+    compile_manifest.stop_recording()
+
+    api.clear_caches(f)
+    compile_manifest.replay(self.path)  # f cannot be imported
+    self.assertEqual(api.cache_info(f).num_entries, 0)
+    compile_manifest.replay(self.path, functions=[f_jit])
+    self.assertEqual(api.cache_info(f).num_entries, 1)
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -0,0 +1,163 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import absltest
+import numpy as np
+
+from jax import core, jaxpr_passes, jaxpr_util, jit, lax, make_jaxpr
+from jax import numpy as jnp
+from jax import test_util as jtu
+from jax.config import config
+
+
+config.parse_flags_with_absl()
+FLAGS = config.FLAGS
+
+
+def _optimized(f, *args, pipeline=None):
+  closed_jaxpr = make_jaxpr(f)(*args)
+  return core.ClosedJaxpr(
+      jaxpr_passes.optimize_jaxpr(closed_jaxpr.jaxpr, pipeline),
+      closed_jaxpr.consts)
+
+def _primitives(closed_jaxpr):
+  return dict(jaxpr_util.primitives(closed_jaxpr.jaxpr))
+
+
+class JaxprPassesTest(jtu.JaxTestCase):
+
+  def setUp(self):
+    super().setUp()
+    if not config.omnistaging_enabled:
+      raise absltest.SkipTest("test requires omnistaging")
+
+  def test_cse(self):
+    def f(x):
+      return jnp.sin(x) * jnp.sin(x) + jnp.sin(x)
+    jaxpr = _optimized(f, 1., pipeline=["cse", "dce"])
+    self.assertEqual(_primitives(jaxpr)["sin"], 1)
+
+  def test_cse_respects_params(self):
+    def f(x):
+      return lax.reduce_max(x, (0,)), lax.reduce_max(x, (1,))
+    jaxpr = _optimized(f, np.ones((2, 2)), pipeline=["cse"])
+    self.assertEqual(_primitives(jaxpr)["reduce_max"], 2)
+
+  def test_cse_distinguishes_signed_zeros(self):
+    def f(x):
+      return lax.div(np.float32(1), x * 0.), lax.div(np.float32(1), x * -0.)
+    jaxpr = _optimized(f, np.float32(1), pipeline=["cse", "dce"])
+    self.assertEqual(_primitives(jaxpr)["mul"], 2)
+    self.assertEqual(_primitives(jaxpr)["div"], 2)
+    prev = FLAGS.jax_optimize_jaxprs
+    config.update("jax_optimize_jaxprs", True)
+    try:
+      self.assertAllClose(jit(f)(np.float32(1)),
+                          (np.float32(np.inf), np.float32(-np.inf)))
+    finally:
+      config.update("jax_optimize_jaxprs", prev)
+
+  def test_fold_constants(self):
+    def f(x):
+      return x * lax.mul(np.float32(2), np.float32(3))
+    jaxpr = _optimized(f, np.float32(1), pipeline=["fold_constants"])
+    self.assertEqual(_primitives(jaxpr), {"mul": 1})
+    literal, = [v for v in jaxpr.jaxpr.eqns[0].invars
+                if type(v) is core.Literal]
+    self.assertEqual(literal.val, 6)
+
+  def test_simplify(self):
+    def f(x):
+      y = lax.neg(lax.neg(x))
+      y = lax.add(lax.mul(y, np.float32(1)), np.float32(0))
+      return lax.convert_element_type(y, np.float32)
+    jaxpr = _optimized(f, np.float32(1)).jaxpr
+    self.assertEmpty(jaxpr.eqns)
+    self.assertIs(jaxpr.outvars[0], jaxpr.invars[0])
+
+  def test_simplify_shape_ops(self):
+    def f(x):
+      return lax.reshape(lax.transpose(x, (0, 1)), (2, 3)), lax.transpose(x, (1, 0))
+    jaxpr = _optimized(f, np.ones((2, 3), np.float32))
+    self.assertEqual(_primitives(jaxpr), {"transpose": 1})
+    self.assertIs(jaxpr.jaxpr.outvars[0], jaxpr.jaxpr.invars[0])
+
+  def test_simplify_keeps_type_changes(self):
+    def f(x):
+      return lax.add(x, np.float32(0)), lax.convert_element_type(x, np.int32)
+    jaxpr = _optimized(f, np.float32(1), pipeline=["simplify"])
+    self.assertEqual(_primitives(jaxpr), {"convert_element_type": 1})
+
+  def test_dce_nested_call(self):
+    def f(x):
+      y, _ = jit(lambda x: (jnp.sin(x), jnp.cos(x)))(x)
+      _ = jnp.tan(x)
+      return y
+    jaxpr = _optimized(f, 1., pipeline=["dce"])
+    self.assertEqual(_primitives(jaxpr), {"xla_call": 1, "sin": 1})
+
+  def test_dce_scan_outputs(self):
+    def f(xs):
+      def body(c, x):
+        return c + x, (jnp.sin(x), jnp.cos(x))
+      c, (ys, _) = lax.scan(body, 0., xs)
+      return c, ys
+    jaxpr = _optimized(f, np.ones(3, np.float32), pipeline=["dce"])
+    hist = _primitives(jaxpr)
+    self.assertEqual(hist["sin"], 1)
+    self.assertNotIn("cos", hist)
+    xs = np.arange(3, dtype=np.float32)
+    self.assertAllClose(core.jaxpr_as_fun(jaxpr)(xs), f(xs))
+
+  def test_dce_cond_outputs(self):
+    def f(p, x):
+      y, _ = lax.cond(p, lambda x: (jnp.sin(x), jnp.cos(x)),
+                      lambda x: (x, jnp.exp(x)), x)
+      return y
+    jaxpr = _optimized(f, True, 1., pipeline=["dce"])
+    hist = _primitives(jaxpr)
+    self.assertNotIn("cos", hist)
+    self.assertNotIn("exp", hist)
+
+  def test_effectful_equations_are_kept(self):
+    effect_p = core.Primitive("test_effect")
+    effect_p.def_abstract_eval(lambda x: x)
+    jaxpr_passes.effectful_primitives.add(effect_p)
+    def f(x):
+      effect_p.bind(x)
+      effect_p.bind(x)
+      return x
+    jaxpr = _optimized(f, 1.)
+    self.assertEqual(_primitives(jaxpr), {"test_effect": 2})
+
+  def test_unknown_pass_raises(self):
+    self.assertRaisesRegex(ValueError, "Unknown jaxpr pass 'foo'",
+                           lambda: _optimized(jnp.sin, 1., pipeline=["foo"]))
+
+  def test_jit_with_flag(self):
+    def f(x):
+      y = jnp.sin(x) + jnp.sin(x)
+      return y * 1, lax.mul(np.float32(2), np.float32(3))
+    x = np.arange(4, dtype=np.float32)
+    expected = f(x)
+    prev = FLAGS.jax_optimize_jaxprs
+    config.update("jax_optimize_jaxprs", True)
+    try:
+      self.assertAllClose(jit(f)(x), expected)
+    finally:
+      config.update("jax_optimize_jaxprs", prev)
+
+
+if __name__ == "__main__":
+  absltest.main()
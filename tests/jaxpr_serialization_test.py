@@ -0,0 +1,152 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import NamedTuple
+
+from absl.testing import absltest
+import numpy as np
+
+import jax
+from jax import core, jaxpr_serialization, jaxpr_util, lax, make_jaxpr
+from jax import source_info_util
+from jax import numpy as jnp
+from jax import test_util as jtu
+from jax.config import config
+
+
+config.parse_flags_with_absl()
+
+
+def _round_trip(f, *args, **kwargs):
+  closed_jaxpr = make_jaxpr(f)(*args)
+  data = jaxpr_serialization.serialize(closed_jaxpr, **kwargs)
+  return closed_jaxpr, jaxpr_serialization.deserialize(data)
+
+
+class JaxprSerializationTest(jtu.JaxTestCase):
+
+  def assertRoundTrips(self, f, *args):
+    closed_jaxpr, loaded = _round_trip(f, *args)
+    self.assertEqual(dict(jaxpr_util.primitives(loaded.jaxpr)),
+                     dict(jaxpr_util.primitives(closed_jaxpr.jaxpr)))
+    self.assertEqual(loaded.in_avals, closed_jaxpr.in_avals)
+    self.assertEqual(loaded.out_avals, closed_jaxpr.out_avals)
+    expected = f(*args)
+    self.assertAllClose(core.jaxpr_as_fun(loaded)(*args),
+                        jax.tree_leaves(expected))
+    self.assertAllClose(jax.jit(core.jaxpr_as_fun(loaded))(*args),
+                        jax.tree_leaves(expected))
+    return loaded
+
+  def test_elementwise(self):
+    def f(x, y):
+      return jnp.sin(x) * y + 2, lax.convert_element_type(y, np.int32)
+    self.assertRoundTrips(f, np.arange(3, dtype=np.float32),
+                          np.ones(3, np.float32))
+
+  def test_constants_and_literals(self):
+    w = np.arange(6, dtype=np.float32).reshape(2, 3)
+    f = lambda x: jnp.dot(x, w) - np.float32(1.5)
+    loaded = self.assertRoundTrips(f, np.ones((4, 2), np.float32))
+    self.assertLen(loaded.consts, 1)
+    self.assertAllClose(loaded.consts[0], w)
+
+  def test_structured_params(self):
+    def f(x, idx):
+      y = lax.dot_general(x, x, (((1,), (1,)), ((), ())),
+                          precision=lax.Precision.HIGHEST)
+      return y[idx], lax.reduce(x, 0., lambda a, b: a * 0.5 + b, (0,))
+    self.assertRoundTrips(f, np.ones((3, 3), np.float32), 1)
+
+  def test_nested_jaxprs(self):
+    def f(p, xs):
+      def body(c, x):
+        return c + x, lax.cond(p, jnp.sin, jnp.cos, x)
+      c, ys = lax.scan(body, 0., xs)
+      return jax.jit(lambda c: c * 2)(c), ys, lax.while_loop(
+          lambda c: c < 10., lambda c: c + 1., c)
+    self.assertRoundTrips(f, True, np.arange(4, dtype=np.float32))
+
+  def test_custom_jvp(self):
+    loaded = self.assertRoundTrips(jax.nn.relu, np.arange(-2., 2., dtype=np.float32))
+    self.assertRaisesRegex(
+        jaxpr_serialization.SerializationError, "not available",
+        lambda: jax.grad(lambda x: core.jaxpr_as_fun(loaded)(x)[0].sum())(
+            np.ones(4, np.float32)))
+
+  def test_weak_types(self):
+    _, loaded = _round_trip(lambda x: x * 2, 1.)
+    self.assertTrue(loaded.in_avals[0].weak_type)
+
+  def test_source_info(self):
+    def f(x):
+      return jnp.sin(x)
+    _, loaded = _round_trip(f, 1., include_source_info=True)
+    eqn, = loaded.jaxpr.eqns
+    frame = source_info_util.user_frame(eqn.source_info)
+    self.assertEqual(frame.function_name, "f")
+    _, loaded = _round_trip(f, 1.)
+    self.assertIsNone(loaded.jaxpr.eqns[0].source_info)
+
+  def test_source_info_is_optional_in_size(self):
+    closed_jaxpr = make_jaxpr(lambda x: jnp.cos(jnp.sin(x)))(1.)
+    small = jaxpr_serialization.serialize(closed_jaxpr)
+    large = jaxpr_serialization.serialize(closed_jaxpr, include_source_info=True)
+    self.assertLess(len(small), len(large))
+
+  def test_unknown_primitive(self):
+    foo_p = core.Primitive("serialization_test_foo")
+    foo_p.def_abstract_eval(lambda x: x)
+    foo_p.def_impl(lambda x: x)
+    data = jaxpr_serialization.serialize(make_jaxpr(foo_p.bind)(1.))
+    self.assertRaisesRegex(jaxpr_serialization.SerializationError,
+                           "Unknown primitive 'serialization_test_foo'",
+                           lambda: jaxpr_serialization.deserialize(data))
+    jaxpr_serialization.register_primitive(foo_p)
+    loaded = jaxpr_serialization.deserialize(data)
+    self.assertIs(loaded.jaxpr.eqns[0].primitive, foo_p)
+
+  def test_classes_are_not_imported(self):
+    class Dims(NamedTuple):
+      axis: int
+    dims_p = core.Primitive("serialization_test_dims")
+    dims_p.def_abstract_eval(lambda x, *, dims: x)
+    dims_p.def_impl(lambda x, *, dims: x)
+    jaxpr_serialization.register_primitive(dims_p)
+    data = jaxpr_serialization.serialize(
+        make_jaxpr(lambda x: dims_p.bind(x, dims=Dims(1)))(1.))
+    # As in a fresh process, where Dims was never serialized.
+    name = jaxpr_serialization._qualified_name(Dims)
+    del jaxpr_serialization._classes[name]
+    self.assertRaisesRegex(jaxpr_serialization.SerializationError,
+                           "Unknown parameter class",
+                           lambda: jaxpr_serialization.deserialize(data))
+    malicious = data.replace(name.encode(), b"os:system".ljust(len(name)))
+    self.assertRaisesRegex(jaxpr_serialization.SerializationError,
+                           "Unknown parameter class",
+                           lambda: jaxpr_serialization.deserialize(malicious))
+    self.assertRaises(TypeError,
+                      lambda: jaxpr_serialization.register_class(dict))
+    jaxpr_serialization.register_class(Dims)
+    loaded = jaxpr_serialization.deserialize(data)
+    self.assertEqual(loaded.jaxpr.eqns[0].params["dims"], Dims(1))
+
+  def test_invalid_data(self):
+    self.assertRaisesRegex(jaxpr_serialization.SerializationError,
+                           "Not a serialized jaxpr",
+                           lambda: jaxpr_serialization.deserialize(b"abc"))
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -13,8 +13,9 @@
 # limitations under the License.
 
 from absl.testing import absltest
+import numpy as np
 
-from jax import jaxpr_util, jit, make_jaxpr, numpy as jnp
+from jax import jaxpr_util, jit, lax, make_jaxpr, numpy as jnp
 from jax import test_util as jtu
 from jax.config import config
 
@@ -85,5 +86,53 @@ class JaxprStatsTest(jtu.JaxTestCase):
     jaxpr_util.print_histogram(hist)
 
 
+class MemoryEstimateTest(jtu.JaxTestCase):
+
+  def test_straight_line(self):
+    def f(x):
+      y = lax.sin(x)
+      return lax.cos(y)
+
+    est = jaxpr_util.estimate_memory(make_jaxpr(f)(np.ones(1000, np.float32)))
+    # x, y and cos(y) are live while cos runs; y is dead afterwards.
+    self.assertEqual(est.peak_bytes, 3 * 4000)
+    self.assertEqual([e.primitive.name for e in est.peak_eqns], ['cos'])
+    self.assertEqual(est.allocations, {'sin': 4000, 'cos': 4000})
+
+  def test_dead_values_are_freed(self):
+    def f(x):
+      y = lax.sin(x)
+      z = lax.cos(y)
+      return lax.exp(z)
+
+    est = jaxpr_util.estimate_memory(make_jaxpr(f)(np.ones(1000, np.float32)))
+    self.assertEqual(est.peak_bytes, 3 * 4000)
+
+  def test_scan_body_peak(self):
+    def f(c, xs):
+      def body(c, x):
+        t = lax.broadcast(x, (1000,))
+        return c + lax.reduce(t, np.float32(0), lax.add, (0,)), None
+      return lax.scan(body, c, xs)[0]
+
+    est = jaxpr_util.estimate_memory(
+        make_jaxpr(f)(np.float32(0), np.ones(10, np.float32)))
+    names = [e.primitive.name for e in est.peak_eqns]
+    self.assertEqual(names[0], 'scan')
+    self.assertEqual(names[-1], 'reduce_sum')
+    # Inputs, the scan carry and the broadcast temporary and its sum.
+    self.assertEqual(est.peak_bytes, 44 + 4 + 4004)
+
+  def test_xla_call(self):
+    def f(x):
+      return jit(lambda x: lax.sin(lax.cos(x)))(x)
+
+    est = jaxpr_util.estimate_memory(make_jaxpr(f)(np.ones(1000, np.float32)))
+    self.assertEqual([e.primitive.name for e in est.peak_eqns],
+                     ['xla_call', 'sin'])
+    self.assertEqual(est.peak_bytes, 3 * 4000)
+    self.assertEqual(est.allocations['xla_call'], 4000)
+
+
 if __name__ == "__main__":
   absltest.main()
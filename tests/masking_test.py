@@ -30,6 +30,7 @@ from jax.tree_util import tree_flatten
 import jax.numpy as jnp
 from jax.scipy.special import expit
 from jax import mask, vmap, jit, grad, shapecheck, make_jaxpr
+from jax import bucketed_jit
 from jax.interpreters.masking import (
     shape_as_value, ShapeError, parse_spec, Poly, Mon, finalize_spec,
     eval_poly_shape, remap_ids, UniqueIds)
@@ -789,5 +790,54 @@ class MaskingTest(jtu.JaxTestCase):
     self.assertEqual(b.shape, ())
 
 
+class BucketedJitTest(jtu.JaxTestCase):
+
+  def test_results_match_unpadded(self):
+    f = lambda x, y: (jnp.sum(x * y), x + 1)
+    f_bucketed = bucketed_jit(f, ['n', 'n'], ('', 'n'), buckets=[4, 8])
+    for n in [1, 3, 4, 6]:
+      x = np.arange(n, dtype=np.float32)
+      y = np.ones(n, np.float32)
+      self.assertAllClose(f_bucketed(x, y), f(x, y))
+
+  def test_executables_bounded_by_buckets(self):
+    traces = []
+    def f(x):
+      traces.append(x.shape)
+      return jnp.sin(x) * 2
+    f_bucketed = bucketed_jit(f, ['(n, 3)'], '(n, 3)', buckets=[4, 8])
+    for n in range(1, 9):
+      x = np.ones((n, 3), np.float32)
+      self.assertAllClose(f_bucketed(x), np.sin(x) * 2)
+    self.assertLen(traces, 2)
+
+  def test_per_variable_buckets(self):
+    f = lambda x, y: (x * 2, y * 2)
+    f_bucketed = bucketed_jit(f, ['m', 'n'], ('m', 'n'),
+                              buckets={'m': [2], 'n': [5]})
+    x, y = f_bucketed(np.ones(2), np.ones(4))
+    self.assertEqual(x.shape, (2,))
+    self.assertEqual(y.shape, (4,))
+
+  def test_device_and_traced_arguments(self):
+    f = lambda x: jnp.sin(x) * 2
+    f_bucketed = bucketed_jit(f, ['n'], 'n', buckets=[4, 8])
+    x = jnp.arange(5, dtype=jnp.float32)
+    self.assertAllClose(f_bucketed(x), f(x))
+    self.assertAllClose(jit(f_bucketed)(x), f(x))
+    self.assertAllClose(vmap(f_bucketed)(jnp.stack([x, x])),
+                        jnp.stack([f(x), f(x)]))
+
+  def test_size_exceeding_buckets_raises(self):
+    f_bucketed = bucketed_jit(lambda x: x, ['n'], 'n', buckets=[2, 4])
+    self.assertRaisesRegex(ValueError, "exceeds the largest bucket 4",
+                           lambda: f_bucketed(np.ones(5)))
+
+  def test_missing_bucket_raises(self):
+    f_bucketed = bucketed_jit(lambda x: x, ['n'], 'n', buckets={'m': [2]})
+    self.assertRaisesRegex(ValueError, "no buckets for shape variable 'n'",
+                           lambda: f_bucketed(np.ones(2)))
+
+
 if __name__ == '__main__':
   absltest.main(testLoader=jtu.JaxTestLoader())
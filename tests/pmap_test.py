@@ -145,6 +145,56 @@ class PmapTest(jtu.JaxTestCase):
     ans = f(x)
     self.assertAllClose(ans, expected, check_dtypes=False)
 
+  @parameterized.named_parameters(
+      {"testcase_name": f"_dim={dim}_tiled={tiled}", "dim": dim, "tiled": tiled}
+      for dim in range(2) for tiled in [False, True])
+  def testPsumScatter(self, dim, tiled):
+    n = xla_bridge.device_count()
+    shape = [3, 3]
+    shape[dim] = n * (2 if tiled else 1)
+    x = np.arange(n * prod(shape), dtype=np.float32).reshape([n] + shape)
+    f = pmap(lambda x: lax.psum_scatter(x, 'i', scatter_dimension=dim,
+                                        tiled=tiled), axis_name='i')
+    summed = x.sum(0)
+    chunks = np.split(summed, n, axis=dim)
+    expected = np.stack([c if tiled else np.squeeze(c, dim) for c in chunks])
+    self.assertAllClose(f(x), expected)
+
+  def testPsumScatterReplicaGroups(self):
+    replicas = xla_bridge.device_count()
+    if replicas % 2 != 0:
+      raise SkipTest
+    axis_index_groups = np.arange(replicas).reshape(2, replicas // 2).tolist()
+    f = pmap(lambda x: lax.psum_scatter(x, 'i',
+                                        axis_index_groups=axis_index_groups),
+             axis_name='i')
+    shape = (replicas, replicas // 2, 2)
+    x = np.arange(prod(shape), dtype=np.float32).reshape(shape)
+    group_sums = [x[:replicas // 2].sum(0), x[replicas // 2:].sum(0)]
+    expected = np.concatenate(group_sums)
+    self.assertAllClose(f(x), expected)
+
+  def testPsumScatterTranspose(self):
+    n = xla_bridge.device_count()
+    x = np.arange(n * n * 2, dtype=np.float32).reshape(n, n, 2)
+    w = np.arange(n * 2, dtype=np.float32).reshape(n, 2)
+    f = lambda x, w: jnp.sum(lax.psum_scatter(x, 'i') * w)
+    ans = pmap(grad(f), axis_name='i')(x, w)
+    expected = pmap(lambda x, w: lax.all_gather(w, 'i'), axis_name='i')(x, w)
+    self.assertAllClose(ans, expected)
+
+  def testPsumScatterTreesAndShapeErrors(self):
+    n = xla_bridge.device_count()
+    x = np.ones((n, n))
+    f = pmap(lambda x: lax.psum_scatter({'a': x, 'b': [x]}, 'i'), 'i')
+    out = f(x)
+    self.assertAllClose(out['a'], np.full((n,), float(n)))
+    self.assertAllClose(out['b'][0], np.full((n,), float(n)))
+    self.assertRaisesRegex(
+        ValueError, "psum_scatter requires the size of dimension 0",
+        lambda: pmap(lambda x: lax.psum_scatter(x, 'i'), 'i')(
+            np.ones((n, n + 1))))
+
   @ignore_slow_all_to_all_warning()
   def testTrees(self):
     ptranspose = lambda x, axis_name: lax.all_to_all(x, axis_name, 0, 0)
@@ -507,6 +557,27 @@ class PmapTest(jtu.JaxTestCase):
     expected = sum_and_broadcast(sum_and_broadcast(x, 0), 1)
     self.assertAllClose(ans, expected, check_dtypes=False)
 
+  def testPsumBucketed(self):
+    n = xla_bridge.device_count()
+    rng = np.random.RandomState(0)
+    tree = {'a': [rng.randn(n, 3).astype(np.float32) for _ in range(5)],
+            'b': rng.randint(0, 5, (n, 2, 2)).astype(np.int32),
+            'c': rng.randn(n, 40).astype(np.float32),
+            'd': rng.randn(n).astype(np.float32),
+            'e': np.array([True, False] * n)[:n]}
+    f = lambda x: lax.psum_bucketed(x, 'i', bucket_bytes=64)
+    ans = pmap(f, 'i')(tree)
+    expected = pmap(lambda x: lax.psum(x, 'i'), 'i')(tree)
+    self.assertAllClose(ans, expected)
+
+    # The five float32 (3,) leaves fit in one bucket of 64 bytes, along with
+    # 'd'; the int32 leaf and converted bool leaf share one, and the float32
+    # (40,) leaf exceeds the bucket size.
+    jaxpr = make_jaxpr(pmap(f, 'i'))(tree)
+    psum_eqn, = [e for e in jaxpr.jaxpr.eqns[0].params['call_jaxpr'].eqns
+                 if e.primitive is lax.psum_p]
+    self.assertLen(psum_eqn.invars, 3)
+
   def testPsumConstantReplicaGroups(self):
     replicas = xla_bridge.device_count()
     if replicas % 2 != 0:
@@ -1616,6 +1687,24 @@ class VmapOfPmapTest(jtu.JaxTestCase):
     self.assertAllClose(f(jax.pmap, jax.vmap)(x, x), y)
     self.assertAllClose(f(jax.vmap, jax.pmap)(x, x), y)
 
+  @parameterized.named_parameters(
+      {"testcase_name": f"_tiled={tiled}_vmap_axis={vmap_axis}",
+       "tiled": tiled, "vmap_axis": vmap_axis}
+      for tiled in [False, True] for vmap_axis in range(3))
+  @skipIf(not jax.config.omnistaging_enabled,
+          "vmap collectives only supported when omnistaging is enabled")
+  def testPsumScatterInVmap(self, tiled, vmap_axis):
+    size = 4
+    elt_shape = (3, 2 * size if tiled else size)
+    x = np.arange(size * prod(elt_shape), dtype=np.float32)
+    x = x.reshape((size,) + elt_shape)
+    f = lambda x: lax.psum_scatter(x, 'i', scatter_dimension=1, tiled=tiled)
+    ans = jax.vmap(f, in_axes=vmap_axis, axis_name='i')(
+        np.moveaxis(x, 0, vmap_axis))
+    chunks = np.split(x.sum(0), size, axis=1)
+    expected = np.stack([c if tiled else np.squeeze(c, 1) for c in chunks])
+    self.assertAllClose(ans, expected)
+
   @skipIf(not jax.config.omnistaging_enabled,
           "vmap collectives only supported when omnistaging is enabled")
   def testPPermuteWithVmap(self):
@@ -1876,6 +1965,78 @@ class PmapWithDevicesTest(jtu.JaxTestCase):
     expected = np.sin(x + y[None])
     self.assertAllClose(ans, expected, check_dtypes=False)
 
+  def testPmapFastPath(self):
+    @partial(pmap, axis_name='i', static_broadcasted_argnums=2)
+    def f(x, y, z):
+      return x + lax.psum(y, 'i') * z, y
+    shape = (xla_bridge.device_count(), 4)
+    x = np.arange(prod(shape), dtype=np.float32).reshape(shape)
+    y = np.ones(shape, np.float32)
+    expected_x = x + y.sum(0) * 2
+    prev = config.FLAGS.jax_pmap_fast_path
+    for fast_path in (False, True):
+      config.update("jax_pmap_fast_path", fast_path)
+      try:
+        sx, sy = pmap(lambda x, y: (x, y))(x, y)
+        for i in range(3):
+          sx, sy = f(sx, sy, 2)
+          self.assertIsInstance(sx, pxla.ShardedDeviceArray)
+          self.assertAllClose(sx, x + y.sum(0) * 2 * (i + 1))
+        self.assertAllClose(f(sx, sy, 3)[0], x + y.sum(0) * 9)
+        self.assertAllClose(f(x, y, 2)[0], expected_x)
+      finally:
+        config.update("jax_pmap_fast_path", prev)
+
+  def testPmapFastPathFollowsCompilationCache(self):
+    def g(x):
+      return x * 2
+    f = pmap(g)
+    shape = (xla_bridge.device_count(), 3)
+    x = np.arange(prod(shape), dtype=np.float32).reshape(shape)
+    sx = pmap(lambda x: x)(x)
+    f(sx)
+    info = jax.cache_info(g)
+    self.assertEqual(info.misses, 1)
+    self.assertAllClose(f(sx), x * 2)
+    self.assertAllClose(f(sx), x * 2)
+    self.assertEqual(jax.cache_info(g).hits, info.hits + 2)
+    # Clearing the caches of `g` also drops its fast-path entries, so the next
+    # call compiles again.
+    jax.clear_caches(g)
+    self.assertEqual(jax.cache_info(g).num_entries, 0)
+    self.assertAllClose(f(sx), x * 2)
+    self.assertEqual(jax.cache_info(g).misses, 2)
+    self.assertEqual(jax.cache_info(g).num_entries, 1)
+
+  def testPmapFastPathSharesCompilationWithSlowPath(self):
+    f = pmap(lambda x: x * 2)
+    shape = (xla_bridge.device_count(), 3)
+    x = np.arange(prod(shape), dtype=np.float32).reshape(shape)
+    sx = pmap(lambda x: x)(x)
+    prev = config.FLAGS.jax_pmap_fast_path
+    config.update("jax_pmap_fast_path", True)
+    try:
+      with jtu.count_jit_and_pmap_compiles() as count:
+        self.assertAllClose(f(x), x * 2)  # numpy inputs bind xla_pmap
+        for _ in range(2):
+          self.assertAllClose(f(sx), x * 2)  # fast path miss, then hit
+      self.assertEqual(count[0], 1)
+    finally:
+      config.update("jax_pmap_fast_path", prev)
+
+  def testPmapFastPathFallsBackOnOtherDevices(self):
+    if xla_bridge.device_count() < 2:
+      raise SkipTest("test requires at least two devices")
+    devices = xla_bridge.devices()
+    f = pmap(lambda x: x * 2)
+    shape = (len(devices), 3)
+    x = np.arange(prod(shape), dtype=np.float32).reshape(shape)
+    sx = pmap(lambda x: x)(x)
+    self.assertAllClose(f(f(sx)), x * 4)
+    sx = pmap(lambda x: x, devices=devices[::-1])(x)
+    self.assertEqual(sx.device_buffers[0].device(), devices[-1])
+    self.assertAllClose(f(sx), x * 2)
+
 
 class ShardedDeviceArrayTest(jtu.JaxTestCase):
 
@@ -2092,6 +2253,40 @@ class ShardArgsTest(jtu.JaxTestCase):
       self.assertEqual(len(buf), 1)
       self.assertAllClose(buf[0].to_py(), x[idx], check_dtypes=False)
 
+  @parameterized.named_parameters(
+      {"testcase_name": f"_{name}", "src_spec": src_spec, "dst_spec": dst_spec}
+      for name, src_spec, dst_spec in [
+          ("pmap_to_replicated",
+           pxla.ShardingSpec((4, 1), (False, True), []),
+           pxla.ShardingSpec((1, 1), (True, True), [(4, 0)])),
+          ("replicated_to_partitioned",
+           pxla.ShardingSpec((1, 1), (True, True), [(4, 0)]),
+           pxla.ShardingSpec((2, 2), (True, True), [])),
+          ("rows_to_columns",
+           pxla.ShardingSpec((4, 1), (True, True), []),
+           pxla.ShardingSpec((1, 4), (True, True), [])),
+          ("coarser_pmap",
+           pxla.ShardingSpec((2, 1), (True, True), [(2, 0)]),
+           pxla.ShardingSpec((4, 1), (False, True), [])),
+      ])
+  def testReshardShardedDeviceArrayOnDevice(self, src_spec, dst_spec):
+    shape = (4, 8)
+    if jax.device_count() < 4:
+      raise SkipTest("test requires at least four devices")
+    devices = jax.devices()[:4]
+    x = np.arange(prod(shape), dtype=np.float32).reshape(shape)
+    src_indices = pxla.spec_to_indices(shape, src_spec)
+    src_bufs, = zip(*pxla.shard_args(devices, [src_indices], [x]))
+    arr = pxla.ShardedDeviceArray(ShapedArray(shape, np.float32), src_spec,
+                                  list(src_bufs), src_indices)
+    dst_indices = pxla.spec_to_indices(shape, dst_spec)
+    bufs = pxla.shard_args(devices[::-1], [dst_indices], [arr])
+    for buf, idx, device in zip(bufs, dst_indices, devices[::-1]):
+      self.assertEqual(buf[0].device(), device)
+      self.assertAllClose(buf[0].to_py(), x[idx])
+    # The shards were not assembled on the host.
+    self.assertIsNone(arr._npy_value)
+
 
 if __name__ == '__main__':
   absltest.main(testLoader=jtu.JaxTestLoader())
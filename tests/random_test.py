@@ -120,6 +120,50 @@ class LaxRandomTest(jtu.JaxTestCase):
     np.testing.assert_equal(result[:n], np.full((n,), 0xc4923a9c, dtype=np.uint32))
     np.testing.assert_equal(result[n:], np.full((n,), 0x483df7a0, dtype=np.uint32))
 
+  def testPhilox4x32(self):
+    # Known values from the test code of the reference implementation of Philox,
+    # see https://github.com/DEShawResearch/random123/blob/main/tests/kat_vectors
+    def result_to_hex(result):
+      return tuple([hex(x.copy()).rstrip("L") for x in result])
+
+    expected = ("0x6627e8d5", "0xe169c58d", "0xbc57ac4c", "0x9b00dbd8")
+    result = random.philox_4x32(np.uint32([0, 0]), np.uint32([0, 0, 0, 0]))
+    self.assertEqual(expected, result_to_hex(result))
+
+    expected = ("0x408f276d", "0x41c83b0e", "0xa20bc7c6", "0x6d5451fd")
+    result = random.philox_4x32(np.uint32([-1, -1]), np.uint32([-1] * 4))
+    self.assertEqual(expected, result_to_hex(result))
+
+    expected = ("0xd16cfe09", "0x94fdcceb", "0x5001e420", "0x24126ea1")
+    result = random.philox_4x32(
+        np.uint32([0xa4093822, 0x299f31d0]),
+        np.uint32([0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344]))
+    self.assertEqual(expected, result_to_hex(result))
+
+  def testPhiloxKeys(self):
+    key = random.PRNGKey(1701, impl="philox4x32")
+    self.assertEqual(key.shape, (4,))
+    self.assertEqual(key.dtype, np.uint32)
+
+    keys = random.split(key, 3)
+    self.assertEqual(keys.shape, (3, 4))
+    folded = [random.fold_in(key, i) for i in range(10)]
+    self.assertEqual(np.unique(np.ravel(folded)).shape, (40,))
+    self.assertFalse(np.any(np.all(np.asarray(folded)[:, None] == keys, -1)))
+
+    samples = random.uniform(key, (10000,))
+    self.assertFalse(np.array_equal(samples, random.uniform(keys[0], (10000,))))
+    self._CheckKolmogorovSmirnovCDF(samples, scipy.stats.uniform().cdf)
+    self._CheckKolmogorovSmirnovCDF(random.normal(keys[1], (10000,)),
+                                    scipy.stats.norm().cdf)
+    self.assertAllClose(vmap(random.uniform)(keys),
+                        np.stack([random.uniform(k) for k in keys]))
+    self.assertAllClose(api.jit(random.normal)(key), random.normal(key))
+
+  def testUnknownPRNGImpl(self):
+    self.assertRaisesRegex(ValueError, "Unknown PRNG implementation 'foo'",
+                           lambda: random.PRNGKey(0, impl="foo"))
+
   def testRngRandomBitsViewProperty(self):
     # TODO: add 64-bit if it ever supports this property.
     # TODO: will this property hold across endian-ness?
@@ -249,6 +293,30 @@ class LaxRandomTest(jtu.JaxTestCase):
       assert len(np.unique(sample1)) == len(np.ravel(sample1))
     self.assertAllClose(sample1, sample2)
 
+  def testChoiceWithoutReplacementLargePopulation(self):
+    key = random.PRNGKey(0)
+    sample = api.jit(lambda key: random.choice(key, 10 ** 8, (10,),
+                                               replace=False))(key)
+    self.assertEqual(len(np.unique(sample)), 10)
+    self.assertTrue(np.all((0 <= sample) & (sample < 10 ** 8)))
+
+  @parameterized.named_parameters(jtu.cases_from_list(
+      {"testcase_name": "_num_draws={}".format(num_draws),
+       "num_draws": num_draws}
+      for num_draws in [3, 15]))
+  def testChoiceWithoutReplacementIsUniform(self, num_draws):
+    # 3 draws out of 20 are sampled with Floyd's algorithm, 15 with a
+    # permutation.
+    N, num_samples = 20, 4000
+    keys = random.split(random.PRNGKey(0), num_samples)
+    samples = vmap(lambda key: random.choice(key, N, (num_draws,),
+                                             replace=False))(keys)
+    samples = np.asarray(samples)
+    self.assertTrue(all(len(np.unique(s)) == num_draws for s in samples))
+    for counts in [np.bincount(samples.ravel(), minlength=N),
+                   np.bincount(samples[:, 0], minlength=N)]:
+      self.assertGreater(scipy.stats.chisquare(counts).pvalue, 1e-3)
+
   @parameterized.named_parameters(jtu.cases_from_list(
       {"testcase_name": "_{}".format(jtu.format_shape_dtype_string(shape, dtype)),
        "dtype": dtype, "shape": shape}
@@ -290,6 +358,36 @@ class LaxRandomTest(jtu.JaxTestCase):
     with self.assertRaises(core.ConcretizationTypeError):
       api.jit(random.permutation)(key, 10)
 
+  @parameterized.named_parameters(jtu.cases_from_list(
+      {"testcase_name": "_n={}".format(n), "n": n}
+      for n in [1, 2, 7, 100, 1000]))
+  def testPermutationIndex(self, n):
+    key = random.PRNGKey(0)
+    perm = random.permutation_index(key, jnp.arange(n), n)
+    self.assertArraysEqual(np.sort(perm), np.arange(n, dtype=perm.dtype))
+    if n > 10:
+      self.assertFalse(np.all(perm == np.arange(n)))
+    self.assertEqual(api.jit(random.permutation_index, static_argnums=2)(
+        key, n // 2, n), perm[n // 2])
+    other = random.permutation_index(random.PRNGKey(1), jnp.arange(n), n)
+    if n > 10:
+      self.assertFalse(np.all(perm == other))
+
+  def testPermutationIndexClampsOutOfBoundsIndices(self):
+    key = random.PRNGKey(0)
+    index = jnp.array([-5, -1, 0, 9, 10, 100, 2 ** 20])
+    perm = random.permutation_index(key, index, 10)
+    expected = random.permutation_index(key, jnp.array([0, 0, 0, 9, 9, 9, 9]),
+                                        10)
+    self.assertArraysEqual(perm, expected)
+
+  def testPermutationIndexErrors(self):
+    key = random.PRNGKey(0)
+    self.assertRaises(ValueError, lambda: random.permutation_index(key, 0, 0))
+    self.assertRaises(TypeError, lambda: random.permutation_index(key, 0., 10))
+    self.assertRaises(core.ConcretizationTypeError,
+                      lambda: api.jit(random.permutation_index)(key, 0, 10))
+
   @parameterized.named_parameters(jtu.cases_from_list(
       {"testcase_name": "_p={}_dtype={}".format(p, np.dtype(dtype).name),
        "p": p, "dtype": dtype}
@@ -308,8 +406,10 @@ class LaxRandomTest(jtu.JaxTestCase):
       self._CheckChiSquared(samples, scipy.stats.bernoulli(p).pmf)
 
   @parameterized.named_parameters(jtu.cases_from_list(
-    {"testcase_name": "_p={}_{}_{}".format(p, np.dtype(dtype).name, sample_shape),
-     "p": p, "axis": axis, "dtype": dtype, 'sample_shape': sample_shape}
+    {"testcase_name": "_p={}_{}_{}_table={}".format(
+        p, np.dtype(dtype).name, sample_shape, use_table),
+     "p": p, "axis": axis, "dtype": dtype, 'sample_shape': sample_shape,
+     "use_table": use_table}
     for (p, axis) in [
         ([.25] * 4, -1),
         ([.1, .2, .3, .4], -1),
@@ -317,14 +417,19 @@ class LaxRandomTest(jtu.JaxTestCase):
         ([[.5, .1], [.5, .9]], 0),
     ]
     for sample_shape in [(10000,), (5000, 2)]
-    for dtype in [np.float32, np.float64]))
-  def testCategorical(self, p, axis, dtype, sample_shape):
+    for dtype in [np.float32, np.float64]
+    for use_table in [False, True]))
+  def testCategorical(self, p, axis, dtype, sample_shape, use_table):
     key = random.PRNGKey(0)
     p = np.array(p, dtype=dtype)
     logits = np.log(p) - 42 # test unnormalized
     out_shape = tuple(np.delete(logits.shape, axis))
     shape = sample_shape + out_shape
-    rand = partial(random.categorical, shape=shape, axis=axis)
+    if use_table:
+      rand = lambda key, logits: random.categorical_from_table(
+          key, random.categorical_table(logits, axis), shape)
+    else:
+      rand = partial(random.categorical, shape=shape, axis=axis)
     crand = api.jit(rand)
 
     uncompiled_samples = rand(key, logits)
@@ -343,6 +448,17 @@ class LaxRandomTest(jtu.JaxTestCase):
       else:
         self._CheckChiSquared(samples, pmf=lambda x: p[x])
 
+  def testCategoricalTable(self):
+    key = random.PRNGKey(0)
+    logits = np.log(np.array([[0., .5, 0., .5], [1., 0., 0., 0.]], np.float32))
+    table = random.categorical_table(logits)
+    self.assertEqual(random.categorical_from_table(key, table).shape, (2,))
+    samples = random.categorical_from_table(key, table, (1000, 2))
+    self.assertEqual(set(np.unique(samples[:, 0])), {1, 3})
+    self.assertTrue(np.all(samples[:, 1] == 0))
+    self.assertRaises(ValueError,
+                      lambda: random.categorical_from_table(key, table, (3,)))
+
   def testBernoulliShape(self):
     key = random.PRNGKey(0)
     x = random.bernoulli(key, np.array([0.2, 0.3]), shape=(3, 2))
@@ -664,6 +780,40 @@ class LaxRandomTest(jtu.JaxTestCase):
     keys = [random.fold_in(key, i) for i in range(10)]
     assert np.unique(np.ravel(keys)).shape == (20,)
 
+  def testKeyStream(self):
+    key = random.PRNGKey(0)
+    stream = random.KeyStream(key, block_size=4)
+    keys = np.stack([next(stream) for _ in range(3)] + [stream.take(3)[0]])
+    self.assertArraysEqual(keys, random.split(key, 5)[1:])
+    more = stream.take(6)
+    self.assertEqual(more.shape, (6, 2))
+    all_keys = np.concatenate([keys, more, [stream.key]])
+    self.assertEqual(np.unique(all_keys, axis=0).shape, (11, 2))
+    self.assertEqual(stream.take(0).shape, (0, 2))
+
+  def testKeyStreamKeyIsNotReused(self):
+    stream = random.KeyStream(random.PRNGKey(0), block_size=4)
+    key = stream.key
+    bits = random._random_bits(key, 32, (8,))
+    keys = stream.take(4)
+    self.assertFalse(np.isin(np.ravel(keys), bits).any())
+    self.assertFalse((stream.key == key).all())
+
+  def testKeyStreamJit(self):
+    @api.jit
+    def f(key):
+      stream = random.KeyStream(key, block_size=2)
+      xs = jnp.stack([random.uniform(next(stream)) for _ in range(3)])
+      return xs, random.uniform(stream.take(2)[1]), stream.key
+
+    key = random.PRNGKey(0)
+    xs, y, new_key = f(key)
+    stream = random.KeyStream(key, block_size=2)
+    self.assertAllClose(xs, np.stack([random.uniform(next(stream))
+                                      for _ in range(3)]))
+    self.assertAllClose(y, random.uniform(stream.take(2)[1]))
+    self.assertArraysEqual(new_key, stream.key)
+
   def testStaticShapeErrors(self):
     if config.read("jax_disable_jit"):
       raise SkipTest("test only relevant when jit enabled")